@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Semana2.settings')
+# list / retrieve de streaming con vistas async (ver streaming/asincrono.py)
+os.environ.setdefault('STREAMING_ASYNC_READS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero: mide la petición entera (ver /api/metrics)
+    'streaming.metricas.MetricasMiddleware',
+    # Base de datos de lectura de cada petición (réplica o principal)
+    'streaming.replica.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,10 +84,35 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 5,
+    # JSON con orjson si está instalado (misma salida que el de DRF);
+    # para volver al de DRF: rest_framework.renderers.JSONRenderer / parsers.JSONParser
+    "DEFAULT_RENDERER_CLASSES": [
+        "streaming.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "streaming.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 WSGI_APPLICATION = 'Semana2.wsgi.application'
 
+# Lecturas async (streaming/asincrono.py): list / retrieve con el ORM
+# async. Solo tiene sentido con ASGI; Semana2/asgi.py lo activa.
+STREAMING_ASYNC_READS = os.environ.get('STREAMING_ASYNC_READS') == '1'
+
+# Escritor único de reseñas (streaming/escritor.py): las escrituras de
+# reseñas van a una cola que vacía un solo hilo, agrupando las altas.
+# STREAMING_ESCRITOR_RESENAS=0 para escribir en el hilo de cada petición.
+STREAMING_ESCRITOR_RESENAS = {
+    'ACTIVO': os.environ.get('STREAMING_ESCRITOR_RESENAS', '1') == '1',
+    'COLA': 1000,
+    'LOTE': 500,
+    'TIMEOUT': 10.0,
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -94,6 +124,42 @@ DATABASES = {
     }
 }
 
+# Réplica de lectura (streaming/replica.py), con STREAMING_REPLICA=1: los
+# GET leen de una copia de db.sqlite3 que refresca
+#   python manage.py replicar --intervalo 2
+# Tras escribir, ese cliente lee de la principal PEGADO segundos; con la
+# copia más vieja que RETRASO_MAXIMO todo se lee de la principal.
+STREAMING_REPLICA = {
+    'ALIAS': 'replica',
+    'FICHERO': BASE_DIR / 'replica.sqlite3',
+    'PEGADO': 5.0,
+    'RETRASO_MAXIMO': 10.0,
+}
+
+if os.environ.get('STREAMING_REPLICA') == '1':
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # Solo lectura: la escribe replicar, nunca Django
+        'NAME': STREAMING_REPLICA['FICHERO'].as_uri() + '?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['streaming.replica.EnrutadorReplica']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# La caché de respuestas de streaming (streaming/cache.py) funciona con
+# LocMemCache en local; con varios procesos usa una compartida, p. ej.:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache',
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class StreamingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'streaming'
+
+    def ready(self):
+        # Conecta las señales que invalidan la caché de respuestas
+        from . import signals  # noqa: F401
+        # y la que mide las consultas SQL de cada conexión (/api/metrics)
+        from . import metricas  # noqa: F401
+        # y las que invalidan los usuarios cacheados de la autenticación JWT
+        from . import autenticacion  # noqa: F401
@@ -0,0 +1,141 @@
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation, ValidationError
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+
+# --------
+# LECTURAS ASYNC (ASGI)
+# Con STREAMING_ASYNC_READS = True (lo activa Semana2/asgi.py) las rutas
+# GET / HEAD de list y retrieve se sirven con una vista async: el COUNT,
+# la página y sus prefetch van con acount / aiterator / aget, y mientras
+# esperan a la base de datos el bucle atiende otras peticiones en lugar
+# de tener un hilo bloqueado por petición.
+# El resto de acciones (escrituras, exportar, valorar...) siguen siendo
+# las de DRF, ejecutadas con sync_to_async.
+# Con WSGI (runserver, tests) el ajuste está apagado y no cambia nada.
+#
+# Cada mixin que envuelve list / retrieve (caché, GET condicional) tiene
+# su alist / aretrieve, encadenados con super() igual que los síncronos.
+# --------
+
+
+async def sin_bloquear(funcion, *args, **kwargs):
+    """
+    Ejecuta `funcion` en el propio bucle. Si acaba consultando la base de
+    datos (p. ej. un ModelChoiceFilter que valida la categoría, o un
+    usuario de sesión sin cargar), Django lanza SynchronousOnlyOperation
+    antes de ejecutar nada y se repite en el hilo de la base de datos.
+    """
+    try:
+        return funcion(*args, **kwargs)
+    except SynchronousOnlyOperation:
+        return await sync_to_async(funcion)(*args, **kwargs)
+
+
+def _respuesta_plana(response):
+    # Ya renderizada: si se devuelve la Response (plantilla), Django la
+    # volvería a pasar por sync_to_async solo para ver que ya está hecha
+    plana = HttpResponse(response.content, status=response.status_code)
+    for cabecera, valor in response.items():
+        plana[cabecera] = valor
+    plana.data = response.data
+    return plana
+
+
+class AsyncReadMixin:
+    async_actions = ("list", "retrieve")
+    async_chunk_size = 2000
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        vista = super().as_view(actions, **initkwargs)
+        asincronas = {metodo: accion for metodo, accion in (actions or {}).items() if accion in cls.async_actions}
+        if not getattr(settings, "STREAMING_ASYNC_READS", False) or "get" not in asincronas:
+            return vista
+
+        vista_sync = sync_to_async(vista)
+
+        async def vista_async(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await vista_sync(request, *args, **kwargs)
+
+            # Lo mismo que hace la vista de ViewSetMixin.as_view
+            self = cls(**initkwargs)
+            self.action_map = {**actions, "head": actions.get("head", actions["get"])}
+            for metodo, accion in self.action_map.items():
+                setattr(self, metodo, getattr(self, accion))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        # cls / initkwargs / actions: el router y el navegador de la API los leen
+        update_wrapper(vista_async, vista)
+        return csrf_exempt(vista_async)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """APIView.dispatch en async (solo GET / HEAD de async_actions)."""
+        self.args = args
+        self.kwargs = kwargs
+        if hasattr(request, "auser"):
+            # Usuario de sesión cargado con el ORM async
+            request.user = await request.auser()
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sin_bloquear(self.initial, request, *args, **kwargs)
+            handler = getattr(self, f"a{self.action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if not isinstance(self.response, Response):
+            return self.response  # p. ej. el 304 del GET condicional
+        await sin_bloquear(self.response.render)
+        return _respuesta_plana(self.response)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await sin_bloquear(self.filter_queryset, self.get_queryset())
+
+        if self.paginator is not None:
+            if hasattr(self.paginator, "apaginate_queryset"):
+                page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            else:
+                page = await sync_to_async(self.paginate_queryset)(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(await sin_bloquear(lambda: serializer.data))
+
+        objetos = [obj async for obj in queryset.aiterator(chunk_size=self.async_chunk_size)]
+        serializer = self.get_serializer(objetos, many=True)
+        return Response(await sin_bloquear(lambda: serializer.data))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(await sin_bloquear(lambda: serializer.data))
+
+    async def aget_object(self):
+        """GenericAPIView.get_object con aget()."""
+        queryset = await sin_bloquear(self.filter_queryset, self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filtro = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+
+        # Mismos 404 que rest_framework.generics.get_object_or_404
+        try:
+            obj = await queryset.aget(**filtro)
+        except queryset.model.DoesNotExist:
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+
+        await sin_bloquear(self.check_object_permissions, self.request, obj)
+        return obj
@@ -0,0 +1,207 @@
+import copy
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+try:
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+    from rest_framework_simplejwt.models import TokenUser
+    from rest_framework_simplejwt.settings import api_settings as jwt_settings
+except ImportError:  # en requirements.txt; solo la activa SEMANA4 (DEFAULT_AUTHENTICATION_CLASSES)
+    JWTAuthentication = None
+
+
+# --------
+# AUTENTICACIÓN JWT SIN CONSULTA POR PETICIÓN
+# JWTAuthentication comprueba la firma del token en local pero luego
+# carga el User de la base de datos en cada petición. Aquí:
+#   - GET / HEAD / OPTIONS (CLAIMS_EN_LECTURA, con caché compartida): el
+#     usuario sale del propio token (TokenUser: id y poco más), sin consulta
+#   - el resto (valorar, escrituras): el User se guarda TTL segundos en
+#     una caché del proceso (LRU de MAXIMO usuarios); solo el primero
+#     de cada TTL va a la base de datos
+# Al cambiar la contraseña de un usuario (save() de User) se saca de la
+# caché y se revocan sus tokens emitidos hasta ese momento; al
+# desactivarlo, todos hasta que se reactive. La revocación va en la caché
+# de Django, así que solo la ven todos los procesos si esa caché es
+# compartida (Redis, Memcached, FileBased...). Con una del proceso
+# (LocMem, la de por defecto) un usuario desactivado en un proceso
+# seguiría leyendo con su token en los demás hasta que caducara: ahí
+# las lecturas tampoco usan los claims sino el User cacheado, y los
+# otros procesos lo ven desactivado como mucho a los TTL segundos (la
+# contraseña cambiada, solo si simplejwt tiene CHECK_REVOKE_TOKEN).
+# CACHE_COMPARTIDA = None lo deduce del backend; True / False lo fuerza.
+# Un User.objects.update() no lanza señales: llamar a revocar(pk) a mano.
+# --------
+AJUSTES = {
+    "TTL": 30.0,  # segundos que un User cargado vale sin volver a la BD
+    "MAXIMO": 10_000,  # usuarios en la caché del proceso
+    "CLAIMS_EN_LECTURA": True,  # solo con una caché compartida
+    "CACHE_COMPARTIDA": None,
+}
+BACKENDS_DEL_PROCESO = (LocMemCache, DummyCache)
+REVOCADO_PREFIX = "streaming:jwt:revocado:"
+CAMPOS_SENSIBLES = {"password", "is_active"}
+
+
+def ajustes():
+    return {**AJUSTES, **getattr(settings, "STREAMING_JWT", {})}
+
+
+def cache_compartida():
+    """¿Ven los demás procesos las revocaciones (la caché de Django)?"""
+    compartida = ajustes()["CACHE_COMPARTIDA"]
+    if compartida is None:
+        return not isinstance(caches[DEFAULT_CACHE_ALIAS], BACKENDS_DEL_PROCESO)
+    return compartida
+
+
+class _CacheUsuarios:
+    """user_id -> (caduca, User), compartida por los hilos del proceso."""
+
+    def __init__(self):
+        self._datos = OrderedDict()
+        self._candado = threading.Lock()
+
+    def obtener(self, clave):
+        with self._candado:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return entrada[1]
+
+    def guardar(self, clave, usuario, ttl, maximo):
+        with self._candado:
+            self._datos[clave] = (time.monotonic() + ttl, usuario)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > maximo:
+                self._datos.popitem(last=False)
+
+    def olvidar(self, clave):
+        with self._candado:
+            self._datos.pop(clave, None)
+
+    def vaciar(self):
+        with self._candado:
+            self._datos.clear()
+
+
+usuarios = _CacheUsuarios()
+
+
+# -------- revocación --------
+def revocar(user_id, todos=False):
+    """
+    Invalida los tokens de `user_id` emitidos hasta ahora (con todos=True,
+    también los que se emitan después: usuario desactivado) y lo saca de
+    la caché.
+    """
+    usuarios.olvidar(str(user_id))
+    if JWTAuthentication is None:
+        return  # sin simplejwt no hay tokens
+    # Pasado lo que dura un token de acceso ya no queda ninguno anterior.
+    # 'iat' va en segundos enteros: un token emitido en el mismo segundo
+    # pero después de revocar también se rechaza (nunca al revés)
+    cache.set(
+        f"{REVOCADO_PREFIX}{user_id}",
+        math.inf if todos else time.time(),
+        timeout=int(jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds()),
+    )
+
+
+def rehabilitar(user_id):
+    """Usuario reactivado: sus tokens nuevos vuelven a valer."""
+    usuarios.olvidar(str(user_id))
+    cache.delete(f"{REVOCADO_PREFIX}{user_id}")
+
+
+def revocado(user_id, emitido):
+    desde = cache.get(f"{REVOCADO_PREFIX}{user_id}")
+    return desde is not None and (emitido is None or emitido < desde)
+
+
+@receiver(pre_save, sender=User)
+def _comprobar_cambios(sender, instance, raw=False, update_fields=None, **kwargs):
+    # update_last_login (cada login) solo guarda last_login: sin consulta
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not CAMPOS_SENSIBLES & set(update_fields):
+        return
+    anterior = User.objects.filter(pk=instance.pk).values("password", "is_active").first()
+    if anterior is None:
+        return
+    if anterior["is_active"] and not instance.is_active:
+        instance._cambio_tokens = partial(revocar, instance.pk, todos=True)
+    elif not anterior["is_active"] and instance.is_active:
+        instance._cambio_tokens = partial(rehabilitar, instance.pk)
+    elif anterior["password"] != instance.password:
+        instance._cambio_tokens = partial(revocar, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def _usuario_guardado(sender, instance, **kwargs):
+    cambio = instance.__dict__.pop("_cambio_tokens", None)
+    if cambio is not None:
+        # Tras el commit: antes, otra petición podría volver a cachear el User viejo
+        transaction.on_commit(cambio)
+
+
+@receiver(post_delete, sender=User)
+def _usuario_borrado(sender, instance, **kwargs):
+    transaction.on_commit(partial(revocar, instance.pk, todos=True))
+
+
+# -------- clase de autenticación --------
+if JWTAuthentication is not None:
+
+    class CachedJWTAuthentication(JWTAuthentication):
+        """
+        JWTAuthentication con el usuario cacheado (ver arriba). Se activa en
+        REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"].
+        """
+
+        solo_lectura = False
+
+        def authenticate(self, request):
+            # DRF crea una instancia por petición (APIView.get_authenticators)
+            self.solo_lectura = request.method in SAFE_METHODS
+            return super().authenticate(request)
+
+        def get_user(self, validated_token):
+            try:
+                user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+            except KeyError:
+                raise InvalidToken("Token contained no recognizable user identification")
+
+            if revocado(user_id, validated_token.get("iat")):
+                raise AuthenticationFailed("Token revocado", code="token_revoked")
+
+            opciones = ajustes()
+            if self.solo_lectura and opciones["CLAIMS_EN_LECTURA"] and cache_compartida():
+                return TokenUser(validated_token)
+
+            clave = str(user_id)
+            usuario = usuarios.obtener(clave)
+            if usuario is None:
+                # Consulta, is_active y CHECK_REVOKE_TOKEN de simplejwt
+                usuario = super().get_user(validated_token)
+                usuarios.guardar(clave, usuario, opciones["TTL"], opciones["MAXIMO"])
+            # Copia: que una vista que lo modifique no toque el de la caché
+            return copy.copy(usuario)
@@ -0,0 +1,130 @@
+import statistics
+import time
+import types
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import valoraciones
+from .models import Categoria, Etiqueta, Pelicula, Perfil, Resena
+
+
+# --------
+# UTILIDADES DE BENCHMARK
+# Los benchmarks (comandos benchmark_*) nunca tocan la base de datos
+# real: crean una base de datos de pruebas (la misma que usa
+# `manage.py test`), la rellenan y la destruyen al acabar.
+# --------
+@contextmanager
+def base_de_datos_temporal():
+    nombre_original = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+
+BLOQUE = 5000
+
+# Para medir la base de datos y no la caché de respuestas (cache.py)
+SIN_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+def _en_bloques(modelo, objetos):
+    """bulk_create de un generador por bloques, sin tenerlo entero en memoria."""
+    creados = []
+    while True:
+        bloque = list(islice(objetos, BLOQUE))
+        if not bloque:
+            return creados
+        creados.extend(o.pk for o in modelo.objects.bulk_create(bloque))
+
+
+def sembrar_catalogo(peliculas=1000, usuarios=50, etiquetas=10, categorias=5, resenas_por_pelicula=5,
+                     perfiles=False):
+    """
+    Catálogo sintético con bulk_create (agregados recalculados al final).
+    Se inserta por bloques, así que vale también para cientos de miles de
+    películas y millones de reseñas. Devuelve los ids de las películas.
+    """
+    cats = Categoria.objects.bulk_create(
+        [Categoria(nombre=f"Categoría {i}", descripcion="Categoría de prueba") for i in range(categorias)]
+    )
+    tags = _en_bloques(Etiqueta, (Etiqueta(nombre=f"Etiqueta {i}") for i in range(etiquetas)))
+    users = _en_bloques(User, (User(username=f"usuario{i}") for i in range(usuarios)))
+    if perfiles:
+        _en_bloques(Perfil, (
+            Perfil(usuario_id=pk, fecha_nacimiento=date(1950, 1, 1) + timedelta(days=i % 20000))
+            for i, pk in enumerate(users)
+        ))
+
+    pelis = _en_bloques(Pelicula, (
+        Pelicula(
+            titulo=f"Película {i}",
+            descripcion="Descripción de prueba " * 5,
+            categoria=cats[i % categorias],
+            precio=f"{i % 20}.99",
+            fecha_estreno=date(1980, 1, 1) + timedelta(days=i * 7 % 16000),
+            duracion=80 + i % 90,
+        )
+        for i in range(peliculas)
+    ))
+
+    Through = Pelicula.etiquetas.through
+    _en_bloques(Through, (
+        Through(pelicula_id=pk, etiqueta_id=tags[(i + j) % etiquetas])
+        for i, pk in enumerate(pelis)
+        for j in range(min(i % 4, etiquetas))
+    ))
+
+    # (i + j) % usuarios: nunca repite (película, usuario) mientras resenas_por_pelicula <= usuarios
+    _en_bloques(Resena, (
+        Resena(pelicula_id=pk, usuario_id=users[(i + j) % usuarios], puntuacion=(i + j) % 11, comentario="Muy buena")
+        for i, pk in enumerate(pelis)
+        for j in range(min(resenas_por_pelicula, usuarios))
+    ))
+    valoraciones.recalcular_agregados()
+    return pelis
+
+
+def medir(funcion, repeticiones):
+    """Ejecuta `funcion` `repeticiones` veces y devuelve los tiempos en ms."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def mediana(tiempos):
+    return statistics.median(tiempos)
+
+
+def percentil(tiempos, p):
+    if len(tiempos) < 2:
+        return tiempos[0]
+    return statistics.quantiles(tiempos, n=100, method="inclusive")[p - 1]
+
+
+def urlconf_async():
+    """
+    Módulo de URLs de la API con las vistas construidas como bajo
+    Semana2/asgi.py (STREAMING_ASYNC_READS): para override_settings(ROOT_URLCONF=...).
+    """
+    from . import urls
+
+    with override_settings(STREAMING_ASYNC_READS=True):
+        router = DefaultRouter()
+        for prefijo, viewset, basename in urls.router.registry:
+            router.register(prefijo, viewset, basename=basename)
+        modulo = types.ModuleType("streaming_urls_async")
+        modulo.urlpatterns = [path("api/", include(router.urls))]
+    return modulo
@@ -0,0 +1,149 @@
+import hashlib
+import time
+
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from .replica import copia_anterior_a
+
+
+# --------
+# CACHÉ DE RESPUESTAS CON GENERACIONES
+# Cada modelo tiene un contador de "generación" en la caché (el instante
+# de su última escritura). La respuesta de un list / retrieve se guarda
+# junto a las generaciones de los modelos de los que depende: si alguna
+# ha cambiado, la entrada ya no vale. Las señales de signals.py suben la
+# generación en cada post_save / post_delete / m2m_changed.
+#
+# Funciona con cualquier backend de caché de Django (LocMem, FileBased,
+# Redis...): solo usa get / set / add / delete / get_many.
+# --------
+GEN_PREFIX = "streaming:gen:"
+RESP_PREFIX = "streaming:resp:"
+
+
+def _gen_key(model):
+    return f"{GEN_PREFIX}{model._meta.label_lower}"
+
+
+def bump(*models, alias="default"):
+    """Invalida las respuestas que dependen de estos modelos."""
+    ahora = time.time_ns()
+    caches[alias].set_many({_gen_key(m): ahora for m in models}, timeout=None)
+
+
+def generations(models, alias="default"):
+    cache = caches[alias]
+    claves = [_gen_key(m) for m in models]
+    valores = cache.get_many(claves)
+
+    # Generación perdida (expulsada de la caché): se empieza una nueva
+    faltan = [c for c in claves if c not in valores]
+    if faltan:
+        ahora = time.time_ns()
+        for clave in faltan:
+            cache.add(clave, ahora, timeout=None)
+        valores.update(cache.get_many(faltan))
+
+    return tuple(valores.get(c, 0) for c in claves)
+
+
+def response_key(request):
+    # path + query string normalizada + ámbito de autenticación
+    params = sorted(request.query_params.lists())
+    usuario = request.user
+    ambito = f"user:{usuario.pk}" if usuario.is_authenticated else "anon"
+    crudo = f"{request.get_host()}|{request.path}|{params}|{ambito}"
+    return RESP_PREFIX + hashlib.sha1(crudo.encode()).hexdigest()
+
+
+class CachedResponseMixin:
+    """
+    Cachea las respuestas de list / retrieve de un viewset.
+    `cache_models`: modelos cuyas escrituras invalidan la respuesta.
+
+    Stale-while-revalidate: cuando una entrada se queda vieja, la primera
+    petición la regenera (con un candado en la caché) y las que lleguen a
+    la vez durante `cache_stale_ttl` segundos reciben la versión anterior.
+    """
+    cache_models = ()
+    cache_alias = "default"
+    cache_timeout = 300
+    cache_stale_ttl = 30
+    cache_lock_timeout = 10
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    # Versiones async (ver asincrono.py): la caché se consulta igual
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(super().aretrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        respuesta, clave, gens, candado = self._cache_lookup(request)
+        if respuesta is not None:
+            return respuesta
+        try:
+            response = handler(request, *args, **kwargs)
+            self._cache_store(clave, gens, response)
+        finally:
+            self._cache_unlock(candado)
+        return response
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        respuesta, clave, gens, candado = self._cache_lookup(request)
+        if respuesta is not None:
+            return respuesta
+        try:
+            response = await handler(request, *args, **kwargs)
+            self._cache_store(clave, gens, response)
+        finally:
+            self._cache_unlock(candado)
+        return response
+
+    def _cache_lookup(self, request):
+        """(respuesta de la caché o None, clave, generaciones, candado)"""
+        cache = caches[self.cache_alias]
+        clave = response_key(request)
+        gens = generations(self.cache_models, self.cache_alias)
+
+        entrada = cache.get(clave)
+        candado = None
+        if entrada is not None:
+            if entrada["gens"] == gens:
+                return self._cached_response(entrada, "HIT"), clave, gens, None
+
+            # ¿cuánto hace que cambió lo que hay guardado?
+            cambios = [g for g, v in zip(gens, entrada["gens"]) if g != v]
+            vieja_desde = (time.time_ns() - max(cambios)) / 1e9
+            if vieja_desde <= self.cache_stale_ttl:
+                candado = f"{clave}:lock"
+                if not cache.add(candado, 1, timeout=self.cache_lock_timeout):
+                    return self._cached_response(entrada, "STALE"), clave, gens, None
+
+        return None, clave, gens, candado
+
+    def _cache_store(self, clave, gens, response):
+        # Leída de una copia de la réplica anterior a la última escritura:
+        # se sirve, pero no se guarda con las generaciones nuevas
+        vieja = bool(gens) and copia_anterior_a(max(gens))
+        if response.status_code == 200 and not vieja:
+            caches[self.cache_alias].set(
+                clave,
+                {"gens": gens, "data": response.data, "status": response.status_code},
+                timeout=self.cache_timeout,
+            )
+        response["X-Cache"] = "MISS"
+
+    def _cache_unlock(self, candado):
+        if candado is not None:
+            caches[self.cache_alias].delete(candado)
+
+    def _cached_response(self, entrada, estado):
+        return Response(entrada["data"], status=entrada["status"], headers={"X-Cache": estado})
@@ -0,0 +1,150 @@
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import Pelicula, Resena
+
+
+# --------
+# CLASIFICACIONES (mejor valoradas y tendencias, generales y por categoría)
+# Dos agregados más en Pelicula, que valoraciones.py mantiene en el
+# mismo UPDATE que num_resenas / suma_puntuaciones:
+#   - puntuacion_bayesiana = (PESO_PREVIO * media + suma) / (PESO_PREVIO + num)
+#     con la media de todas las reseñas: con pocas reseñas la película
+#     se queda cerca de la media y no arriba del todo por un único 10;
+#     sin reseñas, NULL (como puntuacion_media): no entra en la lista
+#   - tendencia = suma de exp((fecha_resena - ORIGEN) / tau) de sus
+#     reseñas (tau sale de VIDA_MEDIA_DIAS). Multiplicada por
+#     exp(-(ahora - ORIGEN) / tau) es la puntuación con decaimiento de
+#     hoy; como el factor es el mismo para todas, se ordena por la
+#     columna tal cual y una reseña nueva solo suma un número
+# Cada lista es un recorrido por índice con LIMIT (pelicula_*_idx).
+# compactar() (comando compactar_clasificaciones) corrige la deriva:
+# recalcula la media, la puntuación bayesiana de todas y la tendencia
+# exacta de las reseñas de los últimos VENTANA_DIAS días (las más
+# antiguas dejan de contar).
+# ORIGEN fijo: exp() llega al máximo de un float unos 9 años después con
+# la vida media por defecto; para entonces, moverlo y compactar.
+# --------
+AJUSTES = {
+    "PESO_PREVIO": 20,  # reseñas "a la media" que se suman a cada película
+    "VIDA_MEDIA_DIAS": 3.5,
+    "VENTANA_DIAS": 7,
+    "ORIGEN": datetime(2025, 1, 1, tzinfo=dt_timezone.utc),
+    "LIMITE": 10,  # tamaño por defecto de cada lista
+    "LIMITE_MAXIMO": 100,
+    "MEDIA_TIMEOUT": 3600,
+}
+MEDIA_KEY = "streaming:clasificaciones:media"
+
+
+def ajustes():
+    return {**AJUSTES, **getattr(settings, "STREAMING_CLASIFICACIONES", {})}
+
+
+def _tau():
+    return ajustes()["VIDA_MEDIA_DIAS"] * 86400 / math.log(2)
+
+
+def peso_tendencia(fecha):
+    """Lo que suma a `tendencia` una reseña de esa fecha."""
+    return math.exp((fecha - ajustes()["ORIGEN"]).total_seconds() / _tau())
+
+
+def tendencia_actual(valor, ahora=None):
+    """La columna `tendencia` como puntuación con decaimiento a día de hoy."""
+    ahora = ahora or timezone.now()
+    return valor * math.exp(-(ahora - ajustes()["ORIGEN"]).total_seconds() / _tau())
+
+
+def en_ventana(fecha, ahora=None):
+    ahora = ahora or timezone.now()
+    return fecha >= ahora - timedelta(days=ajustes()["VENTANA_DIAS"])
+
+
+# -------- puntuación bayesiana --------
+def _calcular_media():
+    totales = Pelicula.objects.aggregate(num=Sum("num_resenas"), suma=Sum("suma_puntuaciones"))
+    return totales["suma"] / totales["num"] if totales["num"] else 0.0
+
+
+def media_global():
+    """Media de todas las reseñas (cacheada: la recalcula compactar)."""
+    media = cache.get(MEDIA_KEY)
+    if media is None:
+        media = _calcular_media()
+        cache.set(MEDIA_KEY, media, timeout=ajustes()["MEDIA_TIMEOUT"])
+    return media
+
+
+def puntuacion_bayesiana(num, suma, media=None):
+    """Expresión para el UPDATE a partir de las de num_resenas / suma_puntuaciones."""
+    media = media_global() if media is None else media
+    previo = ajustes()["PESO_PREVIO"]
+    valor = (Value(previo * media) + Cast(suma, FloatField())) / (Value(float(previo)) + Cast(num, FloatField()))
+    return Case(When(GreaterThan(num, 0), then=valor), default=None, output_field=FloatField())
+
+
+# -------- compactación --------
+def compactar(ahora=None):
+    """
+    Recalcula media, puntuacion_bayesiana y tendencia de todas las
+    películas. Devuelve {"media", "en_tendencia", "segundos"}.
+    """
+    inicio = time.perf_counter()
+    ahora = ahora or timezone.now()
+    desde = ahora - timedelta(days=ajustes()["VENTANA_DIAS"])
+
+    # Solo las reseñas de la ventana, leídas por el índice de fecha
+    tendencias = defaultdict(float)
+    recientes = Resena.objects.filter(fecha_resena__gte=desde).order_by().values_list("pelicula_id", "fecha_resena")
+    for pelicula_id, fecha in recientes.iterator(chunk_size=10000):
+        tendencias[pelicula_id] += peso_tendencia(fecha)
+
+    with transaction.atomic():
+        media = _calcular_media()
+        Pelicula.objects.order_by().update(
+            puntuacion_bayesiana=puntuacion_bayesiana(F("num_resenas"), F("suma_puntuaciones"), media)
+        )
+        Pelicula.objects.filter(tendencia__gt=0).exclude(pk__in=list(tendencias)).update(tendencia=0)
+        peliculas = [Pelicula(pk=pk, tendencia=valor) for pk, valor in tendencias.items()]
+        Pelicula.objects.bulk_update(peliculas, ["tendencia"], batch_size=500)
+    cache.set(MEDIA_KEY, media, timeout=ajustes()["MEDIA_TIMEOUT"])
+
+    return {"media": media, "en_tendencia": len(tendencias), "segundos": time.perf_counter() - inicio}
+
+
+# -------- lectura --------
+def _lista(orden, condicion, categoria, limite):
+    queryset = Pelicula.objects.filter(activa=True, **condicion)
+    if categoria is not None:
+        queryset = queryset.filter(categoria_id=categoria)
+    return list(
+        queryset.order_by(f"-{orden}", "-id")
+        .values("id", "titulo", "categoria", "num_resenas", "puntuacion_media", orden)[:limite]
+    )
+
+
+def mejor_valoradas(categoria=None, limite=None):
+    filas = _lista("puntuacion_bayesiana", {"puntuacion_bayesiana__isnull": False}, categoria, limite or ajustes()["LIMITE"])
+    for fila in filas:
+        fila["puntuacion_bayesiana"] = round(fila["puntuacion_bayesiana"], 4)
+    return filas
+
+
+def tendencias(categoria=None, limite=None):
+    filas = _lista("tendencia", {"tendencia__gt": 0}, categoria, limite or ajustes()["LIMITE"])
+    ahora = timezone.now()
+    for fila in filas:
+        fila["tendencia"] = round(tendencia_actual(fila["tendencia"], ahora), 4)
+    return filas
@@ -0,0 +1,130 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .asincrono import sin_bloquear
+from .cache import generations
+
+
+# --------
+# GET CONDICIONAL (ETag / Last-Modified)
+# Antes de serializar nada se calcula un validador barato:
+#   - detalle: los campos de fecha de esa fila (una consulta por PK)
+#   - listado: MAX(<fechas>) y COUNT(*) del queryset filtrado
+# más las generaciones de la caché (cache.py), que cambian con cualquier
+# escritura en los modelos relacionados (etiquetas, categoría...).
+# Last-Modified es lo más reciente entre esas fechas y las generaciones
+# (cada una es el instante de la última escritura en su modelo): un
+# borrado, un cambio de etiquetas o una categoría renombrada no mueven
+# las fechas de las filas pero sí la generación.
+# Si el cliente manda If-None-Match / If-Modified-Since y coincide se
+# responde 304 sin tocar el serializer.
+# --------
+
+
+class ConditionalGetMixin:
+    # Campos de fecha que cambian cuando cambia la representación
+    conditional_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        validadores = self.list_validators(request)
+        return self.conditional_response(validadores, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        validadores = self.detail_validators(request, **kwargs)
+        return self.conditional_response(validadores, super().retrieve, request, *args, **kwargs)
+
+    # Versiones async (ver asincrono.py): mismas consultas con aaggregate / afirst
+    async def alist(self, request, *args, **kwargs):
+        queryset, agregados = await sin_bloquear(self._list_probe)
+        validadores = self._list_validators(request, await queryset.aaggregate(**agregados))
+        return await self.aconditional_response(validadores, super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        try:
+            fila = await self._detail_probe(**kwargs).afirst()
+        except (TypeError, ValueError, ValidationError):
+            fila = None
+        validadores = self._detail_validators(request, fila)
+        return await self.aconditional_response(validadores, super().aretrieve, request, *args, **kwargs)
+
+    def _probe_queryset(self):
+        return self.get_queryset().select_related(None).prefetch_related(None).order_by()
+
+    def _list_probe(self):
+        queryset = self.filter_queryset(self._probe_queryset())
+        agregados = {f"max_{campo}": Max(campo) for campo in self.conditional_fields}
+        agregados["total"] = Count("pk")
+        return queryset, agregados
+
+    def _list_validators(self, request, fila):
+        fechas = [fila[f"max_{campo}"] for campo in self.conditional_fields]
+        return self._validators(request, [*fechas, fila["total"]], fechas)
+
+    def list_validators(self, request):
+        queryset, agregados = self._list_probe()
+        return self._list_validators(request, queryset.aggregate(**agregados))
+
+    def _detail_probe(self, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filtro = {self.lookup_field: kwargs[lookup_url_kwarg]}
+        # "pk" delante: values_list() sin campos devolvería la fila entera
+        return self._probe_queryset().filter(**filtro).values_list("pk", *self.conditional_fields)
+
+    def _detail_validators(self, request, fila):
+        if fila is None:
+            return None  # que el retrieve normal devuelva el 404
+        fechas = list(fila[1:])
+        return self._validators(request, fechas, fechas)
+
+    def detail_validators(self, request, **kwargs):
+        try:
+            fila = self._detail_probe(**kwargs).first()
+        except (TypeError, ValueError, ValidationError):
+            fila = None  # PK mal formada: también 404 en el retrieve normal
+        return self._detail_validators(request, fila)
+
+    def _validators(self, request, valores, fechas):
+        gens = generations(getattr(self, "cache_models", ()), getattr(self, "cache_alias", "default"))
+        partes = [request.get_full_path(), request.accepted_renderer.format, *valores, *gens]
+        etag = hashlib.sha1("|".join(map(str, partes)).encode()).hexdigest()
+
+        marcas = [f.timestamp() for f in fechas if f is not None] + [g / 1e9 for g in gens]
+        last_modified = int(max(marcas)) if marcas else None
+        return etag, last_modified
+
+    def conditional_response(self, validadores, handler, request, *args, **kwargs):
+        no_modificado = self._not_modified(request, validadores)
+        if no_modificado is not None:
+            return no_modificado
+        return self._con_validadores(validadores, handler(request, *args, **kwargs))
+
+    async def aconditional_response(self, validadores, handler, request, *args, **kwargs):
+        no_modificado = self._not_modified(request, validadores)
+        if no_modificado is not None:
+            return no_modificado
+        return self._con_validadores(validadores, await handler(request, *args, **kwargs))
+
+    def _not_modified(self, request, validadores):
+        if validadores is None:
+            return None
+        etag, last_modified = validadores
+        no_modificado = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+        if no_modificado is not None:
+            return self._set_validators(no_modificado, etag, last_modified)
+        return None
+
+    def _con_validadores(self, validadores, response):
+        if validadores is not None and response.status_code == 200:
+            self._set_validators(response, *validadores)
+        return response
+
+    @staticmethod
+    def _set_validators(response, etag, last_modified):
+        response["ETag"] = quote_etag(etag)
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,233 @@
+import queue
+import threading
+from functools import partial
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import bump
+from .lotes import _existentes, crear_resenas
+from .models import Pelicula, Resena
+
+
+# --------
+# ESCRITOR ÚNICO DE RESEÑAS
+# Con SQLite solo puede escribir una conexión a la vez: con muchas
+# valoraciones simultáneas cada hilo espera el candado de la base de
+# datos y, pasado el timeout, falla con "database is locked".
+# Aquí todas las escrituras de reseñas van a una cola acotada que vacía
+# un único hilo escritor. Las altas que encuentra juntas en la cola van
+# en una sola transacción (un INSERT multi-fila + un UPDATE de
+# agregados, ver lotes.crear_resenas); cada petición espera su
+# resultado en un Future.
+#   - cola llena durante ESPERA_COLA segundos -> 503 (EscritorSaturado)
+#   - sin resultado tras TIMEOUT segundos -> 503 (EsperaAgotada); si aún
+#     no se había empezado a escribir se cancela y no queda nada a medias
+# Dentro de una transacción (tests, ATOMIC_REQUESTS...) se escribe en el
+# propio hilo: el escritor, con su conexión, no vería lo que aún no se
+# ha confirmado.
+# --------
+AJUSTES = {
+    "ACTIVO": True,
+    "COLA": 1000,  # peticiones en espera como mucho
+    "LOTE": 500,  # altas por transacción como mucho
+    "ESPERA_COLA": 0.5,  # segundos esperando hueco en la cola
+    "TIMEOUT": 10.0,  # segundos esperando el resultado
+}
+
+
+class EscritorSaturado(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Hay demasiadas reseñas pendientes de guardar, inténtalo de nuevo."
+    default_code = "escritor_saturado"
+    wait = 1  # Retry-After (lo pone el exception handler de DRF)
+
+
+class EsperaAgotada(EscritorSaturado):
+    default_detail = "La reseña no se ha guardado a tiempo, inténtalo de nuevo."
+    default_code = "espera_agotada"
+
+
+class _Alta:
+    __slots__ = ("pelicula_id", "usuario_id", "puntuacion", "comentario", "futuro")
+
+    def __init__(self, pelicula_id, usuario_id, puntuacion, comentario):
+        self.pelicula_id = pelicula_id
+        self.usuario_id = usuario_id
+        self.puntuacion = puntuacion
+        self.comentario = comentario
+        self.futuro = Future()
+
+
+class _Tarea:
+    __slots__ = ("funcion", "futuro")
+
+    def __init__(self, funcion):
+        self.funcion = funcion
+        self.futuro = Future()
+
+
+def guardar_altas(altas):
+    """
+    [_Alta] -> un resultado por alta, en el mismo orden:
+      {"estado": "creada", "resena_id": id}
+      {"estado": "conflicto"}  (ya había reseña de ese usuario: el 409 de valorar)
+      {"estado": "error", "errores": {...}}
+    """
+    peliculas = _existentes(Pelicula, {a.pelicula_id for a in altas})
+    usuarios = _existentes(User, {a.usuario_id for a in altas})
+
+    filas, vistos = [], set()
+    ahora = timezone.now()
+    for alta in altas:
+        par = (alta.pelicula_id, alta.usuario_id)
+        if alta.pelicula_id in peliculas and alta.usuario_id in usuarios and par not in vistos:
+            vistos.add(par)
+            filas.append((*par, alta.puntuacion, alta.comentario, ahora))
+
+    creadas = crear_resenas(filas, ahora) if filas else {}
+    if creadas:
+        # INSERT en bruto: sin post_save que invalide la caché
+        transaction.on_commit(partial(bump, Resena, Pelicula))
+
+    resultados = []
+    for alta in altas:
+        errores = {}
+        if alta.pelicula_id not in peliculas:
+            errores["pelicula"] = [f"La película {alta.pelicula_id} no existe"]
+        if alta.usuario_id not in usuarios:
+            errores["usuario_id"] = [f"El usuario {alta.usuario_id} no existe"]
+        if errores:
+            resultados.append({"estado": "error", "errores": errores})
+            continue
+        # pop: si el par se repite, solo el primero cuenta como creado
+        resena_id = creadas.pop((alta.pelicula_id, alta.usuario_id), None)
+        if resena_id is not None:
+            resultados.append({"estado": "creada", "resena_id": resena_id})
+        else:
+            resultados.append({"estado": "conflicto"})
+    return resultados
+
+
+class EscritorResenas:
+
+    def __init__(self, activo, cola, lote, espera_cola, timeout):
+        self.activo = activo
+        self.lote = lote
+        self.espera_cola = espera_cola
+        self.timeout = timeout
+        self._cola = queue.Queue(maxsize=cola)
+        self._candado = threading.Lock()
+        self._hilo = None
+
+    @classmethod
+    def desde_ajustes(cls):
+        ajustes = {**AJUSTES, **getattr(settings, "STREAMING_ESCRITOR_RESENAS", {})}
+        return cls(
+            activo=ajustes["ACTIVO"],
+            cola=ajustes["COLA"],
+            lote=ajustes["LOTE"],
+            espera_cola=ajustes["ESPERA_COLA"],
+            timeout=ajustes["TIMEOUT"],
+        )
+
+    # -------- API para las vistas --------
+    def valorar(self, pelicula_id, usuario_id, puntuacion, comentario=""):
+        """Crea la reseña si el usuario no tenía ya una. Ver guardar_altas."""
+        alta = _Alta(pelicula_id, usuario_id, puntuacion, comentario)
+        if self._en_linea():
+            return guardar_altas([alta])[0]
+        return self._esperar(alta)
+
+    def ejecutar(self, funcion):
+        """Cualquier otra escritura de reseñas: funcion() en el hilo escritor, en una transacción."""
+        if self._en_linea():
+            with transaction.atomic():
+                return funcion()
+        return self._esperar(_Tarea(funcion))
+
+    def _en_linea(self):
+        return not self.activo or connection.in_atomic_block
+
+    def _esperar(self, item):
+        self._arrancar()
+        try:
+            self._cola.put(item, timeout=self.espera_cola)
+        except queue.Full:
+            raise EscritorSaturado()
+        try:
+            return item.futuro.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            if item.futuro.cancel():
+                raise EsperaAgotada()  # no llegó a escribirse
+            # Ya está en una transacción (corta): mejor esperar que dejar la duda
+            return item.futuro.result()
+
+    # -------- hilo escritor --------
+    def _arrancar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._candado:
+            # is_alive: tras un fork (gunicorn --preload) el hilo no existe en el hijo
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="escritor-resenas", daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            # Sin esperas artificiales: lo que se acumula mientras se escribe
+            # un grupo va entero en el siguiente
+            grupo = [self._cola.get()]
+            while len(grupo) < self.lote:
+                try:
+                    grupo.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            self._procesar(grupo)
+
+    def _procesar(self, grupo):
+        # set_running_or_notify_cancel: descarta las que ya dieron timeout
+        vivos = [item for item in grupo if item.futuro.set_running_or_notify_cancel()]
+
+        altas = [item for item in vivos if isinstance(item, _Alta)]
+        if altas:
+            try:
+                resultados = guardar_altas(altas)
+            except Exception:
+                # Que una fila problemática no tumbe a todo el grupo: una a una
+                for alta in altas:
+                    self._resolver(alta.futuro, self._guardar_una, alta)
+            else:
+                for alta, resultado in zip(altas, resultados):
+                    alta.futuro.set_result(resultado)
+
+        for tarea in vivos:
+            if isinstance(tarea, _Tarea):
+                self._resolver(tarea.futuro, self._en_transaccion, tarea.funcion)
+
+    @staticmethod
+    def _guardar_una(alta):
+        return guardar_altas([alta])[0]
+
+    @staticmethod
+    def _en_transaccion(funcion):
+        with transaction.atomic():
+            return funcion()
+
+    @staticmethod
+    def _resolver(futuro, funcion, *args):
+        try:
+            resultado = funcion(*args)
+        except Exception as exc:
+            futuro.set_exception(exc)
+        else:
+            futuro.set_result(resultado)
+
+
+escritor = EscritorResenas.desde_ajustes()
@@ -0,0 +1,92 @@
+import csv
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# --------
+# EXPORTACIÓN EN STREAMING (NDJSON / CSV)
+# GET /<recurso>/exportar/?formato=ndjson|csv (+ los mismos filtros,
+# búsqueda, orden y ?fields= / ?expand= que el listado).
+# Se recorre el queryset con iterator(chunk_size=...): Django hace los
+# prefetch de cada bloque por separado, así que la memoria depende del
+# tamaño del bloque y no del número total de filas.
+# Con ASGI, Django lee entero un iterador síncrono antes de enviar nada
+# (todo el fichero en memoria): ahí se devuelve uno async que pide cada
+# bloque de líneas al hilo de la base de datos con sync_to_async.
+# --------
+
+
+async def _en_bloques(lineas, tamano):
+    # thread_sensitive (por defecto): siempre el mismo hilo, el del cursor
+    siguiente = sync_to_async(lambda: "".join(itertools.islice(lineas, tamano)))
+    try:
+        while bloque := await siguiente():
+            yield bloque
+    finally:
+        await sync_to_async(lineas.close)()
+
+
+class _Eco:
+    # csv.writer escribe en un "fichero" que solo devuelve la línea
+    def write(self, valor):
+        return valor
+
+
+def _celda(valor):
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, cls=JSONEncoder, ensure_ascii=False)
+    return valor
+
+
+class ExportMixin:
+    export_chunk_size = 500
+    export_formats = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+    }
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        formato = request.query_params.get("formato", "ndjson")
+        if formato not in self.export_formats:
+            return Response(
+                {"error": f"Formato no soportado. Usa: {', '.join(self.export_formats)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        filas = (
+            serializer.to_representation(obj)
+            for obj in queryset.iterator(chunk_size=self.export_chunk_size)
+        )
+        lineas = self._ndjson(filas) if formato == "ndjson" else self._csv(filas, serializer)
+        if isinstance(request._request, ASGIRequest):
+            lineas = _en_bloques(lineas, self.export_chunk_size)
+
+        response = StreamingHttpResponse(lineas, content_type=self.export_formats[formato])
+        nombre = f"{self.basename}s.{formato}"
+        response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+        return response
+
+    @staticmethod
+    def _ndjson(filas):
+        encoder = JSONEncoder(ensure_ascii=False)
+        for fila in filas:
+            yield encoder.encode(fila) + "\n"
+
+    @staticmethod
+    def _csv(filas, serializer):
+        columnas = [nombre for nombre, campo in serializer.fields.items() if not campo.write_only]
+        writer = csv.writer(_Eco())
+        yield writer.writerow(columnas)
+        for fila in filas:
+            yield writer.writerow([_celda(fila.get(c)) for c in columnas])
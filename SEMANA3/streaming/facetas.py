@@ -0,0 +1,75 @@
+import hashlib
+
+from django.core.cache import caches
+from django.db.models import Count
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .cache import generations
+from .replica import copia_anterior_a
+
+
+# --------
+# FACETAS (recuentos para el panel de filtros)
+# GET /<recurso>/facetas/?<los mismos filtros y ?search= que el listado>
+# Para cada entrada de `facet_fields` devuelve cuántos elementos del
+# conjunto filtrado hay por valor, de más a menos (como mucho
+# `facet_limit`). Una consulta GROUP BY por faceta sobre
+#   WHERE pk IN (SELECT pk del listado filtrado)
+# en vez de un count() por valor.
+# El resultado se cachea por "firma" de los filtros (solo los parámetros
+# que filtran: página, orden, ?fields... no cuentan) con las
+# generaciones de `facet_models`, como las respuestas de cache.py.
+# --------
+FACET_PREFIX = "streaming:facetas:"
+
+
+class FacetasMixin:
+    # nombre -> (campo, campo con el nombre a mostrar o None)
+    facet_fields = {}
+    facet_limit = 50
+    facet_models = ()
+    facet_cache_timeout = 300
+
+    @action(detail=False, methods=['get'])
+    def facetas(self, request):
+        cache = caches[self.cache_alias]
+        clave = self._facet_key(request)
+        gens = generations(self.facet_models, self.cache_alias)
+
+        entrada = cache.get(clave)
+        if entrada is not None and entrada["gens"] == gens:
+            return Response(entrada["data"], headers={"X-Cache": "HIT"})
+
+        ids = self.filter_queryset(self.get_queryset()).order_by().values("pk")
+        conjunto = self.get_queryset().model._default_manager.filter(pk__in=ids)
+        data = {nombre: self._faceta(conjunto, *campos) for nombre, campos in self.facet_fields.items()}
+
+        # Leída de una copia de la réplica anterior a la última escritura: no se guarda
+        if not (gens and copia_anterior_a(max(gens))):
+            cache.set(clave, {"gens": gens, "data": data}, timeout=self.facet_cache_timeout)
+        return Response(data, headers={"X-Cache": "MISS"})
+
+    def _faceta(self, conjunto, campo, etiqueta):
+        columnas = [campo, etiqueta] if etiqueta else [campo]
+        conjunto = conjunto.filter(**{f"{campo}__isnull": False})
+        if not etiqueta:
+            # Texto libre (pais, idioma...): vacío es "sin dato"
+            conjunto = conjunto.exclude(**{campo: ""})
+        filas = (
+            conjunto.values(*columnas)
+            .annotate(total=Count("pk"))
+            .order_by("-total", *columnas)[: self.facet_limit]
+        )
+        if etiqueta:
+            return [{"id": f[campo], "nombre": f[etiqueta], "total": f["total"]} for f in filas]
+        return [{"valor": f[campo], "total": f["total"]} for f in filas]
+
+    def _facet_key(self, request):
+        # Solo los parámetros que cambian el conjunto: los del FilterSet y ?search=
+        filtros = set(self.filterset_class.base_filters) if self.filterset_class else set()
+        filtros.add(api_settings.SEARCH_PARAM)
+        params = sorted((k, v) for k, v in request.query_params.lists() if k in filtros)
+        crudo = f"{self.basename}|{params}"
+        return FACET_PREFIX + hashlib.sha1(crudo.encode()).hexdigest()
@@ -1,10 +1,90 @@
+import re
+
 import django_filters
+from django.db import connections
+from django.db.models import F
+from rest_framework.filters import OrderingFilter, SearchFilter
+
 from .models import Pelicula
 
 class PeliculaFilter(django_filters.FilterSet):
     duracion_min = django_filters.NumberFilter(field_name="duracion", lookup_expr="gte")
     duracion_max = django_filters.NumberFilter(field_name="duracion", lookup_expr="lte")
+    # Los valores de /peliculas/facetas/
+    etiqueta = django_filters.NumberFilter(field_name="etiquetas")
+    pais = django_filters.CharFilter(field_name="ficha_tecnica__pais")
+    idioma = django_filters.CharFilter(field_name="ficha_tecnica__idioma_original")
 
     class Meta:
         model = Pelicula
-        fields = ["categoria"]
+        fields = ["categoria", "activa"]
+
+
+# --------
+# BÚSQUEDA CON FTS5
+# ?search= usa la tabla virtual de la migración 0004 (en vez de LIKE '%x%'
+# sobre toda la tabla): cada término se busca como prefijo, sin acentos
+# ("pelicula" encuentra "Película") y se anota el rango bm25 de la misma
+# fila del MATCH. La tabla va unida como un modelo más (PeliculaFTS, sin
+# gestionar) con el lookup __match: sin extra() ni SQL a mano.
+# Si la tabla no existe (otro motor / SQLite sin FTS5) se usa el
+# SearchFilter normal de DRF.
+# --------
+_TOKEN = re.compile(r"\w+")
+
+
+class FTS5SearchFilter(SearchFilter):
+    rank_field = "rango_busqueda"
+
+    def fts_disponible(self, queryset, tabla):
+        # Se mira una vez por conexión de SQLite (guardado en la propia
+        # conexión de Django): una conexión nueva, p. ej. tras migrar,
+        # vuelve a mirar; sin consulta extra en cada petición
+        conexion = connections[queryset.db]
+        if conexion.vendor != "sqlite":
+            return False
+        conexion.ensure_connection()
+        abierta, tablas = getattr(conexion, "fts_tablas", (None, None))
+        if abierta is not conexion.connection:
+            abierta, tablas = conexion.fts_tablas = (conexion.connection, {})
+        if tabla not in tablas:
+            tablas[tabla] = tabla in conexion.introspection.table_names(include_views=False)
+        return tablas[tabla]
+
+    def get_match_expression(self, terms):
+        tokens = [t for term in terms for t in _TOKEN.findall(term)]
+        return " ".join(f'"{t}"*' for t in tokens)
+
+    def filter_queryset(self, request, queryset, view):
+        relacion = getattr(view, "fts_relation", None)
+        terms = self.get_search_terms(request)
+        if not terms or relacion is None:
+            return super().filter_queryset(request, queryset, view)
+        fts = queryset.model._meta.get_field(relacion).related_model
+        if not self.fts_disponible(queryset, fts._meta.db_table):
+            return super().filter_queryset(request, queryset, view)
+
+        match = self.get_match_expression(terms)
+        if not match:
+            return queryset.none()
+
+        # Un solo MATCH: la tabla FTS (PeliculaFTS) se une por rowid (el
+        # planificador la recorre primero y busca cada película por su PK)
+        # y el rango bm25 se lee de esa misma fila, sin subconsulta por película
+        return queryset.filter(**{f"{relacion}__indice__match": match}).annotate(**{
+            self.rank_field: F(f"{relacion}__rango"),
+        })
+
+
+class RankedOrderingFilter(OrderingFilter):
+    """
+    Igual que OrderingFilter, pero si hay búsqueda FTS y el cliente no pide
+    ?ordering= se ordena por relevancia (bm25: menor es mejor).
+    """
+    rank_field = FTS5SearchFilter.rank_field
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get(self.ordering_param) is None:
+            if self.rank_field in queryset.query.annotations:
+                return [self.rank_field, *(self.get_default_ordering(view) or [])]
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,184 @@
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+
+# --------
+# GENERADOR DE DATOS SINTÉTICOS (comando generar_datos)
+# Todo sale de random.Random(semilla + bloque), así que la misma semilla
+# da exactamente los mismos datos, con o sin procesos en paralelo.
+# Las filas se devuelven como tuplas en el orden de COLUMNAS y se
+# insertan con executemany (sin pasar por el ORM). Las funciones son de
+# primer nivel para poder mandarlas a un ProcessPoolExecutor.
+#   - popularidad de las películas: Zipf (pocas películas con muchísimas
+#     reseñas y una cola larga con casi ninguna)
+#   - etiquetas y categorías: también Zipf (unas pocas muy usadas)
+#   - estrenos: más densos cuanto más recientes
+#   - reseñas: como mucho una por (película, usuario) (unique_resena)
+# --------
+REFERENCIA = datetime(2025, 1, 1)  # "hoy" de los datos: no depende del día en que se generan
+
+COLUMNAS = {
+    "categoria": ["id", "nombre", "descripcion"],
+    "etiqueta": ["id", "nombre"],
+    "usuario": [
+        "id", "password", "last_login", "is_superuser", "username", "first_name",
+        "last_name", "email", "is_staff", "is_active", "date_joined",
+    ],
+    "perfil": ["id", "usuario_id", "avatar", "fecha_nacimiento"],
+    "pelicula": [
+        "id", "titulo", "descripcion", "categoria_id", "precio", "fecha_estreno", "duracion", "activa",
+        "num_resenas", "suma_puntuaciones", "puntuacion_media", "ultima_resena",
+        "puntuacion_bayesiana", "tendencia", "created_at", "updated_at",
+    ],
+    "pelicula_etiquetas": ["pelicula_id", "etiqueta_id"],
+    "ficha": ["id", "pelicula_id", "idioma_original", "pais", "trailer_url"],
+    "resena": ["id", "pelicula_id", "usuario_id", "puntuacion", "comentario", "fecha_resena"],
+}
+
+GENEROS = ["Drama", "Comedia", "Acción", "Terror", "Ciencia ficción", "Animación", "Documental", "Thriller",
+           "Romance", "Aventura", "Fantasía", "Musical", "Western", "Bélico", "Histórico", "Policíaco"]
+TEMAS = ["viajes", "familia", "venganza", "espacio", "amistad", "crimen", "deporte", "magia", "guerra",
+         "robots", "música", "zombis", "política", "mar", "infancia", "futuro", "pasado", "ciudad"]
+PALABRAS = ["noche", "sombra", "camino", "fuego", "silencio", "invierno", "promesa", "ciudad", "sueño",
+            "regreso", "secreto", "verano", "último", "perdido", "rojo", "eterno", "lejano", "salvaje"]
+IDIOMAS = ["español", "inglés", "francés", "italiano", "japonés", "coreano", "alemán", "hindi"]
+PAISES = ["España", "Estados Unidos", "Francia", "Italia", "Japón", "Corea del Sur", "Alemania", "India",
+          "México", "Argentina", "Reino Unido"]
+COMENTARIOS = ["", "", "", "Muy buena", "Aburrida", "Imprescindible", "Nada especial",
+               "La volvería a ver", "Sobrevalorada", "Mejor de lo que esperaba"]
+PRECIOS = ["0.00", "1.99", "2.99", "3.99", "4.99", "5.99", "7.99", "9.99", "12.99"]
+
+
+def _fecha(valor):
+    # Mismo formato que guarda Django en SQLite (UTC, sin zona)
+    return valor.isoformat(" ", timespec="microseconds")
+
+
+def _rng(semilla, *partes):
+    return random.Random("-".join(map(str, (semilla, *partes))))
+
+
+def pesos_zipf(n, exponente):
+    """Pesos acumulados de una Zipf sobre n elementos (para random.choices)."""
+    return list(accumulate(1 / rango ** exponente for rango in range(1, n + 1)))
+
+
+def resenas_por_pelicula(semilla, peliculas, resenas, usuarios, exponente):
+    """
+    Cuántas reseñas tiene cada película: Zipf sobre un orden de
+    popularidad aleatorio, sin pasar de `usuarios` (una por usuario).
+    Lo que no cabe en las más populares se reparte entre el resto.
+    """
+    pesos = [1 / rango ** exponente for rango in range(1, peliculas + 1)]
+    cuotas = [0] * peliculas
+    libres = list(range(peliculas))
+    pendientes = min(resenas, peliculas * usuarios)
+    while pendientes and libres:
+        total = sum(pesos[i] for i in libres)
+        siguen = []
+        repartidas = 0
+        for i in libres:
+            extra = min(usuarios - cuotas[i], int(pendientes * pesos[i] / total))
+            cuotas[i] += extra
+            repartidas += extra
+            if cuotas[i] < usuarios:
+                siguen.append(i)
+        if not repartidas:
+            # Restos de redondeo: una más a las más populares que aún caben
+            for i in siguen[:pendientes]:
+                cuotas[i] += 1
+                repartidas += 1
+        pendientes -= repartidas
+        libres = siguen
+
+    # El rango de popularidad no tiene que ver con el id
+    orden = list(range(peliculas))
+    _rng(semilla, "popularidad").shuffle(orden)
+    return [cuotas[rango] for rango in orden]
+
+
+def catalogo_base(semilla, categorias, etiquetas, usuarios, primer_id):
+    """Categorías, etiquetas, usuarios y perfiles: {tabla: [filas]}."""
+    rng = _rng(semilla, "base")
+    filas = {
+        "categoria": [
+            (primer_id["categoria"] + i, f"{GENEROS[i % len(GENEROS)]} #{primer_id['categoria'] + i}",
+             f"Películas de {GENEROS[i % len(GENEROS)].lower()}")
+            for i in range(categorias)
+        ],
+        "etiqueta": [
+            (primer_id["etiqueta"] + i, f"{TEMAS[i % len(TEMAS)]} #{primer_id['etiqueta'] + i}")
+            for i in range(etiquetas)
+        ],
+        "usuario": [],
+        "perfil": [],
+    }
+    for i in range(usuarios):
+        pk = primer_id["usuario"] + i
+        registro = REFERENCIA - timedelta(seconds=rng.randrange(3650 * 86400))
+        # "!": contraseña no utilizable (como set_unusable_password)
+        filas["usuario"].append((pk, "!", None, False, f"carga{pk}", "", "", "", False, True, _fecha(registro)))
+        if rng.random() < 0.7:
+            nacimiento = REFERENCIA.date() - timedelta(days=rng.randrange(16 * 365, 80 * 365))
+            filas["perfil"].append((primer_id["perfil"] + len(filas["perfil"]), pk, "", nacimiento.isoformat()))
+    return filas
+
+
+def bloque_peliculas(semilla, bloque, ids, cuotas, categorias, etiquetas, usuarios, primera_resena,
+                     desplazamiento_ficha, exponente):
+    """
+    Películas `ids` con sus etiquetas, fichas y reseñas (cuotas[i] para
+    ids[i]). categorias / etiquetas / usuarios: (primer id, cuántos).
+    Las reseñas se numeran desde `primera_resena` y la ficha de la
+    película pk es pk + desplazamiento_ficha. Los agregados de reseñas
+    de cada película salen ya calculados.
+    """
+    rng = _rng(semilla, "peliculas", bloque)
+    pesos_categorias = pesos_zipf(categorias[1], exponente)
+    pesos_etiquetas = pesos_zipf(etiquetas[1], exponente)
+    filas = {"pelicula": [], "pelicula_etiquetas": [], "ficha": [], "resena": []}
+    siguiente_resena = primera_resena
+
+    for pk, cuota in zip(ids, cuotas):
+        # Estrenos: exponencial hacia atrás desde REFERENCIA (más recientes más densos)
+        dias = min(int(rng.expovariate(1 / 4000)), 100 * 365)
+        estreno = REFERENCIA.date() - timedelta(days=dias)
+        alta = datetime.combine(estreno, datetime.min.time()) + timedelta(seconds=rng.randrange(86400))
+
+        calidad = rng.gauss(6.5, 1.5)
+        suma, ultima = 0, None
+        inicio_resenas = max(alta, REFERENCIA - timedelta(days=3650))
+        margen = max(1, (REFERENCIA - inicio_resenas) // timedelta(microseconds=1))
+        for indice in rng.sample(range(usuarios[1]), cuota):
+            puntuacion = min(10, max(0, round(rng.gauss(calidad, 1.8))))
+            fecha = inicio_resenas + timedelta(microseconds=rng.randrange(margen))
+            filas["resena"].append((
+                siguiente_resena, pk, usuarios[0] + indice, puntuacion, rng.choice(COMENTARIOS), _fecha(fecha)
+            ))
+            siguiente_resena += 1
+            suma += puntuacion
+            ultima = fecha if ultima is None or fecha > ultima else ultima
+
+        titulo = f"{rng.choice(PALABRAS).capitalize()} {rng.choice(PALABRAS)} {pk}"
+        categoria = categorias[0] + rng.choices(range(categorias[1]), cum_weights=pesos_categorias)[0]
+        filas["pelicula"].append((
+            pk, titulo, f"Una historia de {rng.choice(TEMAS)} y {rng.choice(TEMAS)}.",
+            categoria if rng.random() < 0.95 else None,
+            rng.choice(PRECIOS), estreno.isoformat(), rng.randint(75, 180), rng.random() < 0.97,
+            cuota, suma, suma / cuota if cuota else None, _fecha(ultima) if ultima else None,
+            None, 0.0,  # clasificaciones: las rellena compactar() al terminar
+            _fecha(alta), _fecha(max(alta, ultima) if ultima else alta),
+        ))
+
+        cuantas = min(etiquetas[1], int(rng.expovariate(1 / 2.5)))
+        elegidas = set()
+        while len(elegidas) < cuantas:
+            elegidas.add(rng.choices(range(etiquetas[1]), cum_weights=pesos_etiquetas)[0])
+        filas["pelicula_etiquetas"].extend((pk, etiquetas[0] + e) for e in sorted(elegidas))
+
+        if rng.random() < 0.8:
+            filas["ficha"].append((
+                pk + desplazamiento_ficha, pk, rng.choice(IDIOMAS), rng.choice(PAISES), f"https://trailers.example.com/{pk}",
+            ))
+    return filas
@@ -0,0 +1,280 @@
+import csv
+import json
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import valoraciones
+from .lotes import BATCH_SIZE, _insertar_resenas
+from .models import Categoria, Etiqueta, FichaTecnica, Pelicula, Resena
+
+
+# --------
+# LECTURA Y CONVERSIÓN DE FICHEROS DE CATÁLOGO (CSV / JSONL)
+# Las funciones de conversión son de primer nivel para poder mandarlas a
+# un ProcessPoolExecutor (ver el comando importar_catalogo).
+# Las relaciones llegan por clave natural:
+#   categoria / etiquetas -> nombre, pelicula -> titulo, usuario -> username
+# --------
+CAMPOS = {
+    "categorias": (Categoria, ["nombre", "descripcion"]),
+    "etiquetas": (Etiqueta, ["nombre"]),
+    "peliculas": (Pelicula, ["titulo", "descripcion", "precio", "fecha_estreno", "duracion", "activa"]),
+    "fichas": (FichaTecnica, ["idioma_original", "pais", "trailer_url"]),
+    "resenas": (Resena, ["puntuacion", "comentario", "fecha_resena"]),  # sin fecha: la de la importación
+}
+
+# Claves naturales que se copian tal cual (se resuelven luego con los mapas)
+RELACIONES = {
+    "peliculas": ["categoria", "etiquetas"],
+    "fichas": ["pelicula", "pelicula_estreno"],
+    "resenas": ["pelicula", "pelicula_estreno", "usuario"],
+}
+
+BOOLEANOS = {"true": True, "1": True, "si": True, "sí": True, "false": False, "0": False, "no": False}
+
+
+def leer_filas(ruta):
+    """Genera (numero_de_fila, fila). En JSONL la fila es la línea sin decodificar."""
+    ruta = Path(ruta)
+    with ruta.open(encoding="utf-8", newline="") as fichero:
+        if ruta.suffix.lower() == ".csv":
+            for numero, fila in enumerate(csv.DictReader(fichero), start=1):
+                yield numero, fila
+        else:
+            numero = 0
+            for linea in fichero:
+                if linea.strip():
+                    numero += 1
+                    yield numero, linea
+
+
+def _valor(field, crudo):
+    if field.get_internal_type() == "BooleanField" and isinstance(crudo, str):
+        crudo = BOOLEANOS.get(crudo.strip().lower(), crudo)
+    valor = field.to_python(crudo)
+    if field.get_internal_type() == "DateTimeField" and timezone.is_naive(valor):
+        valor = timezone.make_aware(valor)  # sin zona: la del proyecto (TIME_ZONE)
+    field.run_validators(valor)
+    return valor
+
+
+def _convertir(tipo, fila):
+    if isinstance(fila, str):
+        fila = json.loads(fila)
+    if not isinstance(fila, dict):
+        raise ValueError("se esperaba un objeto")
+
+    modelo, campos = CAMPOS[tipo]
+    datos = {}
+    for nombre in campos:
+        field = modelo._meta.get_field(nombre)
+        crudo = fila.get(nombre)
+        if crudo is None or crudo == "":
+            if not field.has_default() and not field.blank:
+                raise ValueError(f"falta el campo {nombre}")
+            continue  # valor por defecto del modelo
+        datos[nombre] = _valor(field, crudo)
+
+    for nombre in RELACIONES.get(tipo, ()):
+        crudo = fila.get(nombre)
+        if crudo in (None, ""):
+            continue
+        if nombre == "etiquetas" and isinstance(crudo, str):
+            crudo = [e.strip() for e in crudo.split("|") if e.strip()]
+        elif nombre == "pelicula_estreno":
+            crudo = Pelicula._meta.get_field("fecha_estreno").to_python(crudo)
+        datos[nombre] = crudo
+    return datos
+
+
+def convertir_bloque(tipo, filas):
+    """[(numero, fila)] -> [(numero, datos, error)]"""
+    salida = []
+    for numero, fila in filas:
+        try:
+            salida.append((numero, _convertir(tipo, fila), None))
+        except (ValueError, ValidationError) as exc:
+            mensaje = "; ".join(exc.messages) if isinstance(exc, ValidationError) else str(exc)
+            salida.append((numero, None, mensaje))
+    return salida
+
+
+# --------
+# ESCRITURA EN BLOQUE
+# Los mapas clave natural -> id se cargan una vez (una consulta por
+# modelo) y se amplían con lo que se va insertando, así resolver una
+# relación no cuesta ninguna consulta por fila.
+# Cada bloque va en su propia transacción: si el proceso se corta, lo
+# confirmado se queda y el punto de control permite seguir desde ahí.
+# El punto de control es un fichero y se escribe después del commit: un
+# corte entre los dos repite el bloque, así que repetirlo no puede
+# duplicar nada. Todo lo que ya existe por su clave natural se salta
+# (películas: titulo + fecha_estreno; reseñas: unique_resena...).
+# --------
+class Importador:
+
+    def __init__(self, crear_usuarios=False):
+        self.crear_usuarios = crear_usuarios
+        self._categorias = None
+        self._etiquetas = None
+        self._peliculas = None
+        self._usuarios = None
+
+    # -------- mapas de claves naturales (perezosos) --------
+    @property
+    def categorias(self):
+        if self._categorias is None:
+            self._categorias = dict(Categoria.objects.values_list("nombre", "id"))
+        return self._categorias
+
+    @property
+    def etiquetas(self):
+        if self._etiquetas is None:
+            self._etiquetas = dict(Etiqueta.objects.values_list("nombre", "id"))
+        return self._etiquetas
+
+    @property
+    def peliculas(self):
+        # titulo -> id y (titulo, fecha_estreno) -> id para desambiguar
+        if self._peliculas is None:
+            self._peliculas = {}
+            for titulo, fecha, pk in Pelicula.objects.values_list("titulo", "fecha_estreno", "id"):
+                self._peliculas[titulo] = pk
+                self._peliculas[(titulo, fecha)] = pk
+        return self._peliculas
+
+    @property
+    def usuarios(self):
+        if self._usuarios is None:
+            self._usuarios = dict(User.objects.values_list("username", "id"))
+        return self._usuarios
+
+    def _pelicula(self, datos):
+        titulo = datos.pop("pelicula", None)
+        estreno = datos.pop("pelicula_estreno", None)
+        if titulo is None:
+            raise ValueError("falta la película")
+        clave = (titulo, estreno) if estreno is not None else titulo
+        if clave not in self.peliculas:
+            raise ValueError(f"la película {titulo!r} no existe")
+        return self.peliculas[clave]
+
+    # -------- un bloque por modelo --------
+    def guardar(self, tipo, filas):
+        """filas: [(numero, datos)] -> (insertadas, [(numero, error)])"""
+        return getattr(self, f"_guardar_{tipo}")(filas)
+
+    def _por_nombre(self, modelo, mapa, filas):
+        nuevas = {d["nombre"]: modelo(**d) for _, d in filas if d["nombre"] not in mapa}
+        with transaction.atomic():
+            modelo.objects.bulk_create(nuevas.values(), batch_size=BATCH_SIZE, ignore_conflicts=True)
+        # ignore_conflicts no devuelve ids: se leen en una sola consulta
+        mapa.update(modelo.objects.filter(nombre__in=list(nuevas)).values_list("nombre", "id"))
+        return len(nuevas), []
+
+    def _guardar_categorias(self, filas):
+        return self._por_nombre(Categoria, self.categorias, filas)
+
+    def _guardar_etiquetas(self, filas):
+        return self._por_nombre(Etiqueta, self.etiquetas, filas)
+
+    def _guardar_peliculas(self, filas):
+        errores, nuevas, vistas = [], [], set()
+        for numero, datos in filas:
+            clave = (datos["titulo"], datos["fecha_estreno"])
+            if clave in self.peliculas or clave in vistas:
+                continue  # ya importada (bloque repetido tras un corte, o fila repetida)
+            categoria = datos.pop("categoria", None)
+            etiquetas = datos.pop("etiquetas", [])
+            if categoria is not None and categoria not in self.categorias:
+                errores.append((numero, f"la categoría {categoria!r} no existe"))
+                continue
+            faltan = [e for e in etiquetas if e not in self.etiquetas]
+            if faltan:
+                errores.append((numero, f"las etiquetas {faltan} no existen"))
+                continue
+            pelicula = Pelicula(**datos, categoria_id=self.categorias.get(categoria))
+            vistas.add(clave)
+            nuevas.append((pelicula, {self.etiquetas[e] for e in etiquetas}))
+
+        Through = Pelicula.etiquetas.through
+        with transaction.atomic():
+            Pelicula.objects.bulk_create([p for p, _ in nuevas], batch_size=BATCH_SIZE)
+            Through.objects.bulk_create(
+                [Through(pelicula_id=p.pk, etiqueta_id=e) for p, ids in nuevas for e in ids],
+                batch_size=BATCH_SIZE,
+            )
+
+        for pelicula, _ in nuevas:
+            self.peliculas[pelicula.titulo] = pelicula.pk
+            self.peliculas[(pelicula.titulo, pelicula.fecha_estreno)] = pelicula.pk
+        return len(nuevas), errores
+
+    def _guardar_fichas(self, filas):
+        errores, fichas = [], []
+        for numero, datos in filas:
+            try:
+                fichas.append(FichaTecnica(pelicula_id=self._pelicula(datos), **datos))
+            except ValueError as exc:
+                errores.append((numero, str(exc)))
+
+        # OneToOne: una película que ya tiene ficha (o repetida en el bloque) se ignora
+        con_ficha = set(
+            FichaTecnica.objects.filter(pelicula_id__in=[f.pelicula_id for f in fichas])
+            .values_list("pelicula_id", flat=True)
+        )
+        nuevas = {}
+        for ficha in fichas:
+            if ficha.pelicula_id not in con_ficha:
+                nuevas.setdefault(ficha.pelicula_id, ficha)
+
+        with transaction.atomic():
+            FichaTecnica.objects.bulk_create(nuevas.values(), batch_size=BATCH_SIZE, ignore_conflicts=True)
+        return len(nuevas), errores
+
+    def _crear_usuarios(self, nombres):
+        usuarios = []
+        for nombre in nombres:
+            usuario = User(username=nombre)
+            usuario.set_unusable_password()
+            usuarios.append(usuario)
+        User.objects.bulk_create(usuarios, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        self.usuarios.update(User.objects.filter(username__in=nombres).values_list("username", "id"))
+
+    def _guardar_resenas(self, filas):
+        if self.crear_usuarios:
+            faltan = {d["usuario"] for _, d in filas if d.get("usuario") and d["usuario"] not in self.usuarios}
+            if faltan:
+                self._crear_usuarios(sorted(faltan))
+
+        errores, resenas = [], []
+        ahora = timezone.now()
+        for numero, datos in filas:
+            usuario = datos.pop("usuario", None)
+            try:
+                pelicula_id = self._pelicula(datos)
+                if usuario not in self.usuarios:
+                    raise ValueError(f"el usuario {usuario!r} no existe")
+            except ValueError as exc:
+                errores.append((numero, str(exc)))
+                continue
+            resenas.append((
+                pelicula_id, self.usuarios[usuario], datos["puntuacion"], datos.get("comentario", ""),
+                datos.get("fecha_resena", ahora),
+            ))
+
+        insertadas = 0
+        with transaction.atomic():
+            # unique_resena: una reseña repetida (película, usuario) se ignora
+            for inicio in range(0, len(resenas), BATCH_SIZE):
+                insertadas += len(_insertar_resenas(resenas[inicio:inicio + BATCH_SIZE]))
+            # Con miles de películas por bloque, el CASE de resenas_creadas_en_bloque
+            # crece demasiado: se recalculan desde Resena (subconsultas por índice)
+            valoraciones.recalcular_agregados(
+                Pelicula.objects.filter(pk__in={fila[0] for fila in resenas})
+            )
+        return insertadas, errores
@@ -0,0 +1,235 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import valoraciones
+from .cache import bump
+from .models import Categoria, Etiqueta, Pelicula, Resena
+from .serializers import PeliculaLoteSerializer, ValorarLoteSerializer
+
+
+# --------
+# CARGA MASIVA DE PELÍCULAS
+# Por cada bloque de `batch_size` elementos:
+#   1. se valida cada elemento (solo tipos / rangos, sin consultas)
+#   2. categorías, etiquetas e IDs a actualizar se comprueban con una
+#      consulta por modelo (pk__in), no una por ID
+#   3. bulk_create / bulk_update y las filas de Pelicula.etiquetas en un
+#      único bulk_create, todo en la misma transacción
+# Los elementos con errores se devuelven con su índice y no se guardan.
+# Un "id" repetido dentro del bloque solo vale la primera vez: las
+# siguientes son un error (no se sabría cuál de los dos datos gana).
+# --------
+BATCH_SIZE = 500
+
+
+def _error(indice, errores):
+    return {"indice": indice, "estado": "error", "errores": errores}
+
+
+def _existentes(modelo, ids):
+    if not ids:
+        return set()
+    return set(modelo.objects.filter(pk__in=ids).values_list("pk", flat=True))
+
+
+def _guardar_bloque(inicio, items):
+    resultados = {}
+    validos = []
+
+    for i, item in enumerate(items, start=inicio):
+        if not isinstance(item, dict):
+            resultados[i] = _error(i, {"non_field_errors": ["Se esperaba un objeto"]})
+            continue
+        serializer = PeliculaLoteSerializer(data=item, partial="id" in item)
+        if serializer.is_valid():
+            validos.append((i, serializer.validated_data))
+        else:
+            resultados[i] = _error(i, serializer.errors)
+
+    # Comprobación en bloque de las claves ajenas
+    categorias = _existentes(Categoria, {d["categoria"] for _, d in validos if d.get("categoria") is not None})
+    etiquetas = _existentes(Etiqueta, {e for _, d in validos for e in d.get("etiquetas", ())})
+    ids = {d["id"] for _, d in validos if "id" in d}
+    peliculas = Pelicula.objects.in_bulk(ids) if ids else {}
+
+    nuevas, modificadas, campos_modificados = [], [], {"updated_at"}
+    etiquetas_por_item = {}
+    primero = {}  # id -> índice del elemento que lo actualiza
+    ahora = timezone.now()
+
+    for i, datos in validos:
+        if "id" in datos and datos["id"] in primero:
+            resultados[i] = _error(i, {"id": [f"La película {datos['id']} ya va en el elemento {primero[datos['id']]}"]})
+            continue
+
+        errores = {}
+        categoria = datos.get("categoria")
+        if categoria is not None and categoria not in categorias:
+            errores["categoria"] = [f"La categoría {categoria} no existe"]
+        faltan = sorted(set(datos.get("etiquetas", ())) - etiquetas)
+        if faltan:
+            errores["etiquetas"] = [f"Las etiquetas {faltan} no existen"]
+        if "id" in datos and datos["id"] not in peliculas:
+            errores["id"] = [f"La película {datos['id']} no existe"]
+        if errores:
+            resultados[i] = _error(i, errores)
+            continue
+
+        campos = {k: v for k, v in datos.items() if k not in ("id", "etiquetas", "categoria")}
+        if "categoria" in datos:
+            campos["categoria_id"] = categoria
+
+        if "id" in datos:
+            primero[datos["id"]] = i
+            pelicula = peliculas[datos["id"]]
+            for campo, valor in campos.items():
+                setattr(pelicula, campo, valor)
+            pelicula.updated_at = ahora
+            campos_modificados.update(campos)
+            modificadas.append((i, pelicula))
+        else:
+            nuevas.append((i, Pelicula(**campos)))
+
+        if "etiquetas" in datos:
+            etiquetas_por_item[i] = set(datos["etiquetas"])
+
+    with transaction.atomic():
+        Pelicula.objects.bulk_create([p for _, p in nuevas], batch_size=BATCH_SIZE)
+        if modificadas:
+            Pelicula.objects.bulk_update(
+                [p for _, p in modificadas], sorted(campos_modificados), batch_size=BATCH_SIZE
+            )
+
+        # N:M: se sustituyen las etiquetas de los elementos que las traen
+        Through = Pelicula.etiquetas.through
+        por_item = dict(nuevas + modificadas)
+        Through.objects.filter(
+            pelicula_id__in=[p.pk for i, p in modificadas if i in etiquetas_por_item]
+        ).delete()
+        Through.objects.bulk_create(
+            [
+                Through(pelicula_id=por_item[i].pk, etiqueta_id=etiqueta)
+                for i, ids_etiquetas in etiquetas_por_item.items()
+                for etiqueta in ids_etiquetas
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    for i, pelicula in nuevas:
+        resultados[i] = {"indice": i, "estado": "creada", "id": pelicula.pk}
+    for i, pelicula in modificadas:
+        resultados[i] = {"indice": i, "estado": "actualizada", "id": pelicula.pk}
+    return [resultados[i] for i in sorted(resultados)]
+
+
+def guardar_peliculas(items, batch_size=BATCH_SIZE):
+    resultados = []
+    for inicio in range(0, len(items), batch_size):
+        resultados.extend(_guardar_bloque(inicio, items[inicio:inicio + batch_size]))
+
+    # bulk_create / bulk_update no lanzan señales: invalidar a mano (tras el commit)
+    transaction.on_commit(partial(bump, Pelicula))
+    return resultados
+
+
+# --------
+# VALORACIONES EN BLOQUE
+# Un INSERT multi-fila con ON CONFLICT DO NOTHING contra unique_resena:
+# RETURNING dice qué pares (pelicula, usuario) se han creado; el resto
+# es un conflicto (ya había reseña), igual que el 409 de valorar.
+# Los agregados de las películas se ajustan con un único UPDATE.
+# --------
+def _insertar_resenas(filas):
+    """filas: [(pelicula_id, usuario_id, puntuacion, comentario, fecha)] -> {(pelicula, usuario): id}"""
+    if not filas:
+        return {}
+
+    tabla = connection.ops.quote_name(Resena._meta.db_table)
+    columnas = ("pelicula_id", "usuario_id", "puntuacion", "comentario", "fecha_resena")
+    valores = ", ".join(["(%s, %s, %s, %s, %s)"] * len(filas))
+    sql = (
+        f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES {valores} "
+        f"ON CONFLICT (pelicula_id, usuario_id) DO NOTHING "
+        f"RETURNING id, pelicula_id, usuario_id"
+    )
+    params = [
+        v if i != 4 else connection.ops.adapt_datetimefield_value(v)
+        for fila in filas for i, v in enumerate(fila)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {(pelicula, usuario): pk for pk, pelicula, usuario in cursor.fetchall()}
+
+
+def crear_resenas(filas, fecha):
+    """
+    Inserta las reseñas (pares sin repetir) y ajusta los agregados de sus
+    películas en una transacción. Devuelve {(pelicula, usuario): id} de
+    las creadas; las que faltan chocaban con unique_resena.
+    """
+    with transaction.atomic():
+        creadas = _insertar_resenas(filas)
+
+        por_pelicula = {}
+        for fila in filas:
+            if (fila[0], fila[1]) in creadas:
+                n, suma = por_pelicula.get(fila[0], (0, 0))
+                por_pelicula[fila[0]] = (n + 1, suma + fila[2])
+        valoraciones.resenas_creadas_en_bloque(por_pelicula, fecha)
+    return creadas
+
+
+def _valorar_bloque(inicio, items):
+    resultados = {}
+    validos = []
+
+    for i, item in enumerate(items, start=inicio):
+        serializer = ValorarLoteSerializer(data=item)
+        if serializer.is_valid():
+            validos.append((i, serializer.validated_data))
+        else:
+            resultados[i] = _error(i, serializer.errors)
+
+    peliculas = _existentes(Pelicula, {d["pelicula"] for _, d in validos})
+    usuarios = _existentes(User, {d["usuario_id"] for _, d in validos})
+
+    filas, pares, vistos = [], {}, set()
+    ahora = timezone.now()
+    for i, datos in validos:
+        errores = {}
+        if datos["pelicula"] not in peliculas:
+            errores["pelicula"] = [f"La película {datos['pelicula']} no existe"]
+        if datos["usuario_id"] not in usuarios:
+            errores["usuario_id"] = [f"El usuario {datos['usuario_id']} no existe"]
+        if errores:
+            resultados[i] = _error(i, errores)
+            continue
+
+        par = (datos["pelicula"], datos["usuario_id"])
+        pares[i] = par
+        if par not in vistos:  # un par repetido en el lote: solo vale el primero
+            vistos.add(par)
+            filas.append((*par, datos["puntuacion"], datos.get("comentario", ""), ahora))
+
+    creadas = crear_resenas(filas, ahora)
+
+    for i, par in pares.items():
+        # pop: si el par se repite en el lote, solo el primero cuenta como creado
+        resena_id = creadas.pop(par, None)
+        if resena_id is not None:
+            resultados[i] = {"indice": i, "estado": "creada", "resena_id": resena_id}
+        else:
+            resultados[i] = {"indice": i, "estado": "conflicto", "error": "Ya has valorado esta película"}
+    return [resultados[i] for i in sorted(resultados)]
+
+
+def guardar_valoraciones(items, batch_size=BATCH_SIZE):
+    resultados = []
+    for inicio in range(0, len(items), batch_size):
+        resultados.extend(_valorar_bloque(inicio, items[inicio:inicio + batch_size]))
+
+    transaction.on_commit(partial(bump, Resena, Pelicula))
+    return resultados
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_started
+from django.db import connection, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.views import APIView
+
+from streaming import autenticacion
+from streaming.benchmarks import SIN_CACHE, base_de_datos_temporal, medir, percentil, sembrar_catalogo
+
+
+# --------
+# BENCHMARK: JWTAuthentication vs CachedJWTAuthentication
+#   python manage.py benchmark_autenticacion     (con simplejwt: SEMANA4)
+# Las mismas peticiones con "Authorization: Bearer <token>" autenticadas
+# con una clase y con la otra: consultas por petición (en el hilo de la
+# petición; las altas de valorar las escribe el escritor de reseñas) y
+# p50 / p95 de latencia. valorar usa cada vez un par película-usuario
+# nuevo y el token de ese usuario.
+# --------
+@contextmanager
+def _autenticacion(clase):
+    # Las vistas heredan authentication_classes de APIView (se fija al importar DRF)
+    anterior = APIView.authentication_classes
+    APIView.authentication_classes = [clase]
+    try:
+        yield
+    finally:
+        APIView.authentication_classes = anterior
+
+
+class Command(BaseCommand):
+    help = "Compara consultas y latencia de peticiones autenticadas con JWTAuthentication y con CachedJWTAuthentication"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeticiones", type=int, default=200, help="Peticiones por endpoint y clase (200)")
+        parser.add_argument("--usuarios", type=int, default=50, help="Usuarios con token (50)")
+
+    def handle(self, *args, **options):
+        cacheada = getattr(autenticacion, "CachedJWTAuthentication", None)
+        if cacheada is None:
+            raise CommandError("Hace falta djangorestframework-simplejwt (configuración de SEMANA4)")
+        if options["repeticiones"] < 1 or options["usuarios"] < 1:
+            raise CommandError("--repeticiones y --usuarios deben ser mayores que 0")
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        with base_de_datos_temporal(), override_settings(CACHES=SIN_CACHE, ALLOWED_HOSTS=["testserver"]):
+            self.pelis = sembrar_catalogo(peliculas=200, usuarios=options["usuarios"], resenas_por_pelicula=0)
+            usuarios = list(User.objects.order_by("pk"))
+            self.usuarios = [usuario.pk for usuario in usuarios]
+            self.tokens = {usuario.pk: str(AccessToken.for_user(usuario)) for usuario in usuarios}
+            self.client = Client()
+            self.pares = 0  # siguiente par (película, usuario) sin reseña para valorar
+
+            self.stdout.write(
+                f"{'endpoint':<20} {'consultas JWT':>14} {'cacheada':>9} "
+                f"{'p50 JWT':>8} {'cacheada':>9} {'p95 JWT':>8} {'cacheada':>9}   (ms)"
+            )
+            for nombre, peticion in self._escenarios().items():
+                resultados = []
+                for clase in (JWTAuthentication, cacheada):
+                    autenticacion.usuarios.vaciar()
+                    with _autenticacion(clase):
+                        resultados.append(self._medir(peticion, options["repeticiones"]))
+                (c1, t1), (c2, t2) = resultados
+                self.stdout.write(
+                    f"{nombre:<20} {c1:>14.2f} {c2:>9.2f} "
+                    f"{percentil(t1, 50):>8.2f} {percentil(t2, 50):>9.2f} "
+                    f"{percentil(t1, 95):>8.2f} {percentil(t2, 95):>9.2f}"
+                )
+
+    def _escenarios(self):
+        pelicula = self.pelis[0]
+        return {
+            "peliculas-list": lambda usuario: self.client.get(
+                "/api/peliculas/", HTTP_AUTHORIZATION=self._bearer(usuario)
+            ),
+            "peliculas-detail": lambda usuario: self.client.get(
+                f"/api/peliculas/{pelicula}/", HTTP_AUTHORIZATION=self._bearer(usuario)
+            ),
+            "peliculas-valorar": lambda usuario: self._valorar(),
+        }
+
+    def _bearer(self, usuario):
+        return f"Bearer {self.tokens[usuario]}"
+
+    def _valorar(self):
+        indice = self.pares
+        self.pares += 1
+        pelicula = self.pelis[indice % len(self.pelis)]
+        usuario = self.usuarios[(indice // len(self.pelis)) % len(self.usuarios)]
+        return self.client.post(
+            f"/api/peliculas/{pelicula}/valorar/",
+            {"usuario_id": usuario, "puntuacion": 7},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self._bearer(usuario),
+        )
+
+    def _medir(self, peticion, repeticiones):
+        # Cada petición con el token de un usuario (en rueda): con la caché,
+        # solo el primero de cada usuario consulta
+        usuarios = iter(self.usuarios * (repeticiones // len(self.usuarios) + 2))
+
+        def una():
+            respuesta = peticion(next(usuarios))
+            if respuesta.status_code >= 400:
+                raise CommandError(f"{respuesta.status_code}: {respuesta.content[:200]!r}")
+
+        una()  # calentamiento
+        # request_started vacía connection.queries: ver benchmark_endpoints
+        request_started.disconnect(reset_queries)
+        reset_queries()
+        try:
+            with CaptureQueriesContext(connection) as consultas:
+                tiempos = medir(una, repeticiones)
+        finally:
+            request_started.connect(reset_queries)
+        return len(consultas.captured_queries) / repeticiones, tiempos
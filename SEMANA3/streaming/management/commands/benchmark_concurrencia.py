@@ -0,0 +1,107 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from streaming.benchmarks import SIN_CACHE, base_de_datos_temporal, percentil, sembrar_catalogo, urlconf_async
+
+
+# --------
+# BENCHMARK: lecturas del catálogo con N clientes concurrentes
+#   WSGI: vistas síncronas, un hilo por petición en curso hasta --hilos
+#         (lo que haría gunicorn --threads)
+#   ASGI: vistas async (asincrono.py), todas las peticiones en un solo
+#         bucle de eventos, como un worker de uvicorn
+# Todo en el mismo proceso y sin red; la caché de respuestas se
+# desactiva para medir el acceso a la base de datos y no la caché.
+# Ojo: con SQLite el ORM async sigue pasando cada consulta por un único
+# hilo (sync_to_async), así que ASGI no gana en rendimiento bruto; lo que
+# cambia es cuántos hilos hacen falta para N clientes.
+# --------
+URLS = [
+    "/api/peliculas/",
+    "/api/peliculas/?page=2",
+    "/api/peliculas/?paginacion=cursor&ordering=-titulo",
+    "/api/peliculas/{pk}/",
+    "/api/categorias/",
+    "/api/etiquetas/",
+    "/api/resenas/?paginacion=cursor",
+]
+
+
+class Command(BaseCommand):
+    help = "Compara lecturas del catálogo con vistas WSGI (hilos) y ASGI (async) a 50/200/1000 clientes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", type=int, nargs="+", default=[50, 200, 1000])
+        parser.add_argument("--peticiones", type=int, default=5, help="Peticiones por cliente (5)")
+        parser.add_argument("--hilos", type=int, default=32, help="Hilos del servidor WSGI simulado (32)")
+        parser.add_argument("--peliculas", type=int, default=500)
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal(), override_settings(CACHES=SIN_CACHE, ALLOWED_HOSTS=["testserver"]):
+            pelis = sembrar_catalogo(peliculas=options["peliculas"])
+            self.urls = [u.format(pk=pelis[len(pelis) // 2]) for u in URLS]
+            self.urlconf = urlconf_async()
+
+            self.stdout.write(
+                f"{'clientes':>8} {'modo':>5} {'pet/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'hilos':>6}   (ms)"
+            )
+            for clientes in options["clientes"]:
+                for modo in ("wsgi", "asgi"):
+                    segundos, tiempos, hilos = getattr(self, f"_{modo}")(
+                        clientes, options["peticiones"], options["hilos"]
+                    )
+                    self.stdout.write(
+                        f"{clientes:>8} {modo:>5} {len(tiempos) / segundos:>8.0f}"
+                        f" {percentil(tiempos, 50):>8.1f} {percentil(tiempos, 95):>8.1f}"
+                        f" {percentil(tiempos, 99):>8.1f} {hilos:>6}"
+                    )
+
+    def _peticiones(self, cliente, peticiones):
+        for i in range(peticiones):
+            yield self.urls[(cliente + i) % len(self.urls)]
+
+    # -------- WSGI: pool de hilos --------
+    def _wsgi(self, clientes, peticiones, hilos):
+        def cliente(numero):
+            client, tiempos = Client(), []
+            try:
+                for url in self._peticiones(numero, peticiones):
+                    inicio = time.perf_counter()
+                    respuesta = client.get(url)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                    assert respuesta.status_code == 200, url
+            finally:
+                connections.close_all()  # conexión propia de cada hilo
+            return tiempos
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(hilos, clientes)) as pool:
+            resultados = list(pool.map(cliente, range(clientes)))
+        segundos = time.perf_counter() - inicio
+        return segundos, [t for r in resultados for t in r], min(hilos, clientes)
+
+    # -------- ASGI: un bucle de eventos --------
+    def _asgi(self, clientes, peticiones, hilos):
+        async def cliente(numero):
+            client, tiempos = AsyncClient(), []
+            for url in self._peticiones(numero, peticiones):
+                inicio = time.perf_counter()
+                respuesta = await client.get(url)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                assert respuesta.status_code == 200, url
+            return tiempos
+
+        async def todos():
+            return await asyncio.gather(*(cliente(n) for n in range(clientes)))
+
+        with override_settings(ROOT_URLCONF=self.urlconf):
+            inicio = time.perf_counter()
+            resultados = asyncio.run(todos())
+            segundos = time.perf_counter() - inicio
+        # 1 bucle + el hilo de la base de datos de sync_to_async
+        return segundos, [t for r in resultados for t in r], 2
@@ -0,0 +1,268 @@
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_started
+from django.db import connection, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from streaming import clasificaciones, similares
+from streaming.benchmarks import SIN_CACHE, base_de_datos_temporal, percentil, sembrar_catalogo
+from streaming.models import Categoria, Etiqueta, Perfil, Resena
+
+
+# --------
+# BENCHMARK DE LOS ENDPOINTS DE LA API
+#   python manage.py benchmark_endpoints --salida antes.json
+#   python manage.py benchmark_endpoints --salida despues.json --comparar antes.json
+# Siembra una base de datos temporal del tamaño pedido (por defecto 100k
+# películas, 2k etiquetas, 1M reseñas y 50k usuarios con perfil) y
+# recorre todas las rutas del router con el cliente de pruebas.
+# Por endpoint: p50 / p95 / p99 de latencia, consultas por petición y
+# pico de memoria (tracemalloc, en una pasada aparte para no inflar los
+# tiempos). Con --comparar se marca como regresión un p95 más lento que
+# el del fichero base por encima de --umbral o cualquier consulta de más.
+# Lo que los endpoints leen ya precalculado (películas parecidas, la
+# tendencia de las clasificaciones) se calcula antes de medir, solo si se
+# va a medir ese endpoint.
+# --------
+
+
+class Command(BaseCommand):
+    help = "Mide latencia, consultas y memoria de cada endpoint de la API sobre un catálogo sintético"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--peliculas", type=int, default=100_000)
+        parser.add_argument("--etiquetas", type=int, default=2_000)
+        parser.add_argument("--resenas", type=int, default=1_000_000, help="Total aproximado de reseñas")
+        parser.add_argument("--usuarios", type=int, default=50_000)
+        parser.add_argument("--categorias", type=int, default=20)
+        parser.add_argument("--repeticiones", type=int, default=20, help="Peticiones medidas por endpoint (20)")
+        parser.add_argument("--solo", nargs="+", metavar="ENDPOINT", help="Mide solo estos endpoints")
+        parser.add_argument("--salida", metavar="FICHERO", help="Guarda los resultados en JSON")
+        parser.add_argument("--comparar", metavar="FICHERO", help="JSON de una ejecución anterior")
+        parser.add_argument("--umbral", type=float, default=0.2, help="Regresión si el p95 empeora más de esto (0.2)")
+
+    def handle(self, *args, **options):
+        if options["repeticiones"] < 1:
+            raise CommandError("--repeticiones debe ser mayor que 0")
+        base = self._leer(options["comparar"]) if options["comparar"] else None
+        datos = {c: options[c] for c in ("peliculas", "etiquetas", "resenas", "usuarios", "categorias")}
+
+        with base_de_datos_temporal(), override_settings(CACHES=SIN_CACHE, ALLOWED_HOSTS=["testserver"]):
+            inicio = time.perf_counter()
+            self.pelis = sembrar_catalogo(
+                peliculas=datos["peliculas"],
+                usuarios=datos["usuarios"],
+                etiquetas=datos["etiquetas"],
+                categorias=datos["categorias"],
+                resenas_por_pelicula=max(1, datos["resenas"] // max(1, datos["peliculas"])),
+                perfiles=True,
+            )
+            self.stdout.write(f"Catálogo sembrado en {time.perf_counter() - inicio:.1f}s: {datos}")
+
+            self.client = Client()
+            self.resenas_por_pelicula = max(1, datos["resenas"] // max(1, datos["peliculas"]))
+            self.usuarios = datos["usuarios"]
+            self.primer_usuario = User.objects.order_by("pk").values_list("pk", flat=True).first()
+            escenarios = self._escenarios()
+            if options["solo"]:
+                desconocidos = set(options["solo"]) - set(escenarios)
+                if desconocidos:
+                    raise CommandError(f"Endpoints desconocidos: {', '.join(sorted(desconocidos))}")
+                escenarios = {n: e for n, e in escenarios.items() if n in options["solo"]}
+            self._precalcular(escenarios)
+
+            self.stdout.write(
+                f"{'endpoint':<36} {'p50':>8} {'p95':>8} {'p99':>8} {'consultas':>10} {'memoria KB':>11}   (ms)"
+            )
+            resultados = {}
+            for nombre, peticion in escenarios.items():
+                resultados[nombre] = self._medir(peticion, options["repeticiones"])
+                self._linea(nombre, resultados[nombre])
+
+        informe = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "entorno": {"python": platform.python_version(), "django": django.get_version()},
+            "datos": datos,
+            "repeticiones": options["repeticiones"],
+            "endpoints": resultados,
+        }
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8") as fichero:
+                json.dump(informe, fichero, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+        if base is not None:
+            self._comparar(base, informe, options["umbral"])
+
+    # -------- escenarios --------
+    def _escenarios(self):
+        """
+        nombre -> peticion(i): hace la i-ésima petición y devuelve la
+        respuesta. Las escrituras usan un par (película, usuario) distinto
+        en cada repetición para no acabar midiendo el 409.
+        """
+        pelicula = self.pelis[len(self.pelis) // 2]
+        categoria = Categoria.objects.values_list("pk", flat=True).first()
+        etiqueta = Etiqueta.objects.values_list("pk", flat=True).first()
+        resena = Resena.objects.values_list("pk", flat=True).first()
+        perfil = Perfil.objects.values_list("pk", flat=True).first()
+        pagina_media = max(1, len(self.pelis) // 20)
+        get = self.client.get
+
+        return {
+            "peliculas-list": lambda i: get("/api/peliculas/"),
+            "peliculas-list-pagina": lambda i: get("/api/peliculas/", {"page": pagina_media}),
+            "peliculas-list-cursor": lambda i: get("/api/peliculas/", {"paginacion": "cursor"}),
+            "peliculas-list-filtros": lambda i: get(
+                "/api/peliculas/", {"categoria": categoria, "duracion_min": 90, "ordering": "-puntuacion_media"}
+            ),
+            "peliculas-list-busqueda": lambda i: get("/api/peliculas/", {"search": "película"}),
+            "peliculas-detail": lambda i: get(f"/api/peliculas/{pelicula}/"),
+            "peliculas-resenas": lambda i: get(f"/api/peliculas/{pelicula}/resenas/"),
+            "peliculas-similares": lambda i: get(f"/api/peliculas/{pelicula}/similares/"),
+            "peliculas-mejor-valoradas": lambda i: get("/api/peliculas/mejor-valoradas/"),
+            "peliculas-mejor-valoradas-categoria": lambda i: get(
+                "/api/peliculas/mejor-valoradas/", {"categoria": categoria, "limite": 50}
+            ),
+            "peliculas-tendencias": lambda i: get("/api/peliculas/tendencias/"),
+            "peliculas-tendencias-categoria": lambda i: get(
+                "/api/peliculas/tendencias/", {"categoria": categoria, "limite": 50}
+            ),
+            "peliculas-facetas": lambda i: get("/api/peliculas/facetas/", {"categoria": categoria}),
+            "peliculas-exportar": lambda i: get(
+                "/api/peliculas/exportar/", {"categoria": categoria, "duracion_max": 85}
+            ),
+            "peliculas-valorar": lambda i: self._post(
+                f"/api/peliculas/{self._pelicula(i)}/valorar/",
+                {"usuario_id": self._usuario(i, 0), "puntuacion": 7},
+            ),
+            "peliculas-lote": lambda i: self._post("/api/peliculas/lote/", [
+                {
+                    "titulo": f"Lote {i}-{n}", "descripcion": "Alta en lote", "precio": "4.99",
+                    "fecha_estreno": "2020-01-01", "duracion": 100, "categoria": categoria,
+                }
+                for n in range(100)
+            ]),
+            "peliculas-valorar-lote": lambda i: self._post("/api/peliculas/valorar-lote/", [
+                {"pelicula": self._pelicula(i * 100 + n), "usuario_id": self._usuario(i * 100 + n, 1), "puntuacion": 5}
+                for n in range(100)
+            ]),
+            "categorias-list": lambda i: get("/api/categorias/"),
+            "categorias-detail": lambda i: get(f"/api/categorias/{categoria}/"),
+            "etiquetas-list": lambda i: get("/api/etiquetas/"),
+            "etiquetas-detail": lambda i: get(f"/api/etiquetas/{etiqueta}/"),
+            "resenas-list": lambda i: get("/api/resenas/"),
+            "resenas-list-cursor": lambda i: get("/api/resenas/", {"paginacion": "cursor"}),
+            "resenas-detail": lambda i: get(f"/api/resenas/{resena}/"),
+            "resenas-create": lambda i: self._post("/api/resenas/", {
+                "pelicula": self._pelicula(i), "usuario": self._usuario(i, 2), "puntuacion": 8,
+            }),
+            "perfiles-list": lambda i: get("/api/perfiles/"),
+            "perfiles-detail": lambda i: get(f"/api/perfiles/{perfil}/"),
+        }
+
+    def _precalcular(self, escenarios):
+        if "peliculas-similares" in escenarios:
+            resumen = similares.calcular(todas=True)
+            self.stdout.write(f"Similares calculadas en {resumen['segundos']:.1f}s")
+        if any(n.startswith(("peliculas-mejor-valoradas", "peliculas-tendencias")) for n in escenarios):
+            # recalcular_agregados (al sembrar) no rellena la tendencia
+            resumen = clasificaciones.compactar()
+            self.stdout.write(f"Clasificaciones compactadas en {resumen['segundos']:.1f}s")
+
+    def _post(self, url, datos):
+        return self.client.post(url, datos, content_type="application/json")
+
+    def _pelicula(self, i):
+        return self.pelis[i % len(self.pelis)]
+
+    def _usuario(self, i, desplazamiento):
+        # Las reseñas sembradas usan los usuarios i .. i + resenas_por_pelicula - 1
+        return (i + self.resenas_por_pelicula + desplazamiento) % self.usuarios + self.primer_usuario
+
+    # -------- medición --------
+    @staticmethod
+    def _consumir(respuesta):
+        if respuesta.streaming:
+            for _ in respuesta.streaming_content:
+                pass
+        return respuesta
+
+    def _medir(self, peticion, repeticiones):
+        # Calentamiento + consultas y memoria (con tracemalloc todo va más lento)
+        # request_started vacía connection.queries y, con el log lleno (9000
+        # con DEBUG), CaptureQueriesContext cuenta 0: se vacía antes a mano
+        request_started.disconnect(reset_queries)
+        reset_queries()
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self._consumir(peticion(0))
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            request_started.connect(reset_queries)
+
+        tiempos = []
+        for i in range(1, repeticiones + 1):
+            inicio = time.perf_counter()
+            self._consumir(peticion(i))
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+
+        return {
+            "estado": respuesta.status_code,
+            "p50": round(percentil(tiempos, 50), 3),
+            "p95": round(percentil(tiempos, 95), 3),
+            "p99": round(percentil(tiempos, 99), 3),
+            "consultas": len(consultas),
+            "memoria_pico_kb": round(pico / 1024, 1),
+        }
+
+    def _linea(self, nombre, r):
+        texto = (
+            f"{nombre:<36} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f}"
+            f" {r['consultas']:>10} {r['memoria_pico_kb']:>11.0f}"
+        )
+        if r["estado"] >= 400:
+            texto += f"   HTTP {r['estado']}"
+            self.stdout.write(self.style.WARNING(texto))
+        else:
+            self.stdout.write(texto)
+
+    # -------- comparación con una ejecución anterior --------
+    @staticmethod
+    def _leer(ruta):
+        try:
+            with open(ruta, encoding="utf-8") as fichero:
+                return json.load(fichero)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"No se puede leer {ruta}: {exc}")
+
+    def _comparar(self, base, actual, umbral):
+        if base.get("datos") != actual["datos"]:
+            self.stdout.write(self.style.WARNING("Aviso: los datos sembrados no son los mismos que en la base"))
+
+        regresiones = []
+        for nombre, ahora in actual["endpoints"].items():
+            antes = base.get("endpoints", {}).get(nombre)
+            if antes is None:
+                continue
+            if ahora["p95"] > antes["p95"] * (1 + umbral):
+                regresiones.append(f"{nombre}: p95 {antes['p95']:.1f} -> {ahora['p95']:.1f} ms")
+            if ahora["consultas"] > antes["consultas"]:
+                regresiones.append(f"{nombre}: consultas {antes['consultas']} -> {ahora['consultas']}")
+            if ahora["estado"] != antes["estado"]:
+                regresiones.append(f"{nombre}: HTTP {antes['estado']} -> {ahora['estado']}")
+
+        if regresiones:
+            for linea in regresiones:
+                self.stderr.write(self.style.ERROR(f"  REGRESIÓN {linea}"))
+            raise CommandError(f"{len(regresiones)} regresiones respecto a la base")
+        self.stdout.write(self.style.SUCCESS("Sin regresiones respecto a la base"))
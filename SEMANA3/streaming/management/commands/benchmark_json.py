@@ -0,0 +1,63 @@
+import io
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from streaming.benchmarks import base_de_datos_temporal, mediana, medir, sembrar_catalogo
+from streaming.models import Pelicula
+from streaming.parsers import FastJSONParser, orjson
+from streaming.planner import plan_queryset
+from streaming.renderers import FastJSONRenderer
+from streaming.serializers import PeliculaSerializer
+
+
+# --------
+# BENCHMARK: FastJSONRenderer / FastJSONParser vs los de DRF
+# Se serializa una página de películas una vez y se mide solo el paso a
+# bytes (render) y de vuelta (parse). Antes se comprueba que el
+# resultado es idéntico.
+# --------
+class Command(BaseCommand):
+    help = "Compara el renderer/parser JSON rápido con los de DRF a 10/100/1000 películas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--repeticiones", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson no está instalado: se mide el camino de respaldo"))
+
+        with base_de_datos_temporal():
+            sembrar_catalogo(peliculas=max(options["filas"]))
+            self.stdout.write(
+                f"{'filas':>6} {'render DRF':>11} {'render rápido':>14} {'x':>6}"
+                f" {'parse DRF':>10} {'parse rápido':>13} {'x':>6}   (ms)"
+            )
+            for filas in options["filas"]:
+                self._medir(filas, options["repeticiones"])
+
+    def _medir(self, filas, repeticiones):
+        queryset = plan_queryset(Pelicula.objects.order_by("id"), PeliculaSerializer())
+        datos = PeliculaSerializer(queryset[:filas], many=True).data
+
+        drf, rapido = JSONRenderer(), FastJSONRenderer()
+        contenido = drf.render(datos)
+        if rapido.render(datos) != contenido:
+            self.stderr.write(self.style.ERROR(f"{filas} filas: el renderer no da la misma salida"))
+            return
+
+        parser_drf, parser_rapido = JSONParser(), FastJSONParser()
+        if parser_rapido.parse(io.BytesIO(contenido)) != parser_drf.parse(io.BytesIO(contenido)):
+            self.stderr.write(self.style.ERROR(f"{filas} filas: el parser no da el mismo resultado"))
+            return
+
+        r_drf = mediana(medir(lambda: drf.render(datos), repeticiones))
+        r_rapido = mediana(medir(lambda: rapido.render(datos), repeticiones))
+        p_drf = mediana(medir(lambda: parser_drf.parse(io.BytesIO(contenido)), repeticiones))
+        p_rapido = mediana(medir(lambda: parser_rapido.parse(io.BytesIO(contenido)), repeticiones))
+        self.stdout.write(
+            f"{filas:>6} {r_drf:>11.2f} {r_rapido:>14.2f} {r_drf / r_rapido:>5.1f}x"
+            f" {p_drf:>10.2f} {p_rapido:>13.2f} {p_drf / p_rapido:>5.1f}x"
+        )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from streaming.benchmarks import base_de_datos_temporal, mediana, medir, sembrar_catalogo
+from streaming.models import Pelicula
+from streaming.planner import plan_queryset
+from streaming.serializers import PeliculaSerializer
+
+
+# --------
+# BENCHMARK: PeliculaSerializer compilado vs DRF
+# Para cada tamaño de página se cargan las películas una sola vez (con
+# el mismo plan de consultas que el listado) y se mide solo la
+# serialización. Antes de medir se comprueba que el JSON es idéntico.
+# --------
+class _SinCompilar(PeliculaSerializer):
+    compiled_read = False
+
+
+class Command(BaseCommand):
+    help = "Compara el serializer compilado de Pelicula con el de DRF a 10/100/1000 filas por página"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--repeticiones", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal():
+            sembrar_catalogo(peliculas=max(options["filas"]))
+            self.stdout.write(f"{'filas':>6} {'DRF (ms)':>10} {'compilado (ms)':>15} {'x':>6}")
+            for filas in options["filas"]:
+                self._medir(filas, options["repeticiones"])
+
+    def _medir(self, filas, repeticiones):
+        queryset = plan_queryset(Pelicula.objects.order_by("id"), PeliculaSerializer())
+        peliculas = list(queryset[:filas])
+        renderer = JSONRenderer()
+
+        def drf():
+            return _SinCompilar(peliculas, many=True).data
+
+        def compilado():
+            return PeliculaSerializer(peliculas, many=True).data
+
+        if renderer.render(drf()) != renderer.render(compilado()):
+            self.stderr.write(self.style.ERROR(f"{filas} filas: la salida no coincide"))
+            return
+
+        t_drf = mediana(medir(drf, repeticiones))
+        t_compilado = mediana(medir(compilado, repeticiones))
+        self.stdout.write(f"{filas:>6} {t_drf:>10.2f} {t_compilado:>15.2f} {t_drf / t_compilado:>5.1f}x")
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from streaming.similares import calcular
+
+
+# --------
+# PELÍCULAS PARECIDAS PARA /peliculas/{id}/similares/
+#   python manage.py calcular_similares              # solo lo que ha cambiado
+#   python manage.py calcular_similares --todas      # todo de nuevo
+#   python manage.py calcular_similares --intervalo 60
+# Ver streaming/similares.py. La pasada incremental deja las filas igual
+# que --todas: recalcula las películas que han cambiado y las que
+# comparten (o compartían) etiquetas o usuarios con ellas.
+# --------
+
+
+class Command(BaseCommand):
+    help = "Precalcula las películas parecidas de cada película (etiquetas y usuarios en común)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--todas", action="store_true", help="Recalcula todas, no solo las que han cambiado")
+        parser.add_argument("--vecinos", type=int, default=None, help="Parecidas por película (20)")
+        parser.add_argument("--bloque", type=int, default=None, help="Películas por transacción (200)")
+        parser.add_argument("--intervalo", type=float, default=None, help="Repite cada N segundos (incremental)")
+
+    def handle(self, *args, **options):
+        for opcion in ("vecinos", "bloque", "intervalo"):
+            if options[opcion] is not None and options[opcion] <= 0:
+                raise CommandError(f"--{opcion} debe ser mayor que 0")
+
+        todas = options["todas"]
+        while True:
+            informe = calcular(todas=todas, vecinos=options["vecinos"], bloque=options["bloque"])
+            if informe["recalculadas"] or options["verbosity"] >= 2 or options["intervalo"] is None:
+                self.stdout.write(
+                    f"{informe['recalculadas']} de {informe['peliculas']} películas "
+                    f"recalculadas en {informe['segundos']:.2f}s"
+                )
+            if options["intervalo"] is None:
+                return
+            todas = False
+            time.sleep(max(0.0, options["intervalo"] - informe["segundos"]))
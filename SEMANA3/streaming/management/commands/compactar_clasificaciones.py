@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from streaming.clasificaciones import compactar
+
+
+# --------
+# COMPACTACIÓN DE LAS CLASIFICACIONES
+#   python manage.py compactar_clasificaciones                 # una vez
+#   python manage.py compactar_clasificaciones --intervalo 600
+# Recalcula la media global, la puntuación bayesiana de todas las
+# películas y la tendencia exacta de la ventana (ver
+# streaming/clasificaciones.py). Las escrituras de reseñas las mantienen
+# entre medias; esto corrige la deriva y saca de tendencias lo que ya
+# ha salido de la ventana.
+# --------
+
+
+class Command(BaseCommand):
+    help = "Recalcula la puntuación bayesiana y la tendencia de todas las películas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--intervalo", type=float, default=None, help="Repite cada N segundos")
+
+    def handle(self, *args, **options):
+        if options["intervalo"] is not None and options["intervalo"] <= 0:
+            raise CommandError("--intervalo debe ser mayor que 0")
+
+        while True:
+            informe = compactar()
+            if options["verbosity"] >= 1:
+                self.stdout.write(
+                    f"Clasificaciones compactadas en {informe['segundos']:.2f}s "
+                    f"(media {informe['media']:.2f}, {informe['en_tendencia']} películas en tendencia)"
+                )
+            if options["intervalo"] is None:
+                return
+            time.sleep(max(0.0, options["intervalo"] - informe["segundos"]))
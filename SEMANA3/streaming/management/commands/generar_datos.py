@@ -0,0 +1,163 @@
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from streaming.cache import bump
+from streaming.clasificaciones import compactar
+from streaming.generador import COLUMNAS, bloque_peliculas, catalogo_base, resenas_por_pelicula
+from streaming.models import Categoria, Etiqueta, FichaTecnica, Pelicula, Perfil, Resena
+
+
+# --------
+# GENERADOR DE DATOS PARA PRUEBAS DE CARGA
+#   python manage.py generar_datos --peliculas 100000 --resenas 1000000 \
+#       --usuarios 50000 --semilla 42 --workers 4
+# Añade los datos a la base de datos configurada (no borra nada): los ids
+# empiezan tras el máximo de cada tabla. Con la misma semilla sobre una
+# base de datos vacía sale siempre lo mismo, con o sin --workers.
+# Las filas van con executemany en bruto (sin ORM ni señales) y cada
+# bloque de películas en su propia transacción. Con --workers los
+# bloques se generan en procesos aparte; la escritura sigue siendo del
+# proceso principal (SQLite admite un solo escritor).
+# --------
+MODELOS = {
+    "categoria": Categoria,
+    "etiqueta": Etiqueta,
+    "usuario": User,
+    "perfil": Perfil,
+    "pelicula": Pelicula,
+    "pelicula_etiquetas": Pelicula.etiquetas.through,
+    "ficha": FichaTecnica,
+    "resena": Resena,
+}
+
+
+def _comprobar_columnas():
+    # Si cambia un modelo y no el generador, mejor fallar antes de insertar
+    for tabla, modelo in MODELOS.items():
+        campos = {f.attname for f in modelo._meta.concrete_fields}
+        columnas = set(COLUMNAS[tabla])
+        if columnas != campos and columnas != campos - {modelo._meta.pk.attname}:
+            raise CommandError(
+                f"Las columnas de {tabla} no coinciden con {modelo.__name__}: "
+                f"faltan {sorted(campos - columnas)}, sobran {sorted(columnas - campos)}"
+            )
+
+
+class Command(BaseCommand):
+    help = "Genera un catálogo sintético reproducible (Zipf) para pruebas de carga"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--semilla", type=int, default=42)
+        parser.add_argument("--peliculas", type=int, default=100_000)
+        parser.add_argument("--resenas", type=int, default=1_000_000)
+        parser.add_argument("--usuarios", type=int, default=50_000)
+        parser.add_argument("--etiquetas", type=int, default=2_000)
+        parser.add_argument("--categorias", type=int, default=20)
+        parser.add_argument("--zipf", type=float, default=1.1, help="Exponente de la popularidad (1.1)")
+        parser.add_argument("--bloque", type=int, default=5_000, help="Películas por bloque / transacción (5000)")
+        parser.add_argument("--workers", type=int, default=0, help="Procesos que generan los bloques (0: ninguno)")
+
+    def handle(self, *args, **options):
+        for opcion in ("peliculas", "usuarios", "etiquetas", "categorias", "bloque"):
+            if options[opcion] < 1:
+                raise CommandError(f"--{opcion} debe ser mayor que 0")
+        _comprobar_columnas()
+
+        self.contadores = dict.fromkeys(MODELOS, 0)
+        inicio = time.perf_counter()
+        primer_id = {
+            tabla: (modelo.objects.aggregate(maximo=Max("pk"))["maximo"] or 0) + 1
+            for tabla, modelo in MODELOS.items()
+        }
+
+        base = catalogo_base(
+            options["semilla"], options["categorias"], options["etiquetas"], options["usuarios"], primer_id
+        )
+        with transaction.atomic():
+            for tabla in ("categoria", "etiqueta", "usuario", "perfil"):
+                self._insertar(tabla, base[tabla])
+
+        cuotas = resenas_por_pelicula(
+            options["semilla"], options["peliculas"], options["resenas"], options["usuarios"], options["zipf"]
+        )
+        parametros = {
+            "categorias": (primer_id["categoria"], options["categorias"]),
+            "etiquetas": (primer_id["etiqueta"], options["etiquetas"]),
+            "usuarios": (primer_id["usuario"], options["usuarios"]),
+            "desplazamiento_ficha": primer_id["ficha"] - primer_id["pelicula"],
+            "exponente": options["zipf"],
+        }
+        bloques = self._bloques(options["semilla"], options["bloque"], cuotas, primer_id)
+
+        pool = None
+        if options["workers"] > 0:
+            pool = ProcessPoolExecutor(max_workers=options["workers"])
+        try:
+            for filas in self._generados(bloques, parametros, pool, options["workers"]):
+                with transaction.atomic():
+                    for tabla in ("pelicula", "pelicula_etiquetas", "ficha", "resena"):
+                        self._insertar(tabla, filas[tabla])
+                if options["verbosity"] >= 2:
+                    self.stdout.write(f"  {self.contadores['pelicula']} películas, {self.contadores['resena']} reseñas")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        # executemany no lanza señales: invalidar la caché a mano
+        bump(Pelicula, Resena, Categoria, Etiqueta, FichaTecnica)
+        compactar()
+        self._informe(time.perf_counter() - inicio)
+
+    @staticmethod
+    def _bloques(semilla, tamano, cuotas, primer_id):
+        # Las reseñas de cada bloque se numeran a continuación de las del anterior
+        primeras = list(accumulate(
+            (sum(cuotas[i:i + tamano]) for i in range(0, len(cuotas), tamano)), initial=primer_id["resena"]
+        ))
+        for numero, inicio in enumerate(range(0, len(cuotas), tamano)):
+            ids = range(primer_id["pelicula"] + inicio, primer_id["pelicula"] + min(inicio + tamano, len(cuotas)))
+            yield numero, semilla, ids, cuotas[inicio:inicio + tamano], primeras[numero]
+
+    def _generados(self, bloques, parametros, pool, workers):
+        if pool is None:
+            for numero, semilla, ids, cuotas, primera in bloques:
+                yield bloque_peliculas(semilla, numero, ids, cuotas, primera_resena=primera, **parametros)
+            return
+        # Como mucho 2 bloques por proceso en vuelo: la memoria no crece con el total
+        pendientes = deque()
+        for numero, semilla, ids, cuotas, primera in bloques:
+            pendientes.append(pool.submit(
+                bloque_peliculas, semilla, numero, ids, cuotas, primera_resena=primera, **parametros
+            ))
+            if len(pendientes) >= workers * 2:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+    def _insertar(self, tabla, filas):
+        if not filas:
+            return
+        qn = connection.ops.quote_name
+        columnas = COLUMNAS[tabla]
+        sql = (
+            f"INSERT INTO {qn(MODELOS[tabla]._meta.db_table)} ({', '.join(map(qn, columnas))}) "
+            f"VALUES ({', '.join(['%s'] * len(columnas))})"
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, filas)
+        self.contadores[tabla] += len(filas)
+
+    def _informe(self, segundos):
+        for tabla, n in self.contadores.items():
+            self.stdout.write(f"  {tabla}: {n}")
+        filas = sum(self.contadores.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{filas} filas en {segundos:.1f}s ({filas / segundos:.0f} filas/s)"
+        ))
@@ -0,0 +1,155 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from streaming.cache import bump
+from streaming.importacion import Importador, convertir_bloque, leer_filas
+from streaming.models import Categoria, Etiqueta, FichaTecnica, Pelicula, Resena
+
+
+# --------
+# IMPORTACIÓN MASIVA DEL CATÁLOGO
+#   python manage.py importar_catalogo --categorias c.csv --peliculas p.jsonl \
+#       --resenas r.jsonl --workers 4 --checkpoint importacion.json
+# Los ficheros se procesan en orden de dependencias. Con --workers la
+# conversión de las filas (JSON, tipos, validadores) va a un pool de
+# procesos; la escritura sigue en el proceso principal, por bloques.
+# El punto de control guarda cuántas filas de cada fichero están ya
+# confirmadas: al relanzar el comando se continúa desde ahí. Si el corte
+# llega entre el commit de un bloque y el punto de control, el bloque se
+# repite sin duplicar nada (ver importacion.py).
+# --------
+ORDEN = ["categorias", "etiquetas", "peliculas", "fichas", "resenas"]
+MODELOS = {
+    "categorias": [Categoria],
+    "etiquetas": [Etiqueta],
+    "peliculas": [Pelicula],
+    "fichas": [FichaTecnica],
+    "resenas": [Resena, Pelicula],
+}
+MAX_ERRORES_MOSTRADOS = 20
+
+
+def _bloques(filas, tamano):
+    while True:
+        bloque = list(islice(filas, tamano))
+        if not bloque:
+            return
+        yield bloque
+
+
+class Command(BaseCommand):
+    help = "Importa categorías, etiquetas, películas, fichas técnicas y reseñas desde CSV o JSONL"
+
+    def add_arguments(self, parser):
+        for tipo in ORDEN:
+            parser.add_argument(f"--{tipo}", metavar="FICHERO", help=f"Fichero .csv o .jsonl de {tipo}")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Filas por transacción (2000)")
+        parser.add_argument("--workers", type=int, default=0, help="Procesos para convertir filas (0: ninguno)")
+        parser.add_argument("--checkpoint", metavar="FICHERO", help="Fichero JSON del punto de control")
+        parser.add_argument(
+            "--crear-usuarios",
+            action="store_true",
+            help="Crea (sin contraseña utilizable) los usuarios de las reseñas que no existan",
+        )
+
+    def handle(self, *args, **options):
+        ficheros = [(tipo, options[tipo]) for tipo in ORDEN if options[tipo]]
+        if not ficheros:
+            raise CommandError("Indica al menos un fichero (--categorias, --peliculas, ...)")
+        for _, ruta in ficheros:
+            if not os.path.isfile(ruta):
+                raise CommandError(f"No existe el fichero {ruta}")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size debe ser mayor que 0")
+
+        self.verbosity = options["verbosity"]
+        self.ruta_checkpoint = options["checkpoint"]
+        self.checkpoint = self._leer_checkpoint()
+        importador = Importador(crear_usuarios=options["crear_usuarios"])
+
+        pool = None
+        if options["workers"] > 0:
+            # initializer: con "spawn" los procesos hijos arrancan sin Django
+            pool = ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup)
+        try:
+            for tipo, ruta in ficheros:
+                self._importar(importador, tipo, ruta, options["batch_size"], pool, options["workers"])
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    # -------- punto de control --------
+    def _leer_checkpoint(self):
+        if not self.ruta_checkpoint or not os.path.exists(self.ruta_checkpoint):
+            return {}
+        with open(self.ruta_checkpoint, encoding="utf-8") as fichero:
+            return json.load(fichero)
+
+    def _guardar_checkpoint(self):
+        if not self.ruta_checkpoint:
+            return
+        temporal = f"{self.ruta_checkpoint}.tmp"
+        with open(temporal, "w", encoding="utf-8") as fichero:
+            json.dump(self.checkpoint, fichero)
+        os.replace(temporal, self.ruta_checkpoint)  # atómico: nunca queda a medias
+
+    # -------- importación de un fichero --------
+    def _convertidos(self, tipo, bloques, pool, workers):
+        if pool is None:
+            for bloque in bloques:
+                yield convertir_bloque(tipo, bloque)
+            return
+        # Como mucho 2 bloques por proceso en vuelo: la memoria no crece con el fichero
+        pendientes = deque()
+        for bloque in bloques:
+            pendientes.append(pool.submit(convertir_bloque, tipo, bloque))
+            if len(pendientes) >= workers * 2:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+    def _importar(self, importador, tipo, ruta, batch_size, pool, workers):
+        estado = self.checkpoint.get(tipo)
+        ya_hechas = estado["filas"] if estado and estado["fichero"] == os.path.abspath(ruta) else 0
+
+        filas = islice(leer_filas(ruta), ya_hechas, None)
+        leidas, insertadas, errores = 0, 0, []
+        inicio = time.perf_counter()
+
+        for convertidas in self._convertidos(tipo, _bloques(filas, batch_size), pool, workers):
+            validas = [(numero, datos) for numero, datos, error in convertidas if error is None]
+            errores.extend((numero, error) for numero, datos, error in convertidas if error is not None)
+
+            n, errores_bloque = importador.guardar(tipo, validas)
+            insertadas += n
+            errores.extend(errores_bloque)
+            leidas += len(convertidas)
+
+            self.checkpoint[tipo] = {"fichero": os.path.abspath(ruta), "filas": ya_hechas + leidas}
+            self._guardar_checkpoint()
+            if self.verbosity >= 2:
+                self.stdout.write(f"  {tipo}: {ya_hechas + leidas} filas")
+
+        # bulk_create no lanza señales: invalidar la caché a mano
+        bump(*MODELOS[tipo])
+        segundos = time.perf_counter() - inicio
+        self._informe(tipo, ya_hechas, leidas, insertadas, errores, segundos)
+
+    def _informe(self, tipo, ya_hechas, leidas, insertadas, errores, segundos):
+        por_segundo = leidas / segundos if segundos else 0
+        reanudado = f" (reanudado tras {ya_hechas})" if ya_hechas else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{tipo}: {leidas} filas leídas{reanudado}, {insertadas} insertadas, "
+            f"{len(errores)} con errores en {segundos:.2f}s ({por_segundo:.0f} filas/s)"
+        ))
+        for numero, error in sorted(errores)[:MAX_ERRORES_MOSTRADOS]:
+            self.stderr.write(f"  {tipo} fila {numero}: {error}")
+        if len(errores) > MAX_ERRORES_MOSTRADOS:
+            self.stderr.write(f"  ... y {len(errores) - MAX_ERRORES_MOSTRADOS} errores más")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from streaming.models import Pelicula
+from streaming.valoraciones import recalcular_agregados
+
+
+class Command(BaseCommand):
+    help = "Reconstruye en bloque los agregados de reseñas de cada película"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pelicula",
+            type=int,
+            action="append",
+            dest="peliculas",
+            help="ID de película a recalcular (repetible). Por defecto, todas.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Pelicula.objects.all()
+        if options["peliculas"]:
+            queryset = queryset.filter(pk__in=options["peliculas"])
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            total = recalcular_agregados(queryset)
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Agregados recalculados para {total} películas en {segundos:.2f}s"
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from streaming.replica import ajustes, copiar, retraso
+
+
+# --------
+# RÉPLICA DE LECTURA PARA PRUEBAS EN LOCAL
+#   python manage.py replicar --intervalo 2
+# Copia db.sqlite3 sobre STREAMING_REPLICA["FICHERO"] cada --intervalo
+# segundos (con --una-vez, una sola copia). El servidor tiene que
+# arrancar con STREAMING_REPLICA=1 para leer de ella.
+# --------
+
+
+class Command(BaseCommand):
+    help = "Refresca periódicamente la copia de SQLite que sirve de réplica de lectura"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--intervalo", type=float, default=2.0, help="Segundos entre copias (2)")
+        parser.add_argument("--una-vez", action="store_true", help="Hace una copia y termina")
+
+    def handle(self, *args, **options):
+        if not ajustes()["FICHERO"]:
+            raise CommandError("Falta STREAMING_REPLICA['FICHERO'] en settings")
+        if options["intervalo"] <= 0:
+            raise CommandError("--intervalo debe ser mayor que 0")
+        if options["intervalo"] >= ajustes()["RETRASO_MAXIMO"]:
+            self.stdout.write(self.style.WARNING(
+                "Aviso: con este intervalo la réplica pasará de RETRASO_MAXIMO y se leerá de la principal"
+            ))
+
+        while True:
+            anterior = retraso()
+            segundos = copiar()
+            if options["verbosity"] >= 2 or options["una_vez"]:
+                antes = "sin copia" if anterior is None else f"{anterior:.1f}s"
+                self.stdout.write(f"Copia en {segundos:.2f}s (retraso previo: {antes})")
+            if options["una_vez"]:
+                return
+            time.sleep(max(0.0, options["intervalo"] - segundos))
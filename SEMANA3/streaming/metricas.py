@@ -0,0 +1,294 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from . import replica
+
+
+# --------
+# MÉTRICAS POR ENDPOINT (formato de texto de Prometheus en /api/metrics)
+# Por ruta resuelta (url_name del router: pelicula-list, pelicula-valorar...)
+# y método: peticiones por código, histograma de latencia, número y
+# tiempo de las consultas SQL y bytes de respuesta.
+# Cada hilo acumula en sus propias series (sin candados al medir); el
+# candado solo se toma la primera vez que un hilo mide algo, cuando el
+# hilo termina (sus series se suman a las de los hilos ya terminados, así
+# que con un hilo por petición no crecen) y al leer las métricas.
+# /api/metrics solo admite GET y solo desde IPS_PERMITIDAS (REMOTE_ADDR:
+# detrás de un proxy, la del proxy) o con un usuario is_staff.
+# Las consultas se cuentan con un execute_wrapper que se
+# instala en cada conexión al abrirse y apunta a la petición en curso
+# con una ContextVar (sync_to_async la copia al hilo de la base de datos).
+# --------
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIN_RUTA = "sin_ruta"
+# Cualquier otro método cuenta como OTRO (no crear series con lo que mande el cliente)
+METODOS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+AJUSTES = {
+    "IPS_PERMITIDAS": ("127.0.0.1", "::1"),  # quién puede leer /api/metrics (el scraper)
+}
+
+
+def ajustes():
+    return {**AJUSTES, **getattr(settings, "STREAMING_METRICAS", {})}
+
+
+class _Serie:
+    __slots__ = ("estados", "buckets", "segundos", "consultas", "segundos_sql", "bytes")
+
+    def __init__(self):
+        self.estados = {}
+        self.buckets = [0] * (len(BUCKETS) + 1)  # el último es +Inf
+        self.segundos = 0.0
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.bytes = 0
+
+
+def _sumar(totales, series):
+    for clave, serie in list(series.items()):
+        total = totales.get(clave)
+        if total is None:
+            total = totales[clave] = _Serie()
+        for estado, n in list(serie.estados.items()):
+            total.estados[estado] = total.estados.get(estado, 0) + n
+        total.buckets = [a + b for a, b in zip(total.buckets, serie.buckets)]
+        total.segundos += serie.segundos
+        total.consultas += serie.consultas
+        total.segundos_sql += serie.segundos_sql
+        total.bytes += serie.bytes
+
+
+class _Hilo:
+    """Dueño de las series de un hilo: lo suelta el thread-local al terminar el hilo."""
+    __slots__ = ("series", "__weakref__")
+
+    def __init__(self):
+        self.series = {}
+
+
+class _Registro:
+    """Series de todos los hilos; cada hilo solo escribe en las suyas."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._candado = threading.Lock()
+        self._por_hilo = {}  # id -> series de los hilos vivos
+        self._terminados = {}  # suma de las de los hilos que ya han terminado
+
+    def series(self):
+        hilo = getattr(self._local, "hilo", None)
+        if hilo is None:
+            hilo = self._local.hilo = _Hilo()
+            with self._candado:
+                self._por_hilo[id(hilo.series)] = hilo.series
+            weakref.finalize(hilo, self._retirar, hilo.series)
+        return hilo.series
+
+    def _retirar(self, series):
+        with self._candado:
+            if self._por_hilo.pop(id(series), None) is not None:
+                _sumar(self._terminados, series)
+
+    def serie(self, ruta, metodo):
+        series = self.series()
+        serie = series.get((ruta, metodo))
+        if serie is None:
+            serie = series[(ruta, metodo)] = _Serie()
+        return serie
+
+    def hilos(self):
+        with self._candado:
+            return len(self._por_hilo)
+
+    def totales(self):
+        """{(ruta, metodo): _Serie} sumando los hilos."""
+        totales = {}
+        with self._candado:
+            _sumar(totales, self._terminados)
+            for series in self._por_hilo.values():
+                _sumar(totales, series)
+        return totales
+
+    def reiniciar(self):
+        with self._candado:
+            self._terminados.clear()
+            for series in self._por_hilo.values():
+                series.clear()
+
+
+registro = _Registro()
+
+# [consultas, segundos] de la petición en curso
+_sql_en_curso = ContextVar("sql_en_curso", default=None)
+
+
+# -------- SQL --------
+def _medir_sql(execute, sql, params, many, context):
+    contador = _sql_en_curso.get()
+    if contador is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        contador[0] += 1
+        contador[1] += time.perf_counter() - inicio
+
+
+def instalar_en_conexion(sender, connection, **kwargs):
+    if _medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_sql)
+
+
+connection_created.connect(instalar_en_conexion, dispatch_uid="streaming_metricas_sql")
+
+
+# -------- peticiones --------
+def _contar_streaming(serie, contenido):
+    # Las consultas de una exportación se lanzan al recorrer el contenido,
+    # ya fuera del middleware: se miden trozo a trozo
+    iterador = iter(contenido)
+    while True:
+        contador = [0, 0.0]
+        token = _sql_en_curso.set(contador)
+        try:
+            trozo = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _sql_en_curso.reset(token)
+            serie.consultas += contador[0]
+            serie.segundos_sql += contador[1]
+        serie.bytes += len(trozo)
+        yield trozo
+
+
+def _registrar(request, response, inicio, contador):
+    segundos = time.perf_counter() - inicio
+    match = getattr(request, "resolver_match", None)
+    ruta = (match.url_name or match.view_name) if match else SIN_RUTA
+    serie = registro.serie(ruta, request.method if request.method in METODOS else "OTRO")
+
+    serie.estados[response.status_code] = serie.estados.get(response.status_code, 0) + 1
+    serie.buckets[bisect_left(BUCKETS, segundos)] += 1
+    serie.segundos += segundos
+    serie.consultas += contador[0]
+    serie.segundos_sql += contador[1]
+    if not response.streaming:
+        serie.bytes += len(response.content)
+    elif not response.is_async:
+        response.streaming_content = _contar_streaming(serie, response.streaming_content)
+
+
+class MetricasMiddleware:
+    """Va el primero de MIDDLEWARE para medir la petición completa."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        contador = [0, 0.0]
+        token = _sql_en_curso.set(contador)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _sql_en_curso.reset(token)
+        _registrar(request, response, inicio, contador)
+        return response
+
+    async def __acall__(self, request):
+        contador = [0, 0.0]
+        token = _sql_en_curso.set(contador)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sql_en_curso.reset(token)
+        _registrar(request, response, inicio, contador)
+        return response
+
+
+# -------- exposición --------
+def _etiquetas(**valores):
+    return ",".join(f'{clave}="{valor}"' for clave, valor in valores.items())
+
+
+def texto_prometheus(totales=None):
+    totales = registro.totales() if totales is None else totales
+    lineas = []
+
+    def metrica(nombre, tipo, ayuda):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+
+    metrica("streaming_http_requests_total", "counter", "Peticiones por ruta, método y código.")
+    for (ruta, metodo), serie in sorted(totales.items()):
+        for estado, n in sorted(serie.estados.items()):
+            lineas.append(
+                f"streaming_http_requests_total{{{_etiquetas(route=ruta, method=metodo, status=estado)}}} {n}"
+            )
+
+    metrica("streaming_http_request_duration_seconds", "histogram", "Latencia de las peticiones.")
+    for (ruta, metodo), serie in sorted(totales.items()):
+        etiquetas = _etiquetas(route=ruta, method=metodo)
+        acumulado = 0
+        for limite, n in zip((*BUCKETS, "+Inf"), serie.buckets):
+            acumulado += n
+            lineas.append(f'streaming_http_request_duration_seconds_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+        lineas.append(f"streaming_http_request_duration_seconds_sum{{{etiquetas}}} {serie.segundos:.6f}")
+        lineas.append(f"streaming_http_request_duration_seconds_count{{{etiquetas}}} {acumulado}")
+
+    por_ruta = [
+        ("streaming_sql_queries_total", "Consultas SQL lanzadas.", "consultas", "{}"),
+        ("streaming_sql_duration_seconds_total", "Tiempo en consultas SQL.", "segundos_sql", "{:.6f}"),
+        ("streaming_http_response_bytes_total", "Bytes de respuesta.", "bytes", "{}"),
+    ]
+    for nombre, ayuda, atributo, formato in por_ruta:
+        metrica(nombre, "counter", ayuda)
+        for (ruta, metodo), serie in sorted(totales.items()):
+            valor = formato.format(getattr(serie, atributo))
+            lineas.append(f"{nombre}{{{_etiquetas(route=ruta, method=metodo)}}} {valor}")
+
+    # Réplica de lectura (replica.py)
+    metrica("streaming_db_read_routing_total", "counter", "Peticiones por base de datos de lectura y motivo.")
+    for motivo, n in sorted(replica.contadores().items()):
+        destino = "replica" if motivo == "replica" else "primaria"
+        lineas.append(f"streaming_db_read_routing_total{{{_etiquetas(destino=destino, motivo=motivo)}}} {n}")
+    retraso = replica.retraso()
+    if retraso is not None:
+        metrica("streaming_replica_lag_seconds", "gauge", "Segundos desde la última copia de la réplica.")
+        lineas.append(f"streaming_replica_lag_seconds {retraso:.3f}")
+
+    return "\n".join(lineas) + "\n"
+
+
+def _permitido(request):
+    usuario = getattr(request, "user", None)
+    if usuario is not None and usuario.is_active and usuario.is_staff:
+        return True
+    return request.META.get("REMOTE_ADDR") in ajustes()["IPS_PERMITIDAS"]
+
+
+@require_GET
+def metricas(request):
+    """GET /api/metrics"""
+    if not _permitido(request):
+        return HttpResponseForbidden()
+    return HttpResponse(texto_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
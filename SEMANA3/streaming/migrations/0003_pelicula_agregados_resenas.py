@@ -0,0 +1,55 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:59
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def rellenar_agregados(apps, schema_editor):
+    Pelicula = apps.get_model('streaming', 'Pelicula')
+    Resena = apps.get_model('streaming', 'Resena')
+
+    resenas = Resena.objects.filter(pelicula=OuterRef('pk')).order_by().values('pelicula')
+    num = Coalesce(Subquery(resenas.annotate(n=Count('pk')).values('n'), output_field=IntegerField()), Value(0))
+    suma = Coalesce(Subquery(resenas.annotate(s=Sum('puntuacion')).values('s'), output_field=IntegerField()), Value(0))
+    ultima = Subquery(
+        Resena.objects.filter(pelicula=OuterRef('pk')).order_by('-fecha_resena').values('fecha_resena')[:1]
+    )
+
+    Pelicula.objects.update(
+        num_resenas=num,
+        suma_puntuaciones=suma,
+        puntuacion_media=Cast(suma, FloatField()) / NullIf(num, Value(0)),
+        ultima_resena=ultima,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0002_alter_etiqueta_options_alter_resena_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pelicula',
+            name='num_resenas',
+            field=models.PositiveIntegerField(db_index=True, default=0, help_text='Número de reseñas de la película'),
+        ),
+        migrations.AddField(
+            model_name='pelicula',
+            name='puntuacion_media',
+            field=models.FloatField(blank=True, db_index=True, help_text='Puntuación media (vacía si no hay reseñas)', null=True),
+        ),
+        migrations.AddField(
+            model_name='pelicula',
+            name='suma_puntuaciones',
+            field=models.PositiveIntegerField(default=0, help_text='Suma de las puntuaciones de sus reseñas'),
+        ),
+        migrations.AddField(
+            model_name='pelicula',
+            name='ultima_resena',
+            field=models.DateTimeField(blank=True, help_text='Fecha de la última reseña', null=True),
+        ),
+        migrations.RunPython(rellenar_agregados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0004_pelicula_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['categoria', 'fecha_estreno'], name='pelicula_cat_estreno_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['activa', 'titulo'], name='pelicula_activa_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['titulo', 'id'], name='pelicula_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['fecha_estreno', 'id'], name='pelicula_estreno_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['duracion', 'id'], name='pelicula_duracion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(fields=['pelicula', '-fecha_resena'], name='resena_pelicula_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(fields=['fecha_resena', 'id'], name='resena_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0005_indices_filtros_ordenacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pelicula',
+            name='pelicula_activa_titulo_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['titulo', 'id'], name='pelicula_activas_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['updated_at', 'ultima_resena'], name='pelicula_validador_idx'),
+        ),
+    ]
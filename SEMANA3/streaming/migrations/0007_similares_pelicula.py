@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0006_pelicula_indices_activas_validador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilaresPelicula',
+            fields=[
+                ('pelicula', models.OneToOneField(help_text='Película de la que son los vecinos', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similares', serialize=False, to='streaming.pelicula')),
+                ('vecinos', models.JSONField(default=list, help_text='[[id, similitud], ...] de más a menos parecida')),
+                ('firma', models.CharField(help_text='Reseñas y etiquetas de la película al calcularlos', max_length=40)),
+                ('calculado_en', models.DateTimeField(help_text='Fecha del cálculo')),
+            ],
+        ),
+    ]
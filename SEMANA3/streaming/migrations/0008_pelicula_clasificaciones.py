@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+import importlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Añadir un campo NOT NULL en SQLite rehace la tabla (tabla nueva, copia y
+# rename): se pierden los triggers que mantienen el índice FTS5 de 0004
+fts = importlib.import_module('streaming.migrations.0004_pelicula_fts')
+
+
+def rehacer_triggers_fts(apps, schema_editor):
+    if fts._fts5_disponible(schema_editor):
+        # BORRAR[:3]: solo los triggers (la tabla FTS se queda); CREAR[1:]: triggers y 'rebuild'
+        for sql in fts.BORRAR[:3] + fts.CREAR[1:]:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0007_similares_pelicula'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Al deshacer la migración la tabla se rehace otra vez
+        migrations.RunPython(migrations.RunPython.noop, rehacer_triggers_fts),
+        migrations.AddField(
+            model_name='pelicula',
+            name='puntuacion_bayesiana',
+            field=models.FloatField(blank=True, help_text='Media bayesiana (mejor valoradas)', null=True),
+        ),
+        migrations.AddField(
+            model_name='pelicula',
+            name='tendencia',
+            field=models.FloatField(default=0, help_text='Reseñas recientes con decaimiento (ver clasificaciones.py)'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['puntuacion_bayesiana', 'id'], name='pelicula_bayesiana_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['categoria', 'puntuacion_bayesiana', 'id'], name='pelicula_cat_bayesiana_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['tendencia', 'id'], name='pelicula_tendencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pelicula',
+            index=models.Index(fields=['categoria', 'tendencia', 'id'], name='pelicula_cat_tendencia_idx'),
+        ),
+        migrations.RunPython(rehacer_triggers_fts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def indexar_vecinos(apps, schema_editor):
+    # Las filas ya calculadas: sin esto la siguiente pasada incremental no
+    # sabría qué filas mencionan a cada película
+    SimilaresPelicula = apps.get_model('streaming', 'SimilaresPelicula')
+    Pelicula = apps.get_model('streaming', 'Pelicula')
+    VecinoSimilar = apps.get_model('streaming', 'VecinoSimilar')
+    existentes = set(Pelicula.objects.values_list('pk', flat=True))
+    filas = SimilaresPelicula.objects.values_list('pelicula_id', 'vecinos')
+    VecinoSimilar.objects.bulk_create(
+        (
+            VecinoSimilar(similares_id=pk, vecino_id=otra if otra in existentes else None)
+            for pk, vecinos in filas.iterator(chunk_size=2000)
+            for otra, _ in vecinos
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0008_pelicula_clasificaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VecinoSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similares', models.ForeignKey(help_text='Fila de SimilaresPelicula en la que aparece', on_delete=django.db.models.deletion.CASCADE, related_name='menciones', to='streaming.similarespelicula')),
+                ('vecino', models.ForeignKey(help_text='Película que aparece entre los vecinos (NULL si se ha borrado)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='streaming.pelicula')),
+            ],
+        ),
+        migrations.RunPython(indexar_vecinos, migrations.RunPython.noop),
+    ]
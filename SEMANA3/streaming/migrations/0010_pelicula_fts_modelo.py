@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0009_vecinos_similares'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeliculaFTS',
+            fields=[
+                ('pelicula', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='fts', serialize=False, to='streaming.pelicula')),
+                ('indice', models.TextField(db_column='streaming_pelicula_fts')),
+                ('rango', models.FloatField(db_column='rank')),
+            ],
+            options={
+                'db_table': 'streaming_pelicula_fts',
+                'managed': False,
+            },
+        ),
+    ]
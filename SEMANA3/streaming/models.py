@@ -1,7 +1,10 @@
 from django.db import models
+from django.db.models import Lookup
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .recientes import RelacionAcotada
+
 
 class Categoria(models.Model):
     nombre = models.CharField(
@@ -78,19 +81,102 @@ class Pelicula(models.Model):
     duracion = models.PositiveIntegerField(help_text="Duración de la película en minutos")
     activa = models.BooleanField(default=True, help_text="Indica si la película está activa")
 
+    # Agregados de reseñas desnormalizados (se mantienen al valorar / reseñar)
+    num_resenas = models.PositiveIntegerField(default=0, db_index=True, help_text="Número de reseñas de la película")
+    suma_puntuaciones = models.PositiveIntegerField(default=0, help_text="Suma de las puntuaciones de sus reseñas")
+    puntuacion_media = models.FloatField(null=True, blank=True, db_index=True, help_text="Puntuación media (vacía si no hay reseñas)")
+    ultima_resena = models.DateTimeField(null=True, blank=True, help_text="Fecha de la última reseña")
+    # Clasificaciones (streaming.clasificaciones)
+    puntuacion_bayesiana = models.FloatField(null=True, blank=True, help_text="Media bayesiana (mejor valoradas)")
+    tendencia = models.FloatField(default=0, help_text="Reseñas recientes con decaimiento (ver clasificaciones.py)")
+
     created_at = models.DateTimeField(auto_now_add=True, help_text="Fecha de creación de la película")
     updated_at = models.DateTimeField(auto_now=True, help_text="Fecha de última actualización de la película")
 
+    # Las últimas reseñas (no es un campo: sin migración). Todas, paginadas,
+    # en /peliculas/{id}/resenas/
+    resenas_recientes = RelacionAcotada("resenas", orden=("-fecha_resena", "-id"), limite=5)
+
     class Meta:
         verbose_name = "Película"
         verbose_name_plural = "Películas"
         ordering = ["-fecha_estreno"]
+        # Índices para los filtros / ordenaciones que expone la API
+        # (el id final es el desempate de la paginación por cursor)
+        indexes = [
+            models.Index(fields=["categoria", "fecha_estreno"], name="pelicula_cat_estreno_idx"),
+            # parcial: en SQLite "WHERE activa" no puede usar un índice (activa, titulo)
+            models.Index(
+                fields=["titulo", "id"],
+                condition=models.Q(activa=True),
+                name="pelicula_activas_titulo_idx",
+            ),
+            models.Index(fields=["titulo", "id"], name="pelicula_titulo_idx"),
+            models.Index(fields=["fecha_estreno", "id"], name="pelicula_estreno_idx"),
+            models.Index(fields=["duracion", "id"], name="pelicula_duracion_idx"),
+            # índice cubriente para el MAX/COUNT del ETag de los listados
+            models.Index(fields=["updated_at", "ultima_resena"], name="pelicula_validador_idx"),
+            # clasificaciones: top-N general y por categoría recorriendo el índice
+            models.Index(fields=["puntuacion_bayesiana", "id"], name="pelicula_bayesiana_idx"),
+            models.Index(fields=["categoria", "puntuacion_bayesiana", "id"], name="pelicula_cat_bayesiana_idx"),
+            models.Index(fields=["tendencia", "id"], name="pelicula_tendencia_idx"),
+            models.Index(fields=["categoria", "tendencia", "id"], name="pelicula_cat_tendencia_idx"),
+        ]
+
+    # Solo los escribe streaming.valoraciones (UPDATE con F()); un save()
+    # normal no debe pisarlos con los valores leídos al cargar la película
+    CAMPOS_AGREGADOS = (
+        "num_resenas", "suma_puntuaciones", "puntuacion_media", "ultima_resena",
+        "puntuacion_bayesiana", "tendencia",
+    )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_AGREGADOS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.titulo
 
 
 # 1:1 (además del Perfil, dejo uno 1:1 dentro del dominio de Película para que puedas exponerlo fácil en la API)
+class Match(Lookup):
+    """campo__match="..." -> columna MATCH %s (FTS5)"""
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class PeliculaFTS(models.Model):
+    # La tabla virtual FTS5 de la migración 0004 (Django no la crea ni la
+    # migra): solo para unirla a Pelicula por rowid en la búsqueda
+    pelicula = models.OneToOneField(
+        Pelicula,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,  # la borran los triggers
+        related_name="fts",
+    )
+    # Columna oculta con el nombre de la tabla: la que se compara con MATCH
+    indice = models.TextField(db_column="streaming_pelicula_fts")
+    # Columna oculta rank: bm25() de la fila del MATCH (menor es mejor)
+    rango = models.FloatField(db_column="rank")
+
+    class Meta:
+        managed = False
+        db_table = "streaming_pelicula_fts"
+
+
+PeliculaFTS._meta.get_field("indice").register_lookup(Match)
+
+
 class FichaTecnica(models.Model):
     pelicula = models.OneToOneField(
         Pelicula,
@@ -132,11 +218,56 @@ class Resena(models.Model):
             models.UniqueConstraint(fields=["pelicula", "usuario"], name="unique_resena")
         ]
         ordering = ["-fecha_resena"]
+        indexes = [
+            # reseñas de una película de la más nueva a la más antigua
+            models.Index(fields=["pelicula", "-fecha_resena"], name="resena_pelicula_fecha_idx"),
+            models.Index(fields=["fecha_resena", "id"], name="resena_fecha_idx"),
+        ]
 
     def __str__(self):
         return f"{self.usuario.username} - {self.pelicula.titulo}"
 
 
+# Películas parecidas precalculadas (streaming.similares, comando
+# calcular_similares): una fila por película con sus vecinos ya ordenados
+class SimilaresPelicula(models.Model):
+    pelicula = models.OneToOneField(
+        Pelicula,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="similares",
+        help_text="Película de la que son los vecinos"
+    )
+    vecinos = models.JSONField(default=list, help_text="[[id, similitud], ...] de más a menos parecida")
+    firma = models.CharField(max_length=40, help_text="Reseñas y etiquetas de la película al calcularlos")
+    calculado_en = models.DateTimeField(help_text="Fecha del cálculo")
+
+    def __str__(self):
+        return f"Similares - {self.pelicula_id}"
+
+
+class VecinoSimilar(models.Model):
+    # Índice inverso de SimilaresPelicula.vecinos (una fila por vecino): la
+    # pasada incremental de similares.py lee solo las filas que mencionan a
+    # una película que ha cambiado o que se ha borrado (vecino NULL)
+    similares = models.ForeignKey(
+        SimilaresPelicula,
+        on_delete=models.CASCADE,
+        related_name="menciones",
+        help_text="Fila de SimilaresPelicula en la que aparece"
+    )
+    vecino = models.ForeignKey(
+        Pelicula,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        help_text="Película que aparece entre los vecinos (NULL si se ha borrado)"
+    )
+
+    def __str__(self):
+        return f"{self.vecino_id} en similares de {self.similares_id}"
+
+
 class Perfil(models.Model):
     # 1:1 con User (perfil de usuario)
     usuario = models.OneToOneField(
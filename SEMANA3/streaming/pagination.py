@@ -0,0 +1,242 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# --------
+# PAGINACIÓN POR CURSOR (keyset)
+# En vez de COUNT(*) + OFFSET, cada página se pide con
+#   WHERE (campo, id) > (último valor visto) ORDER BY campo, id LIMIT n
+# así una página profunda cuesta lo mismo que la primera y el cursor no
+# se desplaza si se insertan filas nuevas.
+# --------
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    page_size = PageNumberPagination.page_size
+    invalid_cursor_message = "Cursor inválido"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._preparar(queryset, request, view)
+        return self._pagina(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self._preparar(queryset, request, view)
+        return self._pagina([obj async for obj in queryset.aiterator(chunk_size=self.page_size + 1)])
+
+    def _preparar(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.modelo = queryset.model
+        self.anotaciones = queryset.query.annotations
+        self.orden = self.get_ordering(queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            valores, self.atras = None, False
+        else:
+            valores, self.atras = self.cursor
+
+        orden = self.orden if not self.atras else [self._invertir(c) for c in self.orden]
+        queryset = queryset.order_by(*orden)
+        if valores is not None:
+            queryset = queryset.filter(self._despues_de(orden, valores))
+
+        # Una fila de más para saber si hay otra página
+        return queryset[: self.page_size + 1]
+
+    def _pagina(self, resultados):
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[: self.page_size]
+
+        if self.atras:
+            resultados.reverse()
+            self.has_next, self.has_previous = True, hay_mas
+        else:
+            self.has_next, self.has_previous = hay_mas, self.cursor is not None
+
+        self.page = resultados
+        return resultados
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    # --------
+    # Ordenación: la del OrderingFilter (o la del Meta del modelo) + id
+    # --------
+    def get_ordering(self, queryset, view):
+        orden = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        permitidos = getattr(view, "cursor_ordering_fields", [])
+
+        if not all(isinstance(c, str) for c in orden):
+            orden = []
+        campos = [c for c in orden if c.lstrip("-") not in ("pk", "id")]
+        for campo in campos:
+            if campo.lstrip("-") not in permitidos:
+                raise ValidationError({
+                    "ordering": f"La paginación por cursor solo admite: {', '.join(permitidos)}"
+                })
+
+        # Desempate por id en el mismo sentido que el primer campo
+        desempate = "-id" if campos and campos[0].startswith("-") else "id"
+        return campos + [desempate]
+
+    @staticmethod
+    def _invertir(campo):
+        return campo[1:] if campo.startswith("-") else f"-{campo}"
+
+    @staticmethod
+    def _despues_de(orden, valores):
+        # (a, b, c) > (x, y, z)  ==  a > x  OR  (a = x AND (b > y OR (b = y AND c > z)))
+        condicion = None
+        for campo, valor in reversed(list(zip(orden, valores))):
+            nombre = campo.lstrip("-")
+            lookup = "lt" if campo.startswith("-") else "gt"
+            paso = Q(**{f"{nombre}__{lookup}": valor})
+            if condicion is not None:
+                paso |= Q(**{nombre: valor}) & condicion
+            condicion = paso
+        return condicion
+
+    # --------
+    # Cursor opaco: base64 de [orden, valores, atrás]
+    # --------
+    def _valores(self, obj):
+        return [getattr(obj, campo.lstrip("-")) for campo in self.orden]
+
+    def _campo(self, nombre):
+        # Campo del modelo o anotación (p. ej. el rango de la búsqueda FTS)
+        if nombre in self.anotaciones:
+            return self.anotaciones[nombre].output_field
+        return self.modelo._meta.get_field(nombre)
+
+    def encode_cursor(self, valores, atras):
+        crudo = json.dumps([self.orden, valores, atras], default=str, separators=(",", ":"))
+        cursor = base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            relleno = "=" * (-len(cursor) % 4)
+            orden, valores, atras = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            if orden != self.orden or not isinstance(valores, list) or len(valores) != len(orden):
+                raise ValueError
+            valores = [
+                self._campo(campo.lstrip("-")).to_python(valor)
+                for campo, valor in zip(orden, valores)
+            ]
+            # Los campos del cursor no admiten NULL: (campo > NULL) no filtra nada
+            if None in valores:
+                raise ValueError
+        except (TypeError, ValueError, FieldDoesNotExist, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return valores, bool(atras)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._valores(self.page[-1]), atras=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self._valores(self.page[0]), atras=True)
+
+
+class ResenasPeliculaPagination(KeysetPagination):
+    """
+    /peliculas/{id}/resenas/: siempre por cursor y de la más reciente a
+    la más antigua (índice resena_pelicula_fecha_idx). Sin COUNT: el
+    total ya está en num_resenas de la película.
+    """
+    ordering = ("-fecha_resena", "-id")
+
+    def get_ordering(self, queryset, view):
+        return list(self.ordering)
+
+
+class CatalogoPagination(PageNumberPagination):
+    """
+    Paginación por número de página (la de siempre, la usa el admin) con
+    modo cursor opcional por petición: ?paginacion=cursor
+    """
+    mode_query_param = "paginacion"
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if request.query_params.get(self.mode_query_param) == "cursor":
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Igual que paginate_queryset pero con el ORM async: el COUNT con
+        acount() y la página (con sus prefetch) con aiterator().
+        Reproduce Paginator.page() para que enlaces y errores coincidan.
+        """
+        self.keyset = None
+        if request.query_params.get(self.mode_query_param) == "cursor":
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.page_size
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()  # cached_property: no vuelve a contar
+        page_number = self.get_page_number(request, paginator)
+        try:
+            numero = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        inicio = (numero - 1) * paginator.per_page
+        fin = inicio + paginator.per_page
+        if fin + paginator.orphans >= paginator.count:
+            fin = paginator.count
+        objetos = [obj async for obj in queryset[inicio:fin].aiterator(chunk_size=max(fin - inicio, 1))]
+        self.page = paginator._get_page(objetos, numero, paginator)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,69 @@
+import codecs
+import io
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el JSONParser de DRF tal cual
+    orjson = None
+
+
+# Cifras -> "0", el resto -> " ": buscar 19 ceros seguidos es mucho más
+# rápido que una expresión regular sobre el cuerpo entero
+_SOLO_CIFRAS = bytes(48 if 48 <= i <= 57 else 32 for i in range(256))
+_CIFRAS_LARGAS = b"0" * 19
+
+
+def _es_utf8(encoding):
+    return encoding.lower().replace("-", "").replace("_", "") == "utf8"
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser con orjson si está instalado. Lo que orjson rechaza (NaN,
+    enteros enormes, JSON inválido...) se vuelve a leer con el parser de
+    DRF, así que los errores y los casos límite son los mismos.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or not _es_utf8(encoding):
+            return super().parse(stream, media_type, parser_context)
+
+        contenido = stream.read()
+        # Según la versión, orjson convierte a float los enteros de más de
+        # 64 bits: con 19 cifras seguidas o más se lee con el de DRF
+        if _CIFRAS_LARGAS in contenido.translate(_SOLO_CIFRAS):
+            return super().parse(io.BytesIO(contenido), media_type, parser_context)
+        try:
+            return orjson.loads(contenido)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(contenido), media_type, parser_context)
+
+
+class NDJSONParser(BaseParser):
+    """
+    JSON por líneas (un objeto por línea). Devuelve la lista de objetos;
+    las líneas vacías se ignoran.
+    """
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        lector = codecs.getreader(encoding)(stream)
+
+        objetos = []
+        for numero, linea in enumerate(lector, start=1):
+            if not linea.strip():
+                continue
+            try:
+                objetos.append(json.loads(linea))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON no válido en la línea {numero}: {exc}")
+        return objetos
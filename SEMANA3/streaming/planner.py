@@ -0,0 +1,117 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .recientes import RelacionAcotada
+from .serializers import campos_anidados
+
+
+# --------
+# PLANIFICADOR DE QUERYSETS
+# Recorre los campos que el serializer va a pintar de verdad y decide
+# qué relaciones hay que traer con select_related (FK / 1:1) y cuáles
+# con prefetch_related (1:N / N:M). Así un listado cuesta siempre el
+# mismo número de consultas, tenga las películas / reseñas que tenga.
+# --------
+
+
+class _Nodo:
+    def __init__(self, model, back=None, to_attr=None):
+        self.model = model
+        # nombre del FK que apunta al padre (ya lo rellena el prefetch)
+        self.back = back
+        # relaciones acotadas (recientes.py): el prefetch va con to_attr
+        self.to_attr = to_attr
+        self.select = {}
+        self.prefetch = {}
+
+
+def _recorrer(nodo, fields):
+    for field in fields.values():
+        if field.write_only or field.source == "*":
+            continue
+
+        # FK escrita como ID: DRF solo lee <campo>_id, no hace falta JOIN
+        if isinstance(field, serializers.RelatedField) and field.use_pk_only_optimization():
+            if len(field.source_attrs) == 1:
+                continue
+
+        hijos = campos_anidados(field)
+        actual = nodo
+        ultimo = len(field.source_attrs) - 1
+
+        for i, attr in enumerate(field.source_attrs):
+            to_attr = None
+            try:
+                rel = actual.model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                acotada = getattr(actual.model, attr, None)
+                if not isinstance(acotada, RelacionAcotada):
+                    break
+                rel, to_attr = acotada.rel, attr
+            if not rel.is_relation or attr == actual.back:
+                break
+
+            if rel.many_to_many or rel.one_to_many:
+                back = rel.field.name if rel.one_to_many else None
+                siguiente = actual.prefetch.setdefault(attr, _Nodo(rel.related_model, back, to_attr))
+            else:
+                siguiente = actual.select.setdefault(attr, _Nodo(rel.related_model))
+
+            if i == ultimo and hijos is not None:
+                _recorrer(siguiente, hijos)
+            actual = siguiente
+
+
+def _compilar(nodo):
+    selects, prefetches = [], []
+
+    for nombre, hijo in nodo.select.items():
+        sub_selects, sub_prefetches = _compilar(hijo)
+        selects.append(nombre)
+        selects.extend(f"{nombre}__{s}" for s in sub_selects)
+        prefetches.extend(
+            Prefetch(f"{nombre}__{p.prefetch_through}", queryset=p.queryset, to_attr=p.to_attr)
+            for p in sub_prefetches
+        )
+
+    for nombre, hijo in nodo.prefetch.items():
+        sub_selects, sub_prefetches = _compilar(hijo)
+        queryset = hijo.model._default_manager.all()
+        if sub_selects:
+            queryset = queryset.select_related(*sub_selects)
+        if sub_prefetches:
+            queryset = queryset.prefetch_related(*sub_prefetches)
+        prefetches.append(Prefetch(nombre, queryset=queryset, to_attr=hijo.to_attr))
+
+    return selects, prefetches
+
+
+def plan_queryset(queryset, serializer):
+    """
+    Aplica al queryset los select_related / prefetch_related que necesita
+    el serializer (instancia ya construida, con sus campos finales).
+    """
+    raiz = _Nodo(queryset.model)
+    _recorrer(raiz, serializer.fields)
+    selects, prefetches = _compilar(raiz)
+
+    if selects:
+        queryset = queryset.select_related(*selects)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+class EagerLoadingMixin:
+    """
+    Mixin para viewsets: en las acciones de `eager_actions` el queryset
+    se planifica a partir de los campos del serializer de esa acción.
+    """
+    eager_actions = ("list", "retrieve")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, "action", None) in self.eager_actions:
+            queryset = plan_queryset(queryset, self.get_serializer())
+        return queryset
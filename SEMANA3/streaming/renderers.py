@@ -0,0 +1,56 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el JSONRenderer de DRF tal cual
+    orjson = None
+
+
+# --------
+# RENDERER JSON RÁPIDO
+# Con orjson instalado el JSON se genera en C (directamente en bytes).
+# Para que la salida sea la misma que la de DRF:
+#   - fechas / horas no las formatea orjson: pasan al JSONEncoder de DRF
+#     (igual que Decimal, UUID, QuerySet, lazy strings...)
+#   - se escapan U+2028 / U+2029 como hace DRF
+#   - con indentación (?indent=, API navegable), ensure_ascii o un
+#     encoder propio se usa el renderer de DRF
+# Lo que orjson no sabe representar igual (enteros de más de 64 bits,
+# tipos desconocidos) hace saltar JSONEncodeError y también se delega.
+# Diferencias conocidas: floats en notación exponencial ("1e16" frente a
+# "1e+16") y NaN/Infinity (orjson escribe null). Ninguna sale de los
+# serializers del catálogo.
+# Se activa en REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"].
+# --------
+if orjson is not None:
+    OPCIONES_ORJSON = (
+        orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_NON_STR_KEYS
+    )
+
+_ENCODER = encoders.JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def _admite_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.encoder_class is encoders.JSONEncoder
+            and not self.ensure_ascii
+            and self.compact
+            and self.get_indent(accepted_media_type, renderer_context) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if data is None or not self._admite_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_ENCODER.default, option=OPCIONES_ORJSON)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
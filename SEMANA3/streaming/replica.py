@@ -0,0 +1,218 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# --------
+# RÉPLICA DE LECTURA
+# Las lecturas de las peticiones GET / HEAD (list, retrieve, exportar...)
+# van a la base de datos "replica"; todo lo demás, a la principal.
+# En local la réplica es una copia de db.sqlite3 que refresca cada pocos
+# segundos el comando replicar (API de backup de SQLite); su retraso es
+# lo que ha pasado desde la última copia (mtime del fichero).
+#   - tras una escritura, ese cliente lee de la principal durante PEGADO
+#     segundos (cookie), para ver lo que acaba de escribir
+#   - si la copia tiene más de RETRASO_MAXIMO segundos (o no existe) se
+#     lee de la principal
+#   - sin DATABASES["replica"] (p. ej. en los tests) no cambia nada
+# El retraso y a dónde ha ido cada petición salen en /api/metrics.
+# --------
+AJUSTES = {
+    "ALIAS": "replica",
+    "FICHERO": None,  # la copia de SQLite que escribe replicar
+    "PEGADO": 5.0,  # segundos leyendo de la principal tras escribir
+    "RETRASO_MAXIMO": 10.0,  # más viejo que esto: se lee de la principal
+    "APPS": ("streaming",),
+}
+COOKIE = "streaming_primaria"
+METODOS_LECTURA = {"GET", "HEAD", "OPTIONS"}
+
+
+def ajustes():
+    return {**AJUSTES, **getattr(settings, "STREAMING_REPLICA", {})}
+
+
+def configurada():
+    return ajustes()["ALIAS"] in settings.DATABASES
+
+
+# (alias, instante de la copia en ns) de las lecturas de la petición en curso
+_lectura = ContextVar("streaming_lectura", default=None)
+
+# motivo -> peticiones (ver destino)
+_contadores = Counter()
+_candado = threading.Lock()
+
+
+def _contar(motivo):
+    with _candado:
+        _contadores[motivo] += 1
+
+
+def contadores():
+    with _candado:
+        return dict(_contadores)
+
+
+# -------- copia y retraso --------
+def instante_copia():
+    """Instante (ns) de la copia de la réplica, o None si no hay."""
+    fichero = ajustes()["FICHERO"]
+    if not fichero:
+        return None
+    try:
+        return os.stat(fichero).st_mtime_ns
+    except OSError:
+        return None
+
+
+def retraso():
+    """Segundos desde la última copia (None: no hay réplica)."""
+    instante = instante_copia()
+    if instante is None:
+        return None
+    return max(0.0, (time.time_ns() - instante) / 1e9)
+
+
+def copiar(origen=None, destino=None):
+    """
+    Copia la base de datos principal sobre la réplica y devuelve los
+    segundos que ha tardado. Se escribe en un fichero aparte que luego
+    sustituye al anterior (os.replace): quien esté leyendo la copia
+    vieja la termina de leer.
+    """
+    origen = origen or settings.DATABASES[DEFAULT_DB_ALIAS]["NAME"]
+    destino = destino or ajustes()["FICHERO"]
+    temporal = f"{destino}.tmp"
+    # Lo que se haya confirmado antes de este instante está en la copia
+    inicio = time.time_ns()
+    fuente = sqlite3.connect(origen)
+    copia = sqlite3.connect(temporal)
+    try:
+        fuente.backup(copia)
+        # Sin WAL en la copia: al sustituir el fichero no pueden quedar
+        # -wal / -shm de la anterior
+        copia.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        copia.close()
+        fuente.close()
+    os.utime(temporal, ns=(inicio, inicio))
+    os.replace(temporal, destino)
+    return (time.time_ns() - inicio) / 1e9
+
+
+# -------- a dónde va cada petición --------
+def destino(request):
+    """(alias o None, motivo) para las lecturas de esta petición."""
+    if request.method not in METODOS_LECTURA:
+        return None, "escritura"
+    try:
+        pegado = float(request.COOKIES.get(COOKIE, 0)) > time.time()
+    except ValueError:
+        pegado = False
+    if pegado:
+        return None, "pegada"
+    instante = instante_copia()
+    if instante is None or (time.time_ns() - instante) / 1e9 > ajustes()["RETRASO_MAXIMO"]:
+        return None, "retraso"
+    return (ajustes()["ALIAS"], instante), "replica"
+
+
+def copia_anterior_a(generacion):
+    """
+    ¿Lee esta petición de una copia hecha antes de `generacion` (ns)?
+    Lo usa cache.py para no guardar como actual una respuesta vieja.
+    Sin margen: la generación se sube en transaction.on_commit, después
+    del commit, y la copia toma su instante antes de empezar a leer; una
+    copia con instante >= generación ya incluye la escritura.
+    """
+    lectura = _lectura.get()
+    return lectura is not None and lectura[1] < generacion
+
+
+class ReplicaMiddleware:
+    """Elige la base de datos de lectura de cada petición."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = configurada()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.activo:
+            return self.get_response(request)
+        token = self._antes(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _lectura.reset(token)
+        return self._despues(request, response)
+
+    async def __acall__(self, request):
+        if not self.activo:
+            return await self.get_response(request)
+        token = self._antes(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _lectura.reset(token)
+        return self._despues(request, response)
+
+    @staticmethod
+    def _antes(request):
+        lectura, motivo = destino(request)
+        _contar(motivo)
+        return _lectura.set(lectura)
+
+    @staticmethod
+    def _despues(request, response):
+        if request.method not in METODOS_LECTURA and response.status_code < 400:
+            pegado = ajustes()["PEGADO"]
+            response.set_cookie(COOKIE, f"{time.time() + pegado:.3f}", max_age=pegado, samesite="Lax")
+        return response
+
+
+def _conexion_al_dia(alias, instante):
+    # Una conexión abierta (CONN_MAX_AGE, cliente de pruebas) sigue leyendo
+    # el fichero que había al abrirla: si la copia ha cambiado, se reabre
+    conexion = connections[alias]
+    if conexion.connection is not None and getattr(conexion, "instante_copia", None) != instante:
+        conexion.close()
+    conexion.instante_copia = instante
+
+
+class EnrutadorReplica:
+    """DATABASE_ROUTERS: las lecturas de la petición en curso, a la réplica."""
+
+    def db_for_read(self, model, **hints):
+        lectura = _lectura.get()
+        if lectura is None or model._meta.app_label not in ajustes()["APPS"]:
+            return None
+        _conexion_al_dia(*lectura)
+        return lectura[0]
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Son los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica es una copia: no se migra
+        if db == ajustes()["ALIAS"]:
+            return False
+        return None
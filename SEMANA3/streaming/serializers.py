@@ -1,6 +1,19 @@
+import copy
+import operator
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework import serializers
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.manager import BaseManager
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import SkipField
+from rest_framework.settings import api_settings
+from rest_framework.permissions import SAFE_METHODS
 
+from . import clasificaciones
 from .models import (
     Pelicula,
     Etiqueta,
@@ -12,12 +25,292 @@ from .models import (
 # Si has añadido FichaTecnica en models.py, descomenta estas líneas:
 # from .models import FichaTecnica
 
+
+# --------
+# CAMPOS DINÁMICOS (?fields= y ?expand=)
+# ?fields=id,titulo,precio  -> solo esos campos de primer nivel
+# ?expand=resenas.usuario_detalle,categoria_detalle
+#                           -> solo se anidan esos objetos (el resto de
+#                              anidados se quitan); sin ?expand se anida todo
+# Solo se aplica en lecturas y sobre el serializer raíz (el que recibe la
+# request en el contexto); el planificador de querysets ve ya los campos
+# podados, así que tampoco hace los JOIN / prefetch que no se van a usar.
+# --------
+def campos_anidados(field):
+    if isinstance(field, serializers.ListSerializer):
+        return field.child.fields
+    if isinstance(field, serializers.BaseSerializer):
+        return field.fields
+    return None
+
+
+def _arbol_expand(valor):
+    arbol = {}
+    for ruta in valor.split(","):
+        nodo = arbol
+        for parte in filter(None, ruta.strip().split(".")):
+            nodo = nodo.setdefault(parte, {})
+    return arbol
+
+
+def _podar(fields, campos, expandir):
+    for nombre in list(fields):
+        if campos is not None and nombre not in campos:
+            fields.pop(nombre)
+            continue
+        anidados = campos_anidados(fields[nombre])
+        if anidados is None or expandir is None:
+            continue
+        if nombre not in expandir:
+            fields.pop(nombre)
+        else:
+            _podar(anidados, None, expandir[nombre])
+
+
+class DynamicFieldsMixin:
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        params = request.query_params
+        campos = params.get(self.fields_query_param)
+        expandir = params.get(self.expand_query_param)
+        if campos is None and expandir is None:
+            return
+
+        _podar(
+            self.fields,
+            {c.strip() for c in campos.split(",")} if campos is not None else None,
+            _arbol_expand(expandir) if expandir is not None else None,
+        )
+
+
+# --------
+# LECTURA COMPILADA
+# Serializer.to_representation recorre los campos por fila y, para cada
+# uno, pasa por get_attribute / PKOnlyObject / to_representation; los
+# anidados repiten lo mismo por cada hijo. Aquí se "compila" una vez la
+# lista de campos (ya podada por ?fields= / ?expand=) en una función
+# plana por fila: getattr directo + conversión del tipo del campo.
+# La salida es la misma que la de DRF. Si algún campo no es de los tipos
+# conocidos (p. ej. SerializerMethodField, que depende del contexto) no
+# se compila y se usa el camino normal de DRF.
+# La función se guarda en la clase por "forma" (campos que quedan,
+# ordenados), así que se compila una vez por combinación de
+# ?fields/?expand; como las combinaciones las elige el cliente, solo se
+# guardan las `compiled_cache_size` usadas más recientemente (LRU).
+# Por eso los lectores no pueden cerrar sobre los campos enlazados: su
+# parent lleva al serializador raíz, y con él al contexto y a la petición
+# de la primera vez. Solo guardan attrgetter / source_attrs y, donde hace
+# falta el propio campo, una copia suelta (_suelto) sin padre.
+# Cada lector recibe (objeto, zona horaria): la zona activa se consulta
+# una vez por fila y no una vez por fecha.
+# --------
+_CONVERSIONES = {
+    serializers.IntegerField: int,
+    serializers.CharField: str,
+    serializers.FloatField: float,
+    serializers.BooleanField: bool,
+    serializers.ReadOnlyField: None,
+}
+
+# Del resto de campos de rest_framework.fields (Decimal, ...) se
+# reutiliza su to_representation, que no depende del contexto (FileField
+# sí: la URL absoluta sale de la petición)
+_NO_DELEGABLES = (serializers.SerializerMethodField, serializers.HiddenField, serializers.FileField)
+
+
+class _NoCompilable(Exception):
+    pass
+
+
+def _forma(fields):
+    return tuple(sorted(
+        (nombre, type(field), _forma(campos_anidados(field)) if campos_anidados(field) is not None else None)
+        for nombre, field in fields.items()
+        if not field.write_only
+    ))
+
+
+_candado_compiladas = threading.Lock()
+
+
+def _sin_to_representation_propio(serializer, base):
+    return type(serializer).to_representation in (base.to_representation, CompiledReadMixin.to_representation)
+
+
+def _modelo(field):
+    return getattr(getattr(field.parent, "Meta", None), "model", None)
+
+
+def _suelto(field):
+    """Copia del campo sin padre, con el mismo origen (source_attrs)."""
+    copia = copy.deepcopy(field)  # Field.__deepcopy__: de nuevo con sus argumentos
+    copia.field_name, copia.source, copia.source_attrs = field.field_name, field.source, field.source_attrs
+    return copia
+
+
+def _leer_simple(field):
+    # Un campo concreto del modelo sin puntos: getattr directo. El resto
+    # (métodos, rutas con puntos, 1:1 inversas) pasa por get_attribute de DRF
+    modelo = _modelo(field)
+    if modelo is not None and len(field.source_attrs) == 1:
+        try:
+            if modelo._meta.get_field(field.source_attrs[0]).concrete:
+                return operator.attrgetter(field.source_attrs[0])
+        except FieldDoesNotExist:
+            pass
+    return _suelto(field).get_attribute
+
+
+def _formato_iso(field, ajuste):
+    return (getattr(field, "format", getattr(api_settings, ajuste)) or "").lower() == ISO_8601
+
+
+def _conversion(field):
+    """Función (valor, zona) -> representación, o None si el valor va tal cual."""
+    for base, conversion in _CONVERSIONES.items():
+        if isinstance(field, base) and type(field).to_representation is base.to_representation:
+            return None if conversion is None else (lambda valor, zona: conversion(valor))
+
+    representar = _suelto(field).to_representation
+    if type(field) is serializers.DateTimeField and _formato_iso(field, "DATETIME_FORMAT") \
+            and settings.USE_TZ and not hasattr(field, "timezone"):
+        def fecha_hora(valor, zona):
+            if isinstance(valor, str) or timezone.is_naive(valor):
+                return representar(valor)
+            valor = valor.astimezone(zona).isoformat()
+            return valor[:-6] + "Z" if valor.endswith("+00:00") else valor
+        return fecha_hora
+
+    if type(field) is serializers.DateField and _formato_iso(field, "DATE_FORMAT"):
+        return lambda valor, zona: valor if isinstance(valor, str) else valor.isoformat()
+
+    if type(field).__module__ == "rest_framework.fields" and not isinstance(field, _NO_DELEGABLES):
+        return lambda valor, zona: representar(valor)
+    raise _NoCompilable(field.field_name)
+
+
+def _lector(field):
+    if isinstance(field, serializers.ListSerializer):
+        if not _sin_to_representation_propio(field, serializers.ListSerializer) or len(field.source_attrs) != 1:
+            raise _NoCompilable(field.field_name)
+        hijo = _compilar_campos(field.child)
+        relacion = operator.attrgetter(field.source_attrs[0])
+
+        def lista(obj, zona):
+            # Como ListSerializer: .all() si es un manager (si no, ya es una lista)
+            valor = relacion(obj)
+            return [hijo(item, zona) for item in (valor.all() if isinstance(valor, BaseManager) else valor)]
+        return lista
+
+    if isinstance(field, serializers.BaseSerializer):
+        hijo = _compilar_campos(field)
+        leer = _leer_simple(field)
+
+        def anidado(obj, zona):
+            valor = leer(obj)
+            return None if valor is None else hijo(valor, zona)
+        return anidado
+
+    if type(field) is serializers.ManyRelatedField:
+        hijo = field.child_relation
+        if type(hijo) is not serializers.PrimaryKeyRelatedField or hijo.pk_field is not None:
+            raise _NoCompilable(field.field_name)
+        if len(field.source_attrs) != 1:
+            raise _NoCompilable(field.field_name)
+        relacion = operator.attrgetter(field.source_attrs[0])
+        return lambda obj, zona: [item.pk for item in relacion(obj).all()]
+
+    if type(field) is serializers.PrimaryKeyRelatedField:
+        modelo = _modelo(field)
+        if field.pk_field is not None or len(field.source_attrs) != 1 or modelo is None:
+            raise _NoCompilable(field.field_name)
+        # Igual que use_pk_only_optimization: se lee <campo>_id, sin JOIN
+        leer = operator.attrgetter(modelo._meta.get_field(field.source_attrs[0]).attname)
+        return lambda obj, zona: leer(obj)
+
+    conversion = _conversion(field)
+    leer = _leer_simple(field)
+    if conversion is None:
+        return lambda obj, zona: leer(obj)
+
+    def simple(obj, zona):
+        valor = leer(obj)
+        return None if valor is None else conversion(valor, zona)
+    return simple
+
+
+def _compilar_campos(serializer):
+    if not _sin_to_representation_propio(serializer, serializers.Serializer):
+        raise _NoCompilable(type(serializer).__name__)
+    lectores = tuple((nombre, _lector(field)) for nombre, field in serializer.fields.items() if not field.write_only)
+
+    def fila(obj, zona):
+        return {nombre: leer(obj, zona) for nombre, leer in lectores}
+    return fila
+
+
+class CompiledReadMixin:
+    compiled_read = True
+    compiled_cache_size = 128  # formas compiladas por clase (LRU)
+
+    def _fila_compilada(self):
+        if "_fila" not in self.__dict__:
+            cls = type(self)
+            forma = _forma(self.fields)
+            with _candado_compiladas:
+                compiladas = cls.__dict__.get("_compiladas")
+                if compiladas is None:
+                    compiladas = cls._compiladas = OrderedDict()
+                if forma in compiladas:
+                    compiladas.move_to_end(forma)
+                else:
+                    try:
+                        compiladas[forma] = _compilar_campos(self)
+                    except _NoCompilable:
+                        compiladas[forma] = None
+                    while len(compiladas) > self.compiled_cache_size:
+                        compiladas.popitem(last=False)
+                self._fila = compiladas[forma]
+        return self._fila
+
+    def to_representation(self, instance):
+        fila = self._fila_compilada() if self.compiled_read else None
+        if fila is None:
+            return super().to_representation(instance)
+        try:
+            return fila(instance, timezone.get_current_timezone())
+        except (SkipField, AttributeError, KeyError):
+            # Algún campo sin valor (get_attribute de DRF): camino normal,
+            # que también da el error con el nombre del serializador
+            return super().to_representation(instance)
+
+
 class ValorarPeliculaSerializer(serializers.Serializer):
     usuario_id = serializers.IntegerField()
     puntuacion = serializers.IntegerField(min_value=1, max_value=10)
     comentario = serializers.CharField(max_length=500, required=False, allow_blank=True)
 
 
+class ValorarLoteSerializer(ValorarPeliculaSerializer):
+    # Un elemento de POST /peliculas/valorar-lote/
+    pelicula = serializers.IntegerField()
+
+
+class ClasificacionSerializer(serializers.Serializer):
+    # Parámetros de /peliculas/mejor-valoradas/ y /peliculas/tendencias/
+    categoria = serializers.IntegerField(required=False)
+    limite = serializers.IntegerField(
+        min_value=1, max_value=clasificaciones.AJUSTES["LIMITE_MAXIMO"], required=False
+    )
+
+
 class CategoriaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Categoria
@@ -48,7 +341,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class ResenaSerializer(serializers.ModelSerializer):
+class ResenaSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     # opcional: para lectura “rica”
     usuario_detalle = UserSerializer(source="usuario", read_only=True)
     pelicula_titulo = serializers.ReadOnlyField(source="pelicula.titulo")
@@ -76,7 +369,7 @@ class ResenaSerializer(serializers.ModelSerializer):
 #         read_only_fields = ["id"]
 
 
-class PeliculaSerializer(serializers.ModelSerializer):
+class PeliculaSerializer(CompiledReadMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     # --------
     # PATRÓN MIXTO 1:N (ForeignKey)
     # Escritura: ID (categoria)
@@ -103,9 +396,11 @@ class PeliculaSerializer(serializers.ModelSerializer):
 
     # --------
     # N:M con modelo intermedio (through): Resena
-    # Exponemos la “relación-entidad” como lista en la película (solo lectura)
+    # Exponemos la “relación-entidad” en la película (solo lectura), pero
+    # solo las más recientes (Pelicula.resenas_recientes): el total está
+    # en num_resenas y todas, paginadas, en /peliculas/{id}/resenas/
     # --------
-    resenas = ResenaSerializer(many=True, read_only=True)
+    resenas = ResenaSerializer(source="resenas_recientes", many=True, read_only=True)
 
     # --------
     # 1:1 con ficha técnica (si existe en tu models.py)
@@ -125,8 +420,9 @@ class PeliculaSerializer(serializers.ModelSerializer):
             "etiquetas",
             "etiquetas_detalle",
 
-            "usuarios",     # OJO: este es el M2M through; normalmente lo dejamos read_only
-            "resenas",      # lectura rica del through
+            # "usuarios" (el M2M through) ya no va: crecía con cada reseña;
+            # los usuarios están en /peliculas/{id}/resenas/
+            "resenas",      # lectura rica del through (las más recientes)
 
             "precio",
             "fecha_estreno",
@@ -135,12 +431,51 @@ class PeliculaSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
 
+            # agregados de reseñas (los mantiene el servidor)
+            "num_resenas",
+            "puntuacion_media",
+            "ultima_resena",
+
             # "ficha_tecnica",
         ]
-        read_only_fields = ["id", "created_at", "updated_at", "usuarios"]
+        read_only_fields = [
+            "id", "created_at", "updated_at",
+            "num_resenas", "puntuacion_media", "ultima_resena",
+        ]
 
     def validate_precio(self, value):
         if value < 0:
             raise serializers.ValidationError("El precio no puede ser negativo")
         return value
 
+
+
+class PeliculaLoteSerializer(serializers.ModelSerializer):
+    # --------
+    # Un elemento de la carga masiva (POST /peliculas/lote/).
+    # categoria / etiquetas llegan como IDs "sueltos": se comprueban todos
+    # de golpe en streaming.lotes (una consulta por modelo, no una por ID).
+    # Con "id" el elemento actualiza esa película; sin él, la crea.
+    # --------
+    id = serializers.IntegerField(required=False)
+    categoria = serializers.IntegerField(allow_null=True, required=False)
+    etiquetas = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Pelicula
+        fields = [
+            "id",
+            "titulo",
+            "descripcion",
+            "categoria",
+            "etiquetas",
+            "precio",
+            "fecha_estreno",
+            "duracion",
+            "activa",
+        ]
+
+    def validate_precio(self, value):
+        if value < 0:
+            raise serializers.ValidationError("El precio no puede ser negativo")
+        return value
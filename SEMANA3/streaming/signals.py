@@ -0,0 +1,37 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump
+from .models import Categoria, Etiqueta, FichaTecnica, Pelicula, Perfil, Resena
+
+
+# --------
+# INVALIDACIÓN DE LA CACHÉ DE RESPUESTAS
+# Cualquier escritura en estos modelos sube su generación (ver cache.py).
+# User y Perfil van anidados en las reseñas (usuario_detalle).
+# La generación se sube tras el commit: antes, un GET concurrente leería
+# los datos sin confirmar y los guardaría con la generación nueva.
+# --------
+MODELOS_CACHEADOS = (Pelicula, Resena, Categoria, Etiqueta, FichaTecnica, User, Perfil)
+# Lo que guarda el login (update_last_login) no sale en ninguna respuesta
+CAMPOS_SIN_INVALIDAR = {User: {"last_login"}}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidar_modelo(sender, update_fields=None, **kwargs):
+    if sender not in MODELOS_CACHEADOS:
+        return
+    if update_fields and set(update_fields) <= CAMPOS_SIN_INVALIDAR.get(sender, set()):
+        return
+    transaction.on_commit(partial(bump, sender), using=kwargs.get("using"))
+
+
+@receiver(m2m_changed, sender=Pelicula.etiquetas.through)
+def invalidar_etiquetas_pelicula(sender, action, **kwargs):
+    if action.startswith("post_"):
+        transaction.on_commit(partial(bump, Pelicula), using=kwargs.get("using"))
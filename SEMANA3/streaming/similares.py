@@ -0,0 +1,245 @@
+import hashlib
+import heapq
+import math
+import time
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Pelicula, Resena, SimilaresPelicula, VecinoSimilar
+
+
+# --------
+# PELÍCULAS PARECIDAS (precalculadas)
+# /peliculas/{id}/similares/ solo lee una fila de SimilaresPelicula (los
+# VECINOS más parecidos ya ordenados) y los títulos: nada de calcular en
+# la petición. Los calcula el comando calcular_similares.
+# Similitud de dos películas a y b:
+#   PESO_ETIQUETAS    * |etiquetas(a) ∩ etiquetas(b)| / sqrt(|etiquetas(a)| |etiquetas(b)|)
+# + PESO_VALORACIONES * |usuarios(a) ∩ usuarios(b)|   / sqrt(|usuarios(a)| |usuarios(b)|)
+# (coseno de los vectores de etiquetas y de "quién la ha valorado"; con
+# menos de MIN_COMUNES usuarios en común la segunda parte no cuenta).
+# Se carga un índice invertido (etiqueta -> películas, usuario ->
+# películas) en arrays de enteros y, película a película, se cuentan los
+# vecinos recorriendo solo las películas que comparten algo con ella: la
+# fila dispersa del producto, nunca la matriz entera. Se guarda cada
+# BLOQUE de películas en una transacción.
+# Incremental: cada fila guarda la "firma" de la película (num_resenas,
+# suma_puntuaciones, ultima_resena, etiquetas). La similitud de b con una
+# película a que ha cambiado depende de |etiquetas(a)| y |usuarios(a)|,
+# así que se recalculan las que han cambiado y:
+#   - las que las tenían entre sus vecinos (ha cambiado su valor, o han
+#     dejado de compartir algo: etiqueta quitada, reseña borrada) o
+#     tienen un vecino borrado
+#   - las que comparten ahora algo con ellas y en las que, con el valor
+#     nuevo, entrarían entre los VECINOS mejores
+# En el resto la fila no cambia: un valor que no estaba entre los
+# mejores y sigue sin estarlo no la mueve. Con --todas, todas.
+# Las primeras salen del índice inverso VecinoSimilar (una fila por
+# vecino guardado, vecino NULL si se ha borrado) y de las segundas solo
+# se leen las filas de las candidatas: nunca la tabla entera.
+# Las reseñas nuevas no marcan nada al escribirse: las ve la pasada
+# siguiente por la firma (calcular_similares --intervalo).
+# --------
+AJUSTES = {
+    "VECINOS": 20,
+    "PESO_ETIQUETAS": 0.4,
+    "PESO_VALORACIONES": 0.6,
+    "MIN_COMUNES": 2,
+    "BLOQUE": 200,
+}
+
+
+def ajustes():
+    return {**AJUSTES, **getattr(settings, "STREAMING_SIMILARES", {})}
+
+
+def _etiquetas():
+    """pelicula_id -> {etiqueta_id}"""
+    por_pelicula = defaultdict(set)
+    filas = Pelicula.etiquetas.through.objects.values_list("pelicula_id", "etiqueta_id")
+    for pelicula_id, etiqueta_id in filas.iterator(chunk_size=10000):
+        por_pelicula[pelicula_id].add(etiqueta_id)
+    return por_pelicula
+
+
+def firmas(etiquetas):
+    """pelicula_id -> firma de lo que usa el cálculo (ver SimilaresPelicula.firma)"""
+    resultado = {}
+    filas = Pelicula.objects.order_by().values_list("pk", "num_resenas", "suma_puntuaciones", "ultima_resena")
+    for pk, num, suma, ultima in filas.iterator(chunk_size=10000):
+        crudo = f"{num}|{suma}|{ultima.isoformat() if ultima else ''}|{sorted(etiquetas.get(pk, ()))}"
+        resultado[pk] = hashlib.sha1(crudo.encode()).hexdigest()
+    return resultado
+
+
+class Indice:
+    """Índices invertidos para contar, de una película, lo que comparte con las demás."""
+
+    def __init__(self, etiquetas):
+        self.etiquetas = etiquetas
+        self.por_etiqueta = defaultdict(lambda: array("l"))
+        for pelicula_id, suyas in etiquetas.items():
+            for etiqueta_id in suyas:
+                self.por_etiqueta[etiqueta_id].append(pelicula_id)
+
+        self.usuarios = defaultdict(lambda: array("l"))  # película -> usuarios
+        self.valoradas = defaultdict(lambda: array("l"))  # usuario -> películas
+        filas = Resena.objects.order_by().values_list("pelicula_id", "usuario_id")
+        for pelicula_id, usuario_id in filas.iterator(chunk_size=10000):
+            self.usuarios[pelicula_id].append(usuario_id)
+            self.valoradas[usuario_id].append(pelicula_id)
+
+    def vecinos(self, pk, cuantos, peso_etiquetas, peso_valoraciones, min_comunes):
+        """[[id, similitud], ...] las `cuantos` más parecidas a `pk`"""
+        similitud = self.similitudes(pk, peso_etiquetas, peso_valoraciones, min_comunes)
+        mejores = heapq.nlargest(cuantos, similitud.items(), key=lambda par: (par[1], -par[0]))
+        return [[otra, round(valor, 4)] for otra, valor in mejores]
+
+    def similitudes(self, pk, peso_etiquetas, peso_valoraciones, min_comunes):
+        """{id: similitud} de todas las que comparten algo con `pk`"""
+        similitud = defaultdict(float)
+
+        suyas = self.etiquetas.get(pk, ())
+        comunes = Counter()
+        for etiqueta_id in suyas:
+            comunes.update(self.por_etiqueta[etiqueta_id])
+        for otra, n in comunes.items():
+            similitud[otra] += peso_etiquetas * n / math.sqrt(len(suyas) * len(self.etiquetas[otra]))
+
+        usuarios = self.usuarios.get(pk, ())
+        comunes = Counter()
+        for usuario_id in usuarios:
+            comunes.update(self.valoradas[usuario_id])
+        for otra, n in comunes.items():
+            if n >= min_comunes:
+                similitud[otra] += peso_valoraciones * n / math.sqrt(len(usuarios) * len(self.usuarios[otra]))
+
+        similitud.pop(pk, None)
+        return similitud
+
+
+def _trozos(ids, tamano=500):
+    ids = sorted(ids)
+    for i in range(0, len(ids), tamano):
+        yield ids[i:i + tamano]
+
+
+def _afectadas(sucias, indice, existentes, cuantos, pesos):
+    """Las sucias y las películas cuya fila depende de alguna de ellas (ver arriba)."""
+    afectadas = set(sucias)
+
+    # Lo que compartían antes del cambio solo queda en las filas guardadas
+    mencionan = VecinoSimilar.objects.order_by().values_list("similares_id", flat=True)
+    for trozo in _trozos(sucias):
+        afectadas.update(mencionan.filter(vecino__in=trozo))
+
+    # La similitud es simétrica: la fila de la sucia da su valor en cada
+    # otra, que solo cambia si con él entra entre sus `cuantos` mejores
+    candidatas = defaultdict(list)
+    for pk in sucias:
+        for otra, valor in indice.similitudes(pk, *pesos).items():
+            if otra not in afectadas:
+                candidatas[otra].append((valor, -pk))
+    guardadas = {}
+    for trozo in _trozos(candidatas):
+        filas = SimilaresPelicula.objects.filter(pelicula_id__in=trozo).values_list("pelicula_id", "vecinos")
+        guardadas.update(filas)
+    for otra, valores in candidatas.items():
+        fila = guardadas.get(otra)
+        if fila is None or len(fila) < cuantos:
+            afectadas.add(otra)
+        elif max(valores) >= (fila[-1][1] - 1e-4, -fila[-1][0]):  # redondeo
+            afectadas.add(otra)
+    return afectadas & existentes
+
+
+def calcular(todas=False, vecinos=None, bloque=None):
+    """
+    Recalcula SimilaresPelicula (solo lo que ha cambiado salvo con
+    todas=True). Devuelve {"peliculas", "recalculadas", "segundos"}.
+    """
+    opciones = ajustes()
+    vecinos = vecinos or opciones["VECINOS"]
+    bloque = bloque or opciones["BLOQUE"]
+    inicio = time.perf_counter()
+    # Lo que se confirme a partir de aquí puede no estar en el cálculo:
+    # la siguiente pasada lo verá por la firma
+    calculado_en = timezone.now()
+
+    etiquetas = _etiquetas()
+    actuales = firmas(etiquetas)
+    if todas:
+        pendientes = set(actuales)
+    else:
+        guardadas = dict(SimilaresPelicula.objects.values_list("pelicula_id", "firma"))
+        pendientes = {pk for pk, firma in actuales.items() if guardadas.get(pk) != firma}
+        # Con un vecino borrado (NULL) aunque no haya cambiado ninguna firma
+        pendientes.update(
+            VecinoSimilar.objects.filter(vecino__isnull=True).values_list("similares_id", flat=True)
+        )
+
+    if pendientes:
+        indice = Indice(etiquetas)
+        pesos = (opciones["PESO_ETIQUETAS"], opciones["PESO_VALORACIONES"], opciones["MIN_COMUNES"])
+        if not todas:
+            pendientes = _afectadas(pendientes, indice, actuales.keys(), vecinos, pesos)
+
+        ordenadas = sorted(pendientes)
+        for i in range(0, len(ordenadas), bloque):
+            trozo = ordenadas[i:i + bloque]
+            filas = [
+                SimilaresPelicula(
+                    pelicula_id=pk,
+                    vecinos=indice.vecinos(pk, vecinos, *pesos),
+                    firma=actuales[pk],
+                    calculado_en=calculado_en,
+                )
+                for pk in trozo
+            ]
+            with transaction.atomic():
+                SimilaresPelicula.objects.bulk_create(
+                    filas,
+                    update_conflicts=True,
+                    unique_fields=["pelicula"],
+                    update_fields=["vecinos", "firma", "calculado_en"],
+                )
+                VecinoSimilar.objects.filter(similares_id__in=trozo).delete()
+                VecinoSimilar.objects.bulk_create(
+                    VecinoSimilar(similares_id=fila.pelicula_id, vecino_id=otra)
+                    for fila in filas
+                    for otra, _ in fila.vecinos
+                )
+
+    return {
+        "peliculas": len(actuales),
+        "recalculadas": len(pendientes),
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+def similares_de(pk):
+    """
+    Lo que devuelve /peliculas/{id}/similares/ (None si la película no
+    existe). Dos consultas por clave primaria, sin cálculo.
+    """
+    vecinos = SimilaresPelicula.objects.filter(pelicula_id=pk).values_list("vecinos", flat=True).first()
+    if vecinos is None:
+        if not Pelicula.objects.filter(pk=pk).exists():
+            return None
+        vecinos = []  # aún sin calcular
+
+    datos = {
+        fila["id"]: fila
+        for fila in Pelicula.objects.filter(pk__in=[otra for otra, _ in vecinos])
+        .order_by()
+        .values("id", "titulo", "puntuacion_media", "num_resenas")
+    }
+    return [
+        {**datos[otra], "similitud": similitud}
+        for otra, similitud in vecinos
+        if otra in datos  # borrada después del cálculo
+    ]
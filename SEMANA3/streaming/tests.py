@@ -1,3 +1,1803 @@
-from django.test import TestCase
+import base64
+import csv
+import gc
+import io
+import itertools
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time as time_module
+import weakref
+from collections import OrderedDict
+from unittest import mock
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import APIView
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from .autenticacion import CachedJWTAuthentication, cache_compartida
+from .autenticacion import usuarios as usuarios_jwt
+from .benchmarks import urlconf_async
+from .cache import bump, response_key
+from .clasificaciones import AJUSTES as AJUSTES_CLASIFICACIONES
+from .clasificaciones import compactar
+from .escritor import EscritorResenas
+from .management.commands import importar_catalogo
+from .metricas import registro
+from .models import Categoria, Etiqueta, FichaTecnica, Pelicula, Perfil, Resena, SimilaresPelicula, VecinoSimilar
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .replica import COOKIE, _lectura, copia_anterior_a, copiar, destino
+from .serializers import PeliculaSerializer, ResenaSerializer
+from .similares import calcular
+from .valoraciones import recalcular_agregados
+from .views import PeliculaViewSet, ResenaViewSet
+
+
+# --------
+# PLANES DE CONSULTA
+# Para cada combinación de filtro / ordenación que admite la API se
+# lanzan las consultas reales del endpoint con EXPLAIN QUERY PLAN y se
+# falla si alguna recorre una tabla entera ("SCAN tabla" sin índice).
+# Recorrer un índice entero ("SCAN tabla USING [COVERING] INDEX i") solo
+# vale sin filtro: el ORDER BY ... LIMIT sale del índice y el COUNT(*)
+# lee el índice más estrecho. Con un filtro selectivo (o una película
+# concreta en la URL) cada tabla tiene que ir por SEARCH. activa no
+# cuenta como selectivo: casi todas lo están (ver pelicula_activas_titulo_idx).
+# La tabla FTS ("SCAN ... VIRTUAL TABLE") va por su MATCH.
+# --------
+SCAN_COMPLETO = re.compile(r"^SCAN (?!sqlite_)(\w+)(?: USING (?:COVERING )?INDEX (\w+))?$")
+FILTROS_NO_SELECTIVOS = {"activa", "ordering", "page", "paginacion", "expand", "fields"}
+
+FILTROS_PELICULA = [
+    {},
+    {"categoria": 1},
+    {"activa": "true"},
+    {"duracion_min": 90},
+    {"duracion_max": 120},
+    {"duracion_min": 90, "duracion_max": 120},
+    {"categoria": 1, "duracion_min": 90},
+    {"search": "pelicula"},
+]
+
+PAGINACIONES = [{}, {"page": 2}, {"paginacion": "cursor"}]
+
+
+def _ordenaciones(campos):
+    return [None] + [signo + campo for campo in campos for signo in ("", "-")]
+
+
+class PlanesDeConsultaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categorias = [Categoria.objects.create(nombre=f"Categoría {i}") for i in range(3)]
+        etiquetas = [Etiqueta.objects.create(nombre=f"Etiqueta {i}") for i in range(4)]
+        usuarios = [User.objects.create(username=f"usuario{i}") for i in range(4)]
+        for usuario in usuarios[:2]:
+            Perfil.objects.create(usuario=usuario)
+
+        for i in range(30):
+            pelicula = Pelicula.objects.create(
+                titulo=f"Película {i}",
+                descripcion="Descripción de prueba",
+                categoria=categorias[i % 3],
+                fecha_estreno=date(1990 + i, 1, 1),
+                duracion=80 + i * 5,
+            )
+            pelicula.etiquetas.set(etiquetas[: i % 4])
+            for usuario in usuarios[: i % 4]:
+                Resena.objects.create(pelicula=pelicula, usuario=usuario, puntuacion=i % 10)
+
+    def setUp(self):
+        # Sin caché de respuestas: queremos ver las consultas de verdad
+        cache.clear()
+
+    def _scans(self, url, params):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, params)
+        self.assertEqual(respuesta.status_code, 200, (url, params, respuesta.content))
+
+        filtrada = bool(set(params) - FILTROS_NO_SELECTIVOS) or re.search(r"/\d+/", url) is not None
+        scans = []
+        with connection.cursor() as cursor:
+            for consulta in consultas.captured_queries:
+                if not consulta["sql"].lstrip().startswith("SELECT"):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {consulta['sql']}")
+                for *_, detalle in cursor.fetchall():
+                    scan = SCAN_COMPLETO.match(detalle)
+                    if scan and (scan.group(2) is None or filtrada):
+                        scans.append((detalle, consulta["sql"]))
+        return scans
+
+    def _comprobar(self, url, combinaciones):
+        for params in combinaciones:
+            with self.subTest(url=url, params=params):
+                self.assertEqual(self._scans(url, params), [])
+
+    def _combinaciones(self, filtros, ordenaciones):
+        for filtro, orden, paginacion in itertools.product(filtros, ordenaciones, PAGINACIONES):
+            params = {**filtro, **paginacion}
+            if orden is not None:
+                params["ordering"] = orden
+            yield params
+
+    def test_patron(self):
+        for detalle, indice in (
+            ("SCAN streaming_pelicula", None),
+            ("SCAN streaming_pelicula USING INDEX pelicula_titulo_idx", "pelicula_titulo_idx"),
+            ("SCAN streaming_resena USING COVERING INDEX resena_fecha_idx", "resena_fecha_idx"),
+        ):
+            with self.subTest(detalle=detalle):
+                self.assertEqual(SCAN_COMPLETO.match(detalle).group(2), indice)
+        for detalle in (
+            "SEARCH streaming_pelicula USING INDEX pelicula_cat_estreno_idx (categoria_id=?)",
+            "SCAN streaming_pelicula_fts VIRTUAL TABLE INDEX 0:M2",
+            "SCAN sqlite_master",
+        ):
+            with self.subTest(detalle=detalle):
+                self.assertIsNone(SCAN_COMPLETO.match(detalle))
+
+    def test_listado_peliculas(self):
+        self._comprobar(
+            "/api/peliculas/",
+            self._combinaciones(FILTROS_PELICULA, _ordenaciones(PeliculaViewSet.cursor_ordering_fields[:3])),
+        )
+
+    def test_listado_peliculas_por_agregados(self):
+        # Ordenar por los agregados no admite cursor: solo paginación por número
+        for filtro, orden in itertools.product(
+            FILTROS_PELICULA, _ordenaciones(["puntuacion_media", "num_resenas"])[1:]
+        ):
+            for pagina in ({}, {"page": 2}):
+                with self.subTest(filtro=filtro, orden=orden, pagina=pagina):
+                    params = {**filtro, **pagina, "ordering": orden}
+                    self.assertEqual(self._scans("/api/peliculas/", params), [])
+
+    def test_detalle_pelicula(self):
+        pelicula = Pelicula.objects.first()
+        self._comprobar(f"/api/peliculas/{pelicula.pk}/", [{}])
+
+    def test_listado_resenas(self):
+        self._comprobar(
+            "/api/resenas/",
+            self._combinaciones([{}], _ordenaciones(ResenaViewSet.cursor_ordering_fields)),
+        )
+
+    def test_resenas_de_pelicula(self):
+        pelicula = Resena.objects.first().pelicula
+        self._comprobar(f"/api/peliculas/{pelicula.pk}/resenas/", [{}, {"expand": "usuario_detalle"}])
+
+
+# --------
+# BÚSQUEDA FTS5 (filters.py)
+# Sin acentos, por prefijo y por relevancia bm25 si no se pide ?ordering=.
+# --------
+class BusquedaFTSTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Drama")
+        for titulo, descripcion in [
+            ("Película de acción", "Explosiones"),
+            ("Canción triste", "Una historia de montañas y película muda"),
+            ("Dragones", "Dragones, dragones y más dragones"),
+            ("El dragón", "Una película larga sobre un reino lejano con castillos y caballeros"),
+            ("Documental", "Nada que ver"),
+        ]:
+            Pelicula.objects.create(
+                titulo=titulo, descripcion=descripcion, categoria=categoria,
+                fecha_estreno=date(2000, 1, 1), duracion=90,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def _titulos(self, **params):
+        respuesta = self.client.get("/api/peliculas/", params)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return [fila["titulo"] for fila in respuesta.json()["results"]]
+
+    def test_sin_acentos(self):
+        self.assertCountEqual(
+            self._titulos(search="pelicula"),
+            ["Película de acción", "Canción triste", "El dragón"],
+        )
+        self.assertEqual(self._titulos(search="CANCION"), ["Canción triste"])
+
+    def test_prefijo(self):
+        self.assertCountEqual(self._titulos(search="drag"), ["Dragones", "El dragón"])
+        self.assertEqual(self._titulos(search="dragon triste"), [])  # todos los términos
+        self.assertEqual(self._titulos(search="docu nada"), ["Documental"])
+
+    def test_orden_por_relevancia(self):
+        # Más apariciones del término en un texto más corto: antes
+        self.assertEqual(self._titulos(search="dragon"), ["Dragones", "El dragón"])
+        self.assertEqual(self._titulos(search="dragon", ordering="-titulo"), ["El dragón", "Dragones"])
+        cursor = self.client.get("/api/peliculas/", {"search": "dragon", "paginacion": "cursor"})
+        self.assertEqual([fila["titulo"] for fila in cursor.json()["results"]], ["Dragones", "El dragón"])
+
+    def test_un_solo_match(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self._titulos(search="pelicula")
+        busquedas = [c["sql"] for c in consultas.captured_queries if "MATCH" in c["sql"]]
+        self.assertTrue(busquedas)
+        for sql in busquedas:
+            self.assertEqual(sql.count("MATCH"), 1, sql)
+
+    def _usa_match(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertIn("Dragones", self._titulos(search="dragon"))
+        return any("MATCH" in c["sql"] for c in consultas.captured_queries)
+
+    def test_tabla_por_conexion(self):
+        self.addCleanup(vars(connection).pop, "fts_tablas", None)
+        self.assertTrue(self._usa_match())
+        self.assertIs(connection.fts_tablas[0], connection.connection)
+
+        # Lo guardado vale para esa conexión (sin FTS: LIKE de DRF)...
+        connection.fts_tablas = (connection.connection, {"streaming_pelicula_fts": False})
+        self.assertFalse(self._usa_match())
+
+        # ...y una conexión nueva vuelve a mirar si existe la tabla
+        connection.fts_tablas = (object(), {"streaming_pelicula_fts": False})
+        self.assertTrue(self._usa_match())
+
+
+# --------
+# CONSULTAS POR PETICIÓN
+# Con el planificador (planner.py) list / retrieve hacen las mismas
+# consultas con pocas películas, reseñas y etiquetas que con muchas.
+# --------
+class ConsultasConstantesTests(TestCase):
+
+    def _sembrar(self, peliculas, usuarios, etiquetas):
+        """Más películas, y todas (también las que ya había) con más reseñas y etiquetas."""
+        n = User.objects.count()
+        nuevos = [User.objects.create(username=f"usuario{n + i}") for i in range(usuarios)]
+        for usuario in nuevos:
+            Perfil.objects.create(usuario=usuario)
+        n = Etiqueta.objects.count()
+        nuevas = [Etiqueta.objects.create(nombre=f"etiqueta{n + i}") for i in range(etiquetas)]
+        categoria = Categoria.objects.create(nombre=f"Categoría {Categoria.objects.count()}")
+
+        n = Pelicula.objects.count()
+        for i in range(peliculas):
+            Pelicula.objects.create(
+                titulo=f"Película {n + i}", descripcion="desc", fecha_estreno=date(2000, 1, 1), duracion=90,
+                categoria=categoria,
+            )
+        for pelicula in Pelicula.objects.all():
+            pelicula.etiquetas.add(*nuevas)
+            for usuario in nuevos:
+                Resena.objects.create(pelicula=pelicula, usuario=usuario, puntuacion=7)
+
+    def _consultas(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(consultas)
+
+    def test_no_crecen_con_los_datos(self):
+        self._sembrar(peliculas=2, usuarios=1, etiquetas=1)
+        pelicula = Pelicula.objects.first()
+        urls = [
+            "/api/peliculas/",
+            "/api/peliculas/?paginacion=cursor",
+            "/api/peliculas/?expand=resenas.usuario_detalle.perfil,etiquetas_detalle",
+            f"/api/peliculas/{pelicula.pk}/",
+            "/api/resenas/",
+            f"/api/peliculas/{pelicula.pk}/resenas/",
+        ]
+        pocas = {url: self._consultas(url) for url in urls}
+
+        self._sembrar(peliculas=30, usuarios=8, etiquetas=5)
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(pocas[url]):
+                    self.client.get(url)
+
+    def _claves(self, respuesta):
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        datos = respuesta.json()
+        return set(datos["results"][0] if "results" in datos else datos)
+
+    def test_fields_y_expand_podan(self):
+        self._sembrar(peliculas=3, usuarios=2, etiquetas=2)
+        completa = self._consultas("/api/peliculas/")
+
+        # Sin etiquetas_detalle ni resenas no hay prefetch de ninguna de las dos
+        cache.clear()
+        with self.assertNumQueries(completa - 2):
+            respuesta = self.client.get("/api/peliculas/?fields=id,titulo")
+        self.assertEqual(self._claves(respuesta), {"id", "titulo"})
+
+        cache.clear()
+        with self.assertNumQueries(completa - 1):
+            respuesta = self.client.get("/api/peliculas/?expand=categoria_detalle")
+        claves = self._claves(respuesta)
+        self.assertIn("categoria_detalle", claves)
+        self.assertFalse(claves & {"resenas", "etiquetas_detalle"})
+
+        # Un campo que no existe se ignora
+        self.assertEqual(self._claves(self.client.get("/api/peliculas/?fields=id,no_existe")), {"id"})
+
+    def test_fields_no_afecta_a_escrituras(self):
+        self._sembrar(peliculas=1, usuarios=1, etiquetas=1)
+        pelicula = Pelicula.objects.first()
+        completa = self._claves(self.client.get(f"/api/peliculas/{pelicula.pk}/"))
+        respuesta = self.client.patch(
+            f"/api/peliculas/{pelicula.pk}/?fields=id&expand=categoria_detalle", {"duracion": 100},
+            content_type="application/json",
+        )
+        self.assertEqual(self._claves(respuesta), completa)
+        pelicula.refresh_from_db()
+        self.assertEqual(pelicula.duracion, 100)
+
+
+# --------
+# AGREGADOS DE RESEÑAS (valoraciones.py)
+# num_resenas / suma_puntuaciones / puntuacion_media / ultima_resena
+# tienen que coincidir con las reseñas tras cada escritura de la API, y
+# recalcular_valoraciones repara los que se hayan desviado.
+# --------
+class AgregadosResenasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.peliculas = [
+            Pelicula.objects.create(titulo=f"Película {i}", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=90)
+            for i in range(2)
+        ]
+        cls.usuarios = [User.objects.create(username=f"usuario{i}") for i in range(3)]
+
+    def _comprobar(self):
+        for pelicula in Pelicula.objects.all():
+            resenas = Resena.objects.filter(pelicula=pelicula).order_by("-fecha_resena")
+            puntuaciones = [r.puntuacion for r in resenas]
+            with self.subTest(pelicula=pelicula.pk):
+                self.assertEqual(pelicula.num_resenas, len(puntuaciones))
+                self.assertEqual(pelicula.suma_puntuaciones, sum(puntuaciones))
+                if puntuaciones:
+                    self.assertAlmostEqual(pelicula.puntuacion_media, sum(puntuaciones) / len(puntuaciones))
+                else:
+                    self.assertIsNone(pelicula.puntuacion_media)
+                self.assertEqual(pelicula.ultima_resena, resenas[0].fecha_resena if puntuaciones else None)
+
+    def test_escrituras_de_la_api(self):
+        a, b = self.peliculas
+        respuesta = self.client.post(
+            "/api/resenas/", {"pelicula": a.pk, "usuario": self.usuarios[0].pk, "puntuacion": 8}, content_type="application/json"
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        resena = respuesta.json()["id"]
+        for usuario, puntuacion in ((self.usuarios[1], 4), (self.usuarios[2], 10)):
+            respuesta = self.client.post(
+                f"/api/peliculas/{a.pk}/valorar/", {"usuario_id": usuario.pk, "puntuacion": puntuacion},
+                content_type="application/json",
+            )
+            self.assertEqual(respuesta.status_code, 201)
+        self._comprobar()
+
+        # Cambio de puntuación y traslado a otra película
+        for cambio in ({"puntuacion": 2}, {"pelicula": b.pk}, {"pelicula": b.pk, "puntuacion": 9}):
+            with self.subTest(cambio=cambio):
+                respuesta = self.client.patch(f"/api/resenas/{resena}/", cambio, content_type="application/json")
+                self.assertEqual(respuesta.status_code, 200)
+                self._comprobar()
+
+        self.assertEqual(self.client.delete(f"/api/resenas/{resena}/").status_code, 204)
+        self._comprobar()
+        otra = Resena.objects.filter(pelicula=a).first()
+        self.assertEqual(self.client.delete(f"/api/resenas/{otra.pk}/").status_code, 204)
+        self._comprobar()
+
+    def test_borrado_doble(self):
+        # Dos DELETE de la misma reseña que cargan la instancia antes de que
+        # el escritor ejecute ninguno: el segundo es un 404 y se resta una vez
+        a = self.peliculas[0]
+        for usuario in self.usuarios[:2]:
+            self.client.post(
+                f"/api/peliculas/{a.pk}/valorar/", {"usuario_id": usuario.pk, "puntuacion": 5},
+                content_type="application/json",
+            )
+        resena = Resena.objects.filter(pelicula=a).first()
+        vieja = Resena.objects.get(pk=resena.pk)
+        self.assertEqual(self.client.delete(f"/api/resenas/{resena.pk}/").status_code, 204)
+        with self.assertRaises(NotFound):
+            ResenaViewSet._borrar(vieja)
+        self.assertEqual(self.client.delete(f"/api/resenas/{resena.pk}/").status_code, 404)
+        self.assertEqual(Pelicula.objects.get(pk=a.pk).num_resenas, 1)
+        self._comprobar()
+
+    def test_actualizacion_con_instancia_vieja(self):
+        # Dos PATCH que parten de la misma instancia: el segundo resta lo
+        # que dejó el primero, no lo que había al cargarla
+        a = self.peliculas[0]
+        resena = Resena.objects.create(pelicula=a, usuario=self.usuarios[0], puntuacion=5)
+        recalcular_agregados()
+        viejas = [Resena.objects.get(pk=resena.pk) for _ in range(2)]
+        for vieja, puntuacion in zip(viejas, (8, 3)):
+            serializer = ResenaSerializer(vieja, data={"puntuacion": puntuacion}, partial=True)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            ResenaViewSet._actualizar(serializer)
+        self.assertEqual(Pelicula.objects.get(pk=a.pk).suma_puntuaciones, 3)
+        self._comprobar()
+
+        Resena.objects.filter(pk=resena.pk).delete()
+        serializer = ResenaSerializer(viejas[0], data={"puntuacion": 1}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(NotFound):
+            ResenaViewSet._actualizar(serializer)
+
+    def test_recalcular_valoraciones(self):
+        a, b = self.peliculas
+        for usuario in self.usuarios:
+            Resena.objects.create(pelicula=a, usuario=usuario, puntuacion=6)
+        Pelicula.objects.update(num_resenas=99, suma_puntuaciones=5, puntuacion_media=1.0, ultima_resena=timezone.now())
+
+        call_command("recalcular_valoraciones", pelicula=[a.pk], stdout=io.StringIO())
+        self.assertEqual(Pelicula.objects.get(pk=b.pk).num_resenas, 99)  # solo la pedida
+        call_command("recalcular_valoraciones", stdout=io.StringIO())
+        self._comprobar()
+
+
+# --------
+# SERIALIZER COMPILADO
+# La lectura compilada de PeliculaSerializer tiene que dar exactamente
+# los mismos bytes que el camino normal de DRF.
+# --------
+class SerializadorCompiladoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Drama")
+        etiqueta = Etiqueta.objects.create(nombre="Clásico")
+        usuarios = [User.objects.create(username=f"usuario{i}") for i in range(2)]
+        Perfil.objects.create(usuario=usuarios[0], fecha_nacimiento=date(1990, 5, 1))
+
+        for i in range(3):
+            pelicula = Pelicula.objects.create(
+                titulo=f"Película {i}",
+                descripcion="Descripción",
+                categoria=categoria if i else None,  # una sin categoría
+                precio="9.90",
+                fecha_estreno=date(2000 + i, 1, 1),
+                duracion=100,
+            )
+            pelicula.etiquetas.set([etiqueta] if i else [])
+            for usuario in usuarios[:i]:
+                Resena.objects.create(pelicula=pelicula, usuario=usuario, puntuacion=7, comentario="Bien")
+
+    def setUp(self):
+        cache.clear()
+
+    def _sin_compilar(self, url, params):
+        PeliculaSerializer.compiled_read = False
+        try:
+            cache.clear()
+            return self.client.get(url, params).content
+        finally:
+            PeliculaSerializer.compiled_read = True
+
+    def test_misma_salida(self):
+        pelicula = Pelicula.objects.first()
+        casos = [
+            ("/api/peliculas/", {}),
+            ("/api/peliculas/", {"fields": "id,titulo,precio,created_at"}),
+            ("/api/peliculas/", {"expand": "resenas.usuario_detalle"}),
+            ("/api/peliculas/", {"paginacion": "cursor", "ordering": "-titulo"}),
+            (f"/api/peliculas/{pelicula.pk}/", {}),
+        ]
+        for url, params in casos:
+            with self.subTest(url=url, params=params):
+                compilada = self.client.get(url, params).content
+                self.assertEqual(compilada, self._sin_compilar(url, params))
+
+    def test_se_compila(self):
+        serializer = PeliculaSerializer()
+        self.assertIsNotNone(serializer._fila_compilada())
+
+    def test_no_retiene_el_serializador(self):
+        # La función compilada vive en la clase: no puede quedarse con el
+        # primer serializador, su contexto ni su petición
+        pelicula = Pelicula.objects.get(titulo="Película 2")
+        with mock.patch.object(PeliculaSerializer, "_compiladas", OrderedDict(), create=True):
+            peticion = Request(RequestFactory().get("/api/peliculas/", {"expand": "resenas.usuario_detalle.perfil"}))
+            serializer = PeliculaSerializer(pelicula, context={"request": peticion})
+            self.assertIsNotNone(serializer._fila_compilada())
+            datos = serializer.data
+            self.assertIn("perfil", datos["resenas"][0]["usuario_detalle"])
+
+            referencias = [weakref.ref(peticion), weakref.ref(serializer)]
+            del peticion, serializer, datos  # ReturnDict también apunta al serializador
+            gc.collect()
+            self.assertEqual([ref() for ref in referencias], [None, None])
+            self.assertEqual(len(PeliculaSerializer._compiladas), 1)
+
+    def test_formas_acotadas(self):
+        # Cada combinación de ?fields= es una forma; solo quedan las últimas
+        combinaciones = ["id", "id,titulo", "id,duracion", "titulo,id", "id,titulo,duracion"]
+        with mock.patch.object(PeliculaSerializer, "_compiladas", OrderedDict(), create=True), \
+                mock.patch.object(PeliculaSerializer, "compiled_cache_size", 2):
+            for campos in combinaciones:
+                peticion = Request(RequestFactory().get("/api/peliculas/", {"fields": campos}))
+                PeliculaSerializer(context={"request": peticion})._fila_compilada()
+            formas = [tuple(nombre for nombre, _, _ in forma) for forma in PeliculaSerializer._compiladas]
+        # "titulo,id" es la misma forma que "id,titulo"
+        self.assertEqual(formas, [("id", "titulo"), ("duracion", "id", "titulo")])
+
+
+# --------
+# RENDERER / PARSER JSON RÁPIDOS
+# Misma salida que los de DRF (con y sin orjson instalado).
+# --------
+class JSONRapidoTests(SimpleTestCase):
+
+    def test_render_igual_que_drf(self):
+        datos = ReturnDict({
+            "precio": Decimal("9.90"),
+            "fecha": date(2024, 2, 29),
+            "creada": datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            "hora": time(8, 15),
+            "duracion": timedelta(minutes=90),
+            "texto": "Película ñ     \"comillas\"",
+            "anidado": [{"id": 1, "media": 6.666666666666667}, {"id": 2, "media": None}],
+            "enorme": 2 ** 70,
+            1: "clave entera",
+        }, serializer=None)
+        self.assertEqual(FastJSONRenderer().render(datos), JSONRenderer().render(datos))
+        self.assertEqual(
+            FastJSONRenderer().render(datos, "application/json; indent=2"),
+            JSONRenderer().render(datos, "application/json; indent=2"),
+        )
+
+    def test_parse_igual_que_drf(self):
+        for contenido in (b'{"a": [1, 2.5, "\xc3\xb1"], "b": null}', b"123456789012345678901234567890"):
+            with self.subTest(contenido=contenido):
+                self.assertEqual(
+                    FastJSONParser().parse(io.BytesIO(contenido)),
+                    JSONParser().parse(io.BytesIO(contenido)),
+                )
+
+    def test_parse_error(self):
+        for contenido in (b'{"a": ', b"[NaN]"):
+            with self.subTest(contenido=contenido):
+                with self.assertRaises(ParseError) as rapido:
+                    FastJSONParser().parse(io.BytesIO(contenido))
+                with self.assertRaises(ParseError) as drf:
+                    JSONParser().parse(io.BytesIO(contenido))
+                self.assertEqual(str(rapido.exception), str(drf.exception))
+
+
+# --------
+# CACHÉ DE RESPUESTAS
+# MISS -> HIT; una escritura invalida al confirmarse (no antes); mientras
+# otra petición regenera una entrada vieja se sirve la anterior (STALE).
+# --------
+class CacheRespuestasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username="usuario")
+        cls.perfil = Perfil.objects.create(usuario=cls.usuario, avatar="a.png")
+        cls.pelicula = Pelicula.objects.create(
+            titulo="Película", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=90
+        )
+        Resena.objects.create(pelicula=cls.pelicula, usuario=cls.usuario, puntuacion=7)
+        cls.url = f"/api/peliculas/{cls.pelicula.pk}/?expand=resenas.usuario_detalle.perfil"
+
+    def setUp(self):
+        cache.clear()
+
+    def _avatar(self, respuesta):
+        return respuesta.json()["resenas"][0]["usuario_detalle"]["perfil"]["avatar"]
+
+    def test_miss_hit_e_invalidacion(self):
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Perfil.objects.filter(pk=self.perfil.pk).first().save()
+            # Sin confirmar: la generación aún no ha cambiado
+            self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+
+        # El login solo guarda last_login: no invalida nada
+        self.usuario.last_login = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.save(update_fields=["last_login"])
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.save()
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+
+    def test_resenas(self):
+        resena = Resena.objects.get()
+        for url in ("/api/resenas/", f"/api/resenas/{resena.pk}/"):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+                self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/resenas/{resena.pk}/", {"puntuacion": 9}, content_type="application/json")
+        respuesta = self.client.get("/api/resenas/")
+        self.assertEqual((respuesta["X-Cache"], respuesta.json()["results"][0]["puntuacion"]), ("MISS", 9))
+
+        # pelicula_titulo sale de Pelicula
+        with self.captureOnCommitCallbacks(execute=True):
+            Pelicula.objects.get(pk=self.pelicula.pk).save()
+        self.assertEqual(self.client.get(f"/api/resenas/{resena.pk}/")["X-Cache"], "MISS")
+
+    def test_stale_mientras_se_regenera(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.perfil.avatar = "b.png"
+            self.perfil.save()
+
+        # Otra petición tiene el candado de regeneración: se sirve la anterior
+        clave = response_key(Request(RequestFactory().get(self.url)))
+        cache.add(f"{clave}:lock", 1)
+        respuesta = self.client.get(self.url)
+        self.assertEqual((respuesta["X-Cache"], self._avatar(respuesta)), ("STALE", "a.png"))
+
+        cache.delete(f"{clave}:lock")
+        respuesta = self.client.get(self.url)
+        self.assertEqual((respuesta["X-Cache"], self._avatar(respuesta)), ("MISS", "b.png"))
+
+
+# --------
+# GET CONDICIONAL
+# 304 con If-None-Match / If-Modified-Since mientras nada cambie; un
+# borrado o una categoría renombrada (que no mueven updated_at) también
+# cambian el ETag y el Last-Modified.
+# --------
+class GetCondicionalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Drama")
+        cls.peliculas = [
+            Pelicula.objects.create(
+                titulo=f"Película {i}", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=90,
+                categoria=cls.categoria,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _envejecer(self):
+        # Todo escrito hace un día: lo que se escriba después cae en otro segundo
+        hace_un_dia = timezone.now() - timedelta(days=1)
+        Pelicula.objects.update(updated_at=hace_un_dia)
+        with mock.patch("streaming.cache.time.time_ns", return_value=int(hace_un_dia.timestamp() * 1e9)):
+            bump(*PeliculaViewSet.cache_models)
+
+    def _condicional(self, url, respuesta):
+        """(estado con If-None-Match, estado con If-Modified-Since)"""
+        return (
+            self.client.get(url, HTTP_IF_NONE_MATCH=respuesta["ETag"]).status_code,
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=respuesta["Last-Modified"]).status_code,
+        )
+
+    def test_listado(self):
+        url = f"/api/peliculas/?categoria={self.categoria.pk}"
+        for escritura in (
+            lambda: self.peliculas[0].delete(),
+            lambda: Categoria.objects.get(pk=self.categoria.pk).save(),
+        ):
+            self._envejecer()
+            respuesta = self.client.get(url)
+            self.assertEqual(self._condicional(url, respuesta), (304, 304))
+            with self.captureOnCommitCallbacks(execute=True):
+                escritura()
+            self.assertEqual(self._condicional(url, respuesta), (200, 200))
+
+    def test_detalle(self):
+        self._envejecer()
+        for url in (f"/api/peliculas/{self.peliculas[1].pk}/", f"/api/categorias/{self.categoria.pk}/"):
+            with self.subTest(url=url):
+                respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(self._condicional(url, respuesta), (304, 304))
+
+        url = f"/api/peliculas/{self.peliculas[1].pk}/"
+        respuesta = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.peliculas[1].etiquetas.add(Etiqueta.objects.create(nombre="nueva"))
+        self.assertEqual(self._condicional(url, respuesta), (200, 200))
+
+    def test_no_encontrada(self):
+        for url in ("/api/peliculas/9999/", "/api/peliculas/abc/", "/api/categorias/9999/", "/api/categorias/abc/"):
+            with self.subTest(url=url):
+                respuesta = self.client.get(url, HTTP_IF_NONE_MATCH='"x"')
+                self.assertEqual(respuesta.status_code, 404)
+                self.assertFalse(respuesta.has_header("ETag"))
+
+
+# --------
+# CARGA MASIVA (/api/peliculas/lote/)
+# --------
+class LotePeliculasTests(TestCase):
+    url = "/api/peliculas/lote/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Drama")
+        cls.etiquetas = [Etiqueta.objects.create(nombre=f"etiqueta{i}") for i in range(2)]
+        cls.existente = Pelicula.objects.create(
+            titulo="Existente", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=90
+        )
+
+    def _pelicula(self, **campos):
+        return {"titulo": "Nueva", "descripcion": "desc", "fecha_estreno": "2021-05-01", "duracion": 100, **campos}
+
+    def _enviar(self, items, ndjson=False):
+        if ndjson:
+            cuerpo = "\n".join(json.dumps(item) for item in items)
+            return self.client.post(self.url, cuerpo, content_type="application/x-ndjson")
+        return self.client.post(self.url, items, content_type="application/json")
+
+    def test_altas_y_actualizaciones(self):
+        etiquetas = [e.pk for e in self.etiquetas]
+        for ndjson in (False, True):
+            with self.subTest(ndjson=ndjson):
+                respuesta = self._enviar([
+                    self._pelicula(categoria=self.categoria.pk, etiquetas=etiquetas),
+                    {"id": self.existente.pk, "duracion": 120, "etiquetas": etiquetas[:1]},
+                ], ndjson)
+                self.assertEqual(respuesta.status_code, 201)
+                datos = respuesta.json()
+                self.assertEqual((datos["creadas"], datos["actualizadas"], datos["errores"]), (1, 1, 0))
+
+                nueva = Pelicula.objects.get(pk=datos["resultados"][0]["id"])
+                self.assertEqual(nueva.categoria, self.categoria)
+                self.assertEqual(sorted(nueva.etiquetas.values_list("pk", flat=True)), etiquetas)
+                self.existente.refresh_from_db()
+                self.assertEqual(self.existente.duracion, 120)
+                self.assertEqual(list(self.existente.etiquetas.values_list("pk", flat=True)), etiquetas[:1])
+
+    def test_errores_por_elemento(self):
+        respuesta = self._enviar([
+            self._pelicula(),
+            self._pelicula(categoria=9999),
+            self._pelicula(etiquetas=[9999]),
+            self._pelicula(duracion=-1),
+            {"id": 9999, "duracion": 100},
+            "no es un objeto",
+            {"id": self.existente.pk, "etiquetas": [self.etiquetas[0].pk]},
+            {"id": self.existente.pk, "etiquetas": [e.pk for e in self.etiquetas]},  # repetida
+        ])
+        self.assertEqual(respuesta.status_code, 207)
+        resultados = respuesta.json()["resultados"]
+        self.assertEqual(
+            [r["estado"] for r in resultados],
+            ["creada", "error", "error", "error", "error", "error", "actualizada", "error"],
+        )
+        self.assertEqual(list(resultados[1]["errores"]), ["categoria"])
+        self.assertEqual(list(resultados[2]["errores"]), ["etiquetas"])
+        self.assertEqual(list(resultados[3]["errores"]), ["duracion"])
+        self.assertEqual(list(resultados[7]["errores"]), ["id"])
+        self.assertEqual(list(self.existente.etiquetas.all()), self.etiquetas[:1])
+        self.assertEqual(Pelicula.objects.count(), 2)
+
+    def test_todo_errores(self):
+        self.assertEqual(self._enviar([self._pelicula(titulo="")]).status_code, 400)
+        self.assertEqual(self._enviar({"titulo": "no es una lista"}).status_code, 400)
+        self.assertEqual(
+            self.client.post(self.url, "{malo}\n", content_type="application/x-ndjson").status_code, 400
+        )
+        self.assertEqual(Pelicula.objects.count(), 1)
+
+
+# --------
+# VALORACIONES EN LOTE (/peliculas/valorar-lote/)
+# Un estado por elemento (creada / conflicto / error), un par repetido en
+# el lote solo se crea una vez y los agregados suman solo las creadas.
+# --------
+class ValorarLoteTests(TestCase):
+    url = "/api/peliculas/valorar-lote/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.peliculas = [
+            Pelicula.objects.create(titulo=f"Película {i}", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=90)
+            for i in range(2)
+        ]
+        cls.usuarios = [User.objects.create(username=f"usuario{i}") for i in range(2)]
+        Resena.objects.create(pelicula=cls.peliculas[1], usuario=cls.usuarios[1], puntuacion=2)
+        recalcular_agregados()
+
+    def _valoracion(self, pelicula, usuario, puntuacion=8):
+        return {"pelicula": pelicula.pk, "usuario_id": usuario.pk, "puntuacion": puntuacion}
+
+    def _enviar(self, items):
+        return self.client.post(self.url, items, content_type="application/json")
+
+    def test_estados_por_elemento(self):
+        p0, p1 = self.peliculas
+        u0, u1 = self.usuarios
+        respuesta = self._enviar([
+            self._valoracion(p0, u0, 8),
+            self._valoracion(p0, u1, 6),
+            self._valoracion(p1, u1),  # ya la había valorado
+            self._valoracion(p0, u0, 1),  # repetida en el lote
+            {"pelicula": 9999, "usuario_id": u0.pk, "puntuacion": 5},
+            {"pelicula": p1.pk, "usuario_id": 9999, "puntuacion": 5},
+            self._valoracion(p1, u0, 11),
+        ])
+        self.assertEqual(respuesta.status_code, 207)
+        datos = respuesta.json()
+        self.assertEqual((datos["creadas"], datos["conflictos"], datos["errores"]), (2, 2, 3))
+        resultados = datos["resultados"]
+        self.assertEqual([r["indice"] for r in resultados], list(range(7)))
+        self.assertEqual(
+            [r["estado"] for r in resultados],
+            ["creada", "creada", "conflicto", "conflicto", "error", "error", "error"],
+        )
+        self.assertEqual(list(resultados[4]["errores"]), ["pelicula"])
+        self.assertEqual(list(resultados[5]["errores"]), ["usuario_id"])
+        self.assertEqual(list(resultados[6]["errores"]), ["puntuacion"])
+        self.assertEqual(Resena.objects.get(pk=resultados[0]["resena_id"]).puntuacion, 8)
+
+        # Solo las creadas cuentan: la repetida (1) no entra en la media
+        p0.refresh_from_db()
+        p1.refresh_from_db()
+        self.assertEqual((p0.num_resenas, p0.suma_puntuaciones, p0.puntuacion_media), (2, 14, 7))
+        self.assertEqual((p1.num_resenas, p1.suma_puntuaciones), (1, 2))
+        self.assertIsNotNone(p0.ultima_resena)
+
+    def test_todas_creadas_o_todas_error(self):
+        respuesta = self._enviar([self._valoracion(self.peliculas[0], u) for u in self.usuarios])
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()["creadas"], 2)
+
+        respuesta = self._enviar([{"pelicula": 9999, "usuario_id": 9999, "puntuacion": 5}, {}])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self._enviar({"pelicula": 1}).status_code, 400)
+        self.assertEqual(Resena.objects.count(), 3)
+
+
+# --------
+# EXPORTACIÓN (NDJSON / CSV)
+# Los mismos filtros que el listado; con ASGI el cuerpo es un iterador
+# async (por bloques) con las mismas líneas.
+# --------
+class ExportarTests(TestCase):
+    url = "/api/peliculas/exportar/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drama = Categoria.objects.create(nombre="Drama")
+        for i in range(7):
+            Pelicula.objects.create(
+                titulo=f"Película {i}", descripcion="desc", fecha_estreno=date(2000 + i, 1, 1),
+                duracion=90 + i, categoria=cls.drama if i % 2 else None,
+            )
+
+    def _lineas(self, respuesta):
+        self.assertFalse(respuesta.is_async)
+        return b"".join(respuesta.streaming_content).decode().splitlines()
+
+    def test_ndjson(self):
+        respuesta = self.client.get(self.url, {"categoria": self.drama.pk, "fields": "id,titulo", "ordering": "titulo"})
+        self.assertEqual(respuesta["Content-Type"], "application/x-ndjson")
+        filas = [json.loads(linea) for linea in self._lineas(respuesta)]
+        esperadas = Pelicula.objects.filter(categoria=self.drama).order_by("titulo").values("id", "titulo")
+        self.assertEqual(filas, list(esperadas))
+
+    def test_csv(self):
+        respuesta = self.client.get(self.url, {"formato": "csv", "duracion_min": 94, "fields": "id,duracion"})
+        self.assertEqual(respuesta["Content-Type"], "text/csv")
+        filas = list(csv.reader(self._lineas(respuesta)))
+        self.assertEqual(filas[0], ["id", "duracion"])
+        self.assertEqual(sorted(int(fila[1]) for fila in filas[1:]), [94, 95, 96])
+        self.assertEqual(self.client.get(self.url, {"formato": "xml"}).status_code, 400)
+
+    async def test_asgi_por_bloques(self):
+        with mock.patch.object(PeliculaViewSet, "export_chunk_size", 3):
+            respuesta = await self.async_client.get(self.url, {"ordering": "titulo"})
+            self.assertTrue(respuesta.is_async)
+            bloques = [bloque async for bloque in respuesta.streaming_content]
+        sincrona = await sync_to_async(self.client.get)(self.url, {"ordering": "titulo"})
+        self.assertEqual(len(bloques), 3)  # 7 líneas de 3 en 3
+        self.assertEqual(b"".join(bloques), b"".join(await sync_to_async(list)(sincrona.streaming_content)))
+
+
+# --------
+# IMPORTACIÓN (importar_catalogo)
+# --------
+class ImportarCatalogoTests(TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+        self.checkpoint = os.path.join(self.carpeta, "checkpoint.json")
+        Categoria.objects.create(nombre="Drama")
+
+    def _fichero(self, nombre, filas):
+        ruta = os.path.join(self.carpeta, nombre)
+        with open(ruta, "w", encoding="utf-8", newline="") as fichero:
+            writer = csv.DictWriter(fichero, fieldnames=list(filas[0]))
+            writer.writeheader()
+            writer.writerows(filas)
+        return ruta
+
+    def _importar(self, **opciones):
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command("importar_catalogo", batch_size=2, checkpoint=self.checkpoint, stdout=salida, stderr=errores, **opciones)
+        return salida.getvalue(), errores.getvalue()
+
+    def _pelicula(self, titulo, **campos):
+        return {"titulo": titulo, "descripcion": "desc", "fecha_estreno": "2020-01-01", "duracion": "90",
+                "categoria": "Drama", **campos}
+
+    def test_filas_rechazadas(self):
+        ruta = self._fichero("peliculas.csv", [
+            self._pelicula("Buena"),
+            self._pelicula("Sin duración", duracion=""),
+            self._pelicula("Duración mala", duracion="noventa"),
+            self._pelicula("Categoría desconocida", categoria="Western"),
+            self._pelicula("Otra buena", fecha_estreno="2021-02-03"),
+        ])
+        salida, errores = self._importar(peliculas=ruta)
+        self.assertIn("5 filas leídas, 2 insertadas, 3 con errores", salida)
+        for fila in (2, 3, 4):
+            self.assertIn(f"peliculas fila {fila}:", errores)
+        self.assertEqual(sorted(Pelicula.objects.values_list("titulo", flat=True)), ["Buena", "Otra buena"])
+
+    def test_reanudar_sin_duplicar(self):
+        ruta = self._fichero("peliculas.csv", [self._pelicula(f"Película {i}") for i in range(5)])
+
+        # Corte justo después del commit del segundo bloque, antes de su punto de control
+        original = importar_catalogo.Command._guardar_checkpoint
+        llamadas = []
+
+        def guardar_y_cortar(comando):
+            llamadas.append(1)
+            if len(llamadas) == 2:
+                raise RuntimeError("corte")
+            original(comando)
+
+        with mock.patch.object(importar_catalogo.Command, "_guardar_checkpoint", guardar_y_cortar), \
+                self.assertRaises(RuntimeError):
+            self._importar(peliculas=ruta)
+        self.assertEqual(Pelicula.objects.count(), 4)
+
+        salida, _ = self._importar(peliculas=ruta)
+        self.assertIn("3 filas leídas (reanudado tras 2), 1 insertadas", salida)
+        self.assertEqual(
+            sorted(Pelicula.objects.values_list("titulo", flat=True)), [f"Película {i}" for i in range(5)]
+        )
+
+        # Ya terminado: relanzar no lee ni inserta nada
+        self.assertIn("0 filas leídas (reanudado tras 5), 0 insertadas", self._importar(peliculas=ruta)[0])
+
+    def test_fecha_de_las_resenas(self):
+        Pelicula.objects.create(titulo="Vieja", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=90)
+        for nombre in ("ana", "luis", "eva", "pepe"):
+            User.objects.create(username=nombre)
+        ruta = self._fichero("resenas.csv", [
+            {"pelicula": "Vieja", "usuario": "ana", "puntuacion": "8", "fecha_resena": "2021-03-04T10:00:00+00:00"},
+            {"pelicula": "Vieja", "usuario": "luis", "puntuacion": "6", "fecha_resena": "2022-05-06 12:30"},
+            {"pelicula": "Vieja", "usuario": "eva", "puntuacion": "7", "fecha_resena": ""},
+            {"pelicula": "Vieja", "usuario": "pepe", "puntuacion": "7", "fecha_resena": "ayer"},
+        ])
+        antes = timezone.now()
+        salida, errores = self._importar(resenas=ruta)
+        self.assertIn("3 insertadas, 1 con errores", salida)
+        self.assertIn("resenas fila 4:", errores)
+
+        fechas = dict(Resena.objects.values_list("usuario__username", "fecha_resena"))
+        self.assertEqual(fechas["ana"], datetime(2021, 3, 4, 10, tzinfo=dt_timezone.utc))
+        # Sin zona: la del proyecto
+        self.assertEqual(fechas["luis"], timezone.make_aware(datetime(2022, 5, 6, 12, 30)))
+        self.assertGreaterEqual(fechas["eva"], antes)  # sin fecha: la de la importación
+        self.assertEqual(Pelicula.objects.get(titulo="Vieja").ultima_resena, fechas["eva"])
+
+
+# --------
+# LECTURAS ASYNC (ASGI)
+# Con las vistas async (asincrono.py) list / retrieve responden lo
+# mismo que las síncronas, incluidos 404, 400 y el 304 condicional.
+# --------
+@override_settings(ROOT_URLCONF=urlconf_async())
+class LecturasAsyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Drama")
+        usuario = User.objects.create(username="usuario")
+        for i in range(12):
+            pelicula = Pelicula.objects.create(
+                titulo=f"Película {i}",
+                descripcion="Descripción",
+                categoria=categoria,
+                precio="9.90",
+                fecha_estreno=date(2000 + i, 1, 1),
+                duracion=90 + i,
+            )
+            Resena.objects.create(pelicula=pelicula, usuario=usuario, puntuacion=i % 11)
+        cls.pelicula = pelicula
+
+    async def test_misma_respuesta(self):
+        urls = [
+            "/api/peliculas/",
+            "/api/peliculas/?page=2",
+            "/api/peliculas/?page=99",
+            "/api/peliculas/?categoria=999",
+            "/api/peliculas/?paginacion=cursor&ordering=-titulo",
+            f"/api/peliculas/{self.pelicula.pk}/",
+            "/api/peliculas/9999/",
+            "/api/peliculas/abc/",
+            f"/api/categorias/{self.pelicula.categoria_id}/",
+            "/api/resenas/",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                asincrona = await self.async_client.get(url)
+                with override_settings(ROOT_URLCONF="Semana2.urls"):
+                    sincrona = await sync_to_async(self.client.get)(url)
+                self.assertEqual(asincrona.status_code, sincrona.status_code)
+                self.assertEqual(asincrona.content, sincrona.content)
+                self.assertEqual(asincrona.get("ETag"), sincrona.get("ETag"))
+
+    async def test_no_modificado(self):
+        url = "/api/peliculas/"
+        respuesta = await self.async_client.get(url)
+        respuesta = await self.async_client.get(url, headers={"If-None-Match": respuesta["ETag"]})
+        self.assertEqual(respuesta.status_code, 304)
+
+
+# --------
+# MÉTRICAS (/api/metrics)
+# --------
+class MetricasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Drama")
+
+    def setUp(self):
+        cache.clear()
+        registro.reiniciar()
+
+    def test_cuenta_peticiones_y_consultas(self):
+        self.client.get("/api/categorias/")
+        self.client.get(f"/api/categorias/{self.categoria.pk}/")
+        self.client.get("/api/categorias/9999/")
+
+        respuesta = self.client.get("/api/metrics")
+        self.assertEqual(respuesta["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        texto = respuesta.content.decode()
+        self.assertIn('streaming_http_requests_total{route="categoria-list",method="GET",status="200"} 1', texto)
+        self.assertIn('streaming_http_requests_total{route="categoria-detail",method="GET",status="404"} 1', texto)
+        self.assertIn(
+            'streaming_http_request_duration_seconds_count{route="categoria-detail",method="GET"} 2', texto
+        )
+
+        totales = registro.totales()
+        self.assertGreater(totales[("categoria-list", "GET")].consultas, 0)
+        self.assertEqual(totales[("categoria-list", "GET")].bytes, len(self.client.get("/api/categorias/").content))
+
+    def test_hilos_terminados(self):
+        # Un hilo por petición: al terminar, sus series pasan al total y no se acumulan
+        # (puede terminar también algún hilo de otra prueba: como mucho los de antes)
+        gc.collect()
+        antes = registro.hilos()
+
+        def medir():
+            registro.serie("categoria-list", "GET").estados[200] = 1
+
+        for _ in range(20):
+            hilo = threading.Thread(target=medir)
+            hilo.start()
+            hilo.join()
+        gc.collect()
+        self.assertLessEqual(registro.hilos(), antes)
+        self.assertEqual(registro.totales()[("categoria-list", "GET")].estados[200], 20)
+
+    def test_acceso(self):
+        self.assertEqual(self.client.post("/api/metrics").status_code, 405)
+        with override_settings(STREAMING_METRICAS={"IPS_PERMITIDAS": ["10.0.0.1"]}):
+            self.assertEqual(self.client.get("/api/metrics").status_code, 403)
+            self.assertEqual(self.client.get("/api/metrics", REMOTE_ADDR="10.0.0.1").status_code, 200)
+            self.client.force_login(User.objects.create(username="admin", is_staff=True))
+            self.assertEqual(self.client.get("/api/metrics").status_code, 200)
+
+
+# --------
+# ESCRITOR ÚNICO DE RESEÑAS
+# TransactionTestCase: con TestCase todo va dentro de una transacción y
+# el escritor escribiría en el propio hilo.
+# --------
+class EscritorResenasTests(TransactionTestCase):
+
+    def setUp(self):
+        self.pelicula = Pelicula.objects.create(
+            titulo="Película", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=100, precio=1
+        )
+        self.usuarios = [User.objects.create(username=f"u{i}") for i in range(4)]
+        self.escritor = EscritorResenas(activo=True, cola=100, lote=50, espera_cola=1, timeout=10)
+
+    def test_altas_concurrentes(self):
+        # Cada usuario valora dos veces a la vez: una creada y un conflicto
+        resultados = []
+
+        def valorar(usuario):
+            resultados.append(self.escritor.valorar(self.pelicula.pk, usuario.pk, 7))
+            connection.close()
+
+        hilos = [threading.Thread(target=valorar, args=(u,)) for u in self.usuarios * 2]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        estados = sorted(r["estado"] for r in resultados)
+        self.assertEqual(estados, ["conflicto"] * 4 + ["creada"] * 4)
+        self.pelicula.refresh_from_db()
+        self.assertEqual(self.pelicula.num_resenas, 4)
+        self.assertEqual(self.pelicula.suma_puntuaciones, 28)
+
+    def test_errores(self):
+        resultado = self.escritor.valorar(self.pelicula.pk + 1, 9999, 7)
+        self.assertEqual(resultado["estado"], "error")
+        self.assertEqual(set(resultado["errores"]), {"pelicula", "usuario_id"})
+        self.assertFalse(Resena.objects.exists())
+
+
+# --------
+# GENERADOR DE DATOS (generar_datos)
+# Con la misma semilla sobre una base de datos vacía salen los mismos
+# datos, con o sin --workers; sin pares repetidos (unique_resena), con
+# los agregados que daría recalcular_agregados y el índice FTS al día
+# (las filas van en bruto, sin señales: solo los triggers).
+# --------
+class GenerarDatosTests(TestCase):
+    opciones = {"peliculas": 12, "resenas": 60, "usuarios": 8, "etiquetas": 5, "categorias": 3, "bloque": 5}
+
+    def _generar(self, semilla=7, **opciones):
+        call_command("generar_datos", semilla=semilla, stdout=io.StringIO(), **{**self.opciones, **opciones})
+
+    def _vaciar(self):
+        for modelo in (Pelicula, User, Etiqueta, Categoria):
+            modelo.objects.all().delete()
+
+    def _datos(self):
+        return (
+            list(Pelicula.objects.order_by("pk").values()),
+            list(Resena.objects.order_by("pk").values()),
+            list(Pelicula.etiquetas.through.objects.order_by("pk").values_list("pelicula_id", "etiqueta_id")),
+            list(FichaTecnica.objects.order_by("pk").values()),
+            list(User.objects.order_by("pk").values_list("username", flat=True)),
+        )
+
+    def test_filas_y_reproducible(self):
+        self._generar()
+        self.assertEqual(Pelicula.objects.count(), 12)
+        self.assertEqual(Resena.objects.count(), 60)
+        self.assertEqual(User.objects.count(), 8)
+        self.assertEqual(Perfil.objects.count(), 8)
+        self.assertEqual(Etiqueta.objects.count(), 5)
+        self.assertEqual(Categoria.objects.count(), 3)
+        primera = self._datos()
+
+        for opciones in ({}, {"workers": 2}):
+            with self.subTest(**opciones):
+                self._vaciar()
+                self._generar(**opciones)
+                self.assertEqual(self._datos(), primera)
+
+        self._vaciar()
+        self._generar(semilla=8)
+        self.assertNotEqual(self._datos(), primera)
+
+    def test_pares_unicos(self):
+        self._generar(resenas=90)  # más de la mitad de los pares posibles
+        pares = list(Resena.objects.values_list("pelicula_id", "usuario_id"))
+        self.assertEqual(len(pares), 90)
+        self.assertEqual(len(set(pares)), len(pares))
+
+    def test_agregados_y_fts(self):
+        self._generar()
+        campos = ("pk", "num_resenas", "suma_puntuaciones", "puntuacion_media", "ultima_resena", "puntuacion_bayesiana")
+        generados = list(Pelicula.objects.order_by("pk").values_list(*campos))
+        recalcular_agregados()
+        self.assertEqual(list(Pelicula.objects.order_by("pk").values_list(*campos)), generados)
+
+        # El título acaba en el id: cada película se encuentra por él
+        with connection.cursor() as cursor:
+            for pk in Pelicula.objects.values_list("pk", flat=True):
+                cursor.execute(
+                    "SELECT rowid FROM streaming_pelicula_fts WHERE streaming_pelicula_fts MATCH %s", [f'"{pk}"']
+                )
+                self.assertEqual([fila for fila, in cursor.fetchall()], [pk])
+
+
+# --------
+# RÉPLICA DE LECTURA
+# --------
+class ReplicaTests(SimpleTestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.fichero = os.path.join(carpeta.name, "replica.sqlite3")
+        open(self.fichero, "w").close()
+        ajustes = override_settings(STREAMING_REPLICA={"FICHERO": self.fichero, "RETRASO_MAXIMO": 10})
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.factory = RequestFactory()
+
+    def test_destino(self):
+        self.assertEqual(destino(self.factory.get("/api/peliculas/"))[1], "replica")
+        self.assertEqual(destino(self.factory.post("/api/peliculas/"))[1], "escritura")
+
+        # Tras escribir, el mismo cliente sigue en la principal
+        request = self.factory.get("/api/peliculas/")
+        request.COOKIES[COOKIE] = str(time_module.time() + 5)
+        self.assertEqual(destino(request)[1], "pegada")
+        request.COOKIES[COOKIE] = str(time_module.time() - 1)
+        self.assertEqual(destino(request)[1], "replica")
+
+        # Copia demasiado vieja
+        vieja = time_module.time() - 60
+        os.utime(self.fichero, (vieja, vieja))
+        self.assertEqual(destino(self.factory.get("/api/peliculas/")), (None, "retraso"))
+
+    def _leer_copia(self):
+        """(filas de la copia, ¿copia_anterior_a(generación)?) como una lectura GET"""
+        lectura, _ = destino(self.factory.get("/api/peliculas/"))
+        token = _lectura.set(lectura)
+        try:
+            with sqlite3.connect(self.fichero) as copia:
+                filas = [fila for fila, in copia.execute("SELECT id FROM t ORDER BY id")]
+            return filas, copia_anterior_a(self.generacion)
+        finally:
+            _lectura.reset(token)
+
+    def _escribir(self, origen, fila):
+        # Como las señales: la generación se sube en on_commit, tras el commit
+        with sqlite3.connect(origen) as conexion:
+            conexion.execute("INSERT INTO t VALUES (?)", [fila])
+        conexion.close()
+        self.generacion = time_module.time_ns()
+
+    def test_escritura_recien_confirmada(self):
+        origen = os.path.join(os.path.dirname(self.fichero), "principal.sqlite3")
+        with sqlite3.connect(origen) as conexion:
+            conexion.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+        conexion.close()
+
+        # Confirmada justo antes de copiar: está en la copia y se puede guardar
+        self._escribir(origen, 1)
+        copiar(origen, self.fichero)
+        self.assertEqual(self._leer_copia(), ([1], False))
+
+        # Confirmada justo después: la copia no la tiene y no se guarda
+        self._escribir(origen, 2)
+        self.assertEqual(self._leer_copia(), ([1], True))
+
+        # Mismo instante que la generación (sin margen): la copia empieza
+        # a leer después del commit, así que la incluye
+        copiar(origen, self.fichero)
+        os.utime(self.fichero, ns=(self.generacion, self.generacion))
+        self.assertEqual(self._leer_copia(), ([1, 2], False))
+
+
+# --------
+# PAGINACIÓN POR CURSOR (pagination.py)
+# Recorrer con next / previous da todas las filas una vez y en orden,
+# también con empates en el campo de orden y con altas entre página y
+# página. Un cursor manipulado es un 404, nunca un 500.
+# --------
+class PaginacionCursorTests(TestCase):
+    url = "/api/peliculas/"
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(13):
+            Pelicula.objects.create(
+                titulo=f"Película {i:02d}", descripcion="desc",
+                fecha_estreno=date(2000, 1, 1), duracion=90 + i % 3,  # muchos empates
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def _ids(self, *orden):
+        return list(Pelicula.objects.order_by(*orden).values_list("id", flat=True))
+
+    def _pagina(self, url, params=None):
+        respuesta = self.client.get(url, params)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        datos = respuesta.json()
+        return [fila["id"] for fila in datos["results"]], datos["next"], datos["previous"]
+
+    def _recorrer(self, params):
+        """(ids hacia delante, ids hacia atrás desde la última página)"""
+        adelante, paginas = [], 0
+        ids, siguiente, anterior = self._pagina(self.url, params)
+        self.assertIsNone(anterior)
+        while True:
+            adelante.extend(ids)
+            paginas += 1
+            if siguiente is None:
+                break
+            ids, siguiente, anterior = self._pagina(siguiente)
+
+        atras = list(ids)
+        while anterior is not None:
+            ids, _, anterior = self._pagina(anterior)
+            atras[:0] = ids
+            paginas -= 1
+        self.assertEqual(paginas, 1)
+        return adelante, atras
+
+    def test_siguiente_y_anterior(self):
+        adelante, atras = self._recorrer({"paginacion": "cursor", "ordering": "titulo"})
+        self.assertEqual(adelante, self._ids("titulo", "id"))
+        self.assertEqual(atras, adelante)
+
+    def test_empates(self):
+        for orden, esperado in (("duracion", ("duracion", "id")), ("-duracion", ("-duracion", "-id"))):
+            with self.subTest(orden=orden):
+                adelante, atras = self._recorrer({"paginacion": "cursor", "ordering": orden})
+                self.assertEqual(adelante, self._ids(*esperado))
+                self.assertEqual(atras, adelante)
+
+    def test_altas_entre_paginas(self):
+        primera, siguiente, _ = self._pagina(self.url, {"paginacion": "cursor", "ordering": "titulo"})
+        with self.captureOnCommitCallbacks(execute=True):
+            for titulo in ("Aaa", "Película 07b", "Zzz"):
+                Pelicula.objects.create(titulo=titulo, descripcion="desc", fecha_estreno=date(2000, 1, 1), duracion=90)
+
+        vistas = list(primera)
+        while siguiente is not None:
+            ids, siguiente, _ = self._pagina(siguiente)
+            vistas.extend(ids)
+        # Sin repetir ni saltarse nada: "Aaa" cae antes del cursor y no sale
+        esperado = self._ids("titulo", "id")
+        self.assertEqual(vistas, primera + esperado[esperado.index(primera[-1]) + 1:])
+        self.assertEqual(len(vistas), 15)
+
+    def _cursor(self, contenido):
+        crudo = contenido if isinstance(contenido, bytes) else json.dumps(contenido).encode()
+        return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+    def test_cursor_invalido(self):
+        orden = ["titulo", "id"]
+        for cursor in (
+            "no-es-base64!",
+            self._cursor(b"\xff\xfe"),
+            self._cursor(5),
+            self._cursor([orden, ["Película 03"], False]),  # faltan valores
+            self._cursor([["duracion", "id"], [90, 1], False]),  # de otra ordenación
+            self._cursor([orden, ["Película 03", "x"], False]),
+            self._cursor([orden, [None, 1], False]),
+            self._cursor([orden, {"a": 1, "b": 2}, False]),
+        ):
+            with self.subTest(cursor=cursor):
+                respuesta = self.client.get(self.url, {"paginacion": "cursor", "ordering": "titulo", "cursor": cursor})
+                self.assertEqual(respuesta.status_code, 404, respuesta.content)
+
+        fecha = self._cursor([["fecha_estreno", "id"], ["no es una fecha", 1], False])
+        respuesta = self.client.get(self.url, {"paginacion": "cursor", "ordering": "fecha_estreno", "cursor": fecha})
+        self.assertEqual(respuesta.status_code, 404)
+        # Ordenación que el cursor no admite: 400
+        respuesta = self.client.get(self.url, {"paginacion": "cursor", "ordering": "num_resenas"})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+# --------
+# RESEÑAS DE UNA PELÍCULA
+# La película solo trae las últimas; el resto, en el sub-recurso paginado.
+# --------
+class ResenasDePeliculaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pelicula = Pelicula.objects.create(
+            titulo="Popular", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=100
+        )
+        for i in range(25):
+            usuario = User.objects.create(username=f"usuario{i}")
+            Resena.objects.create(pelicula=cls.pelicula, usuario=usuario, puntuacion=i % 11)
+        cls.ordenadas = list(
+            Resena.objects.filter(pelicula=cls.pelicula).order_by("-fecha_resena", "-id").values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_vista_previa_acotada(self):
+        limite = Pelicula.resenas_recientes.limite
+        for url in (f"/api/peliculas/{self.pelicula.pk}/", "/api/peliculas/"):
+            with self.subTest(url=url):
+                datos = self.client.get(url).json()
+                pelicula = datos if "id" in datos else datos["results"][0]
+                self.assertEqual([r["id"] for r in pelicula["resenas"]], self.ordenadas[:limite])
+                self.assertNotIn("usuarios", pelicula)
+
+        # Sin prefetch (acceso directo al atributo): lo mismo con un LIMIT
+        pelicula = Pelicula.objects.get(pk=self.pelicula.pk)
+        self.assertEqual([r.id for r in pelicula.resenas_recientes], self.ordenadas[:limite])
+
+    def test_sub_recurso_paginado(self):
+        vistas, url = [], f"/api/peliculas/{self.pelicula.pk}/resenas/?fields=id"
+        while url:
+            datos = self.client.get(url).json()
+            vistas.extend(r["id"] for r in datos["results"])
+            url = datos["next"]
+        self.assertEqual(vistas, self.ordenadas)
+        self.assertEqual(self.client.get("/api/peliculas/9999/resenas/").status_code, 404)
+
+
+class FacetasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drama = Categoria.objects.create(nombre="Drama")
+        cls.comedia = Categoria.objects.create(nombre="Comedia")
+        cls.cine = Etiqueta.objects.create(nombre="cine")
+        for i in range(9):
+            pelicula = Pelicula.objects.create(
+                titulo=f"Película {i}", descripcion="desc", fecha_estreno=date(2000 + i, 1, 1),
+                duracion=90 + i, categoria=cls.drama if i % 3 else cls.comedia,
+            )
+            if i % 2:
+                pelicula.etiquetas.add(cls.cine)
+            FichaTecnica.objects.create(pelicula=pelicula, pais=["España", "Francia", ""][i % 3], idioma_original="es")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_recuentos_con_filtros(self):
+        for query, filtro in (
+            ("", {}),
+            (f"?categoria={self.drama.pk}", {"categoria": self.drama}),
+            ("?pais=España&duracion_min=93", {"ficha_tecnica__pais": "España", "duracion__gte": 93}),
+        ):
+            with self.subTest(query=query):
+                datos = self.client.get(f"/api/peliculas/facetas/{query}").json()
+                peliculas = Pelicula.objects.filter(**filtro)
+                for fila in datos["categoria"]:
+                    self.assertEqual(fila["total"], peliculas.filter(categoria_id=fila["id"]).count())
+                for fila in datos["pais"]:
+                    self.assertEqual(fila["total"], peliculas.filter(ficha_tecnica__pais=fila["valor"]).count())
+                self.assertNotIn("", [fila["valor"] for fila in datos["pais"]])
+                self.assertEqual(sum(f["total"] for f in datos["idioma"]), peliculas.count())
+                totales = [f["total"] for f in datos["categoria"]]
+                self.assertEqual(totales, sorted(totales, reverse=True))
+
+    def test_cache_e_invalidacion(self):
+        url = f"/api/peliculas/facetas/?etiqueta={self.cine.pk}&page_size=3"
+        primera = self.client.get(url)
+        self.assertEqual(primera["X-Cache"], "MISS")
+        self.assertEqual(primera.json()["etiqueta"], [{"id": self.cine.pk, "nombre": "cine", "total": 4}])
+
+        # Paginación / orden no cambian el conjunto: misma entrada
+        otra = self.client.get(f"/api/peliculas/facetas/?page_size=5&etiqueta={self.cine.pk}")
+        self.assertEqual(otra["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FichaTecnica.objects.filter(pais="Francia").first().save()
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+
+class SimilaresTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        terror, risa = Etiqueta.objects.create(nombre="terror"), Etiqueta.objects.create(nombre="risa")
+        cls.peliculas = [
+            Pelicula.objects.create(titulo=f"Película {i}", descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=90)
+            for i in range(4)
+        ]
+        a, b, c, d = cls.peliculas
+        a.etiquetas.set([terror])
+        b.etiquetas.set([terror])
+        c.etiquetas.set([risa])
+        # c comparte usuarios con a; d no comparte nada
+        cls.usuarios = [User.objects.create(username=f"usuario{i}") for i in range(4)]
+        for usuario in cls.usuarios[:3]:
+            for pelicula in (a, c):
+                Resena.objects.create(pelicula=pelicula, usuario=usuario, puntuacion=8)
+
+    def test_calculo_y_endpoint(self):
+        a, b, c, d = self.peliculas
+        self.assertEqual(calcular(todas=True)["recalculadas"], 4)
+
+        datos = self.client.get(f"/api/peliculas/{a.pk}/similares/").json()["results"]
+        self.assertEqual([fila["id"] for fila in datos], [c.pk, b.pk])
+        self.assertEqual(datos[0]["titulo"], c.titulo)
+        self.assertEqual(self.client.get(f"/api/peliculas/{d.pk}/similares/").json()["results"], [])
+        self.assertEqual(self.client.get("/api/peliculas/9999/similares/").status_code, 404)
+
+    def test_incremental(self):
+        a, b, c, d = self.peliculas
+        calcular(todas=True)
+        self.assertEqual(calcular()["recalculadas"], 0)
+
+        # Reseñas nuevas en d de quien ya valoró a y c: cambian d, a y c (no b)
+        antes = SimilaresPelicula.objects.get(pelicula=b).calculado_en
+        for usuario in self.usuarios[:2]:
+            Resena.objects.create(pelicula=d, usuario=usuario, puntuacion=5)
+        Pelicula.objects.filter(pk=d.pk).update(num_resenas=2, ultima_resena=timezone.now())
+        self.assertEqual(calcular()["recalculadas"], 3)
+        self.assertEqual(SimilaresPelicula.objects.get(pelicula=b).calculado_en, antes)
+        self.assertIn(d.pk, [otra for otra, _ in SimilaresPelicula.objects.get(pelicula=a).vecinos])
+
+    def test_incremental_igual_que_completo(self):
+        a, b, c, d = self.peliculas
+        nuevo = self.usuarios[3]
+
+        def etiquetas():
+            b.etiquetas.set([Etiqueta.objects.get(nombre="risa")])
+
+        def resena_nueva():
+            for pelicula in (b, d):
+                Resena.objects.create(pelicula=pelicula, usuario=nuevo, puntuacion=6)
+
+        def resena_borrada():
+            Resena.objects.filter(pelicula=a, usuario=self.usuarios[0]).delete()
+
+        def pelicula_borrada():
+            c.delete()
+
+        recalcular_agregados()
+        calcular(todas=True)
+        for cambio in (etiquetas, resena_nueva, resena_borrada, pelicula_borrada):
+            with self.subTest(cambio=cambio.__name__):
+                cambio()
+                recalcular_agregados()  # la firma sale de los agregados
+                calcular()
+                incremental = dict(SimilaresPelicula.objects.values_list("pelicula_id", "vecinos"))
+                calcular(todas=True)
+                self.assertEqual(incremental, dict(SimilaresPelicula.objects.values_list("pelicula_id", "vecinos")))
+
+    def _menciones(self):
+        return set(VecinoSimilar.objects.values_list("similares_id", "vecino_id"))
+
+    def test_indice_inverso(self):
+        a, b, c, d = self.peliculas
+        calcular(todas=True)
+        guardadas = SimilaresPelicula.objects.values_list("pelicula_id", "vecinos")
+        self.assertEqual(self._menciones(), {(pk, otra) for pk, vecinos in guardadas for otra, _ in vecinos})
+
+        # Borrada c: queda NULL en las filas que la tenían y esas se recalculan
+        c.delete()
+        self.assertIn((a.pk, None), self._menciones())
+        calcular()
+        self.assertNotIn(None, [otra for _, otra in self._menciones()])
+
+        # Una reseña nueva en d: la pasada no lee la tabla entera, solo las
+        # filas de las candidatas (las que comparten algo con d)
+        Resena.objects.create(pelicula=d, usuario=self.usuarios[3], puntuacion=5)
+        Pelicula.objects.filter(pk=d.pk).update(num_resenas=1, ultima_resena=timezone.now())
+        tabla = SimilaresPelicula._meta.db_table
+        with CaptureQueriesContext(connection) as consultas:
+            calcular()
+        lecturas = [q["sql"] for q in consultas if q["sql"].startswith("SELECT") and f'"{tabla}"."vecinos"' in q["sql"]]
+        self.assertTrue(all("WHERE" in sql for sql in lecturas), lecturas)
+
+
+class ClasificacionesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drama, cls.comedia = Categoria.objects.create(nombre="Drama"), Categoria.objects.create(nombre="Comedia")
+        cls.usuarios = [User.objects.create(username=f"usuario{i}") for i in range(30)]
+
+        def pelicula(titulo, categoria):
+            return Pelicula.objects.create(
+                titulo=titulo, descripcion="desc", fecha_estreno=date(2020, 1, 1), duracion=90, categoria=categoria
+            )
+
+        cls.unica = pelicula("Un solo 10", cls.drama)
+        cls.buena = pelicula("Buena", cls.drama)
+        cls.regular = pelicula("Regular", cls.comedia)
+
+    def setUp(self):
+        cache.clear()
+
+    def _valorar(self, pelicula, usuarios, puntuacion):
+        for usuario in usuarios:
+            respuesta = self.client.post(
+                f"/api/peliculas/{pelicula.pk}/valorar/",
+                {"usuario_id": usuario.pk, "puntuacion": puntuacion},
+                content_type="application/json",
+            )
+            self.assertEqual(respuesta.status_code, 201)
+
+    def _ids(self, url):
+        return [fila["id"] for fila in self.client.get(url).json()["results"]]
+
+    def test_mejor_valoradas(self):
+        self._valorar(self.unica, self.usuarios[:1], 10)
+        self._valorar(self.buena, self.usuarios, 9)
+        self._valorar(self.regular, self.usuarios, 5)
+        media = compactar()["media"]
+
+        # Con una sola reseña se queda cerca de la media
+        self.assertEqual(self._ids("/api/peliculas/mejor-valoradas/"), [self.buena.pk, self.unica.pk, self.regular.pk])
+        self.assertEqual(self._ids(f"/api/peliculas/mejor-valoradas/?categoria={self.comedia.pk}"), [self.regular.pk])
+        self.assertEqual(self._ids("/api/peliculas/mejor-valoradas/?limite=1"), [self.buena.pk])
+        self.assertEqual(self.client.get("/api/peliculas/mejor-valoradas/?limite=1000").status_code, 400)
+
+        # Cada reseña la actualiza al momento (con la media de la última compactación)
+        self._valorar(self.unica, self.usuarios[1:3], 10)
+        previo = AJUSTES_CLASIFICACIONES["PESO_PREVIO"]
+        self.assertAlmostEqual(
+            Pelicula.objects.get(pk=self.unica.pk).puntuacion_bayesiana, (previo * media + 30) / (previo + 3)
+        )
+
+    def test_sin_resenas(self):
+        # Valorada y borrada la única reseña: fuera de la lista, no con la media previa
+        self._valorar(self.unica, self.usuarios[:1], 10)
+        self._valorar(self.regular, self.usuarios[:2], 5)
+        self.assertEqual(self._ids("/api/peliculas/mejor-valoradas/"), [self.unica.pk, self.regular.pk])
+
+        resena = Resena.objects.get(pelicula=self.unica)
+        self.assertEqual(self.client.delete(f"/api/resenas/{resena.pk}/").status_code, 204)
+        for reparar in (lambda: None, recalcular_agregados, compactar):
+            with self.subTest(reparar=reparar.__name__):
+                reparar()
+                cache.clear()
+                self.assertIsNone(Pelicula.objects.get(pk=self.unica.pk).puntuacion_bayesiana)
+                self.assertEqual(self._ids("/api/peliculas/mejor-valoradas/"), [self.regular.pk])
+
+    def test_tendencias(self):
+        self._valorar(self.buena, self.usuarios[:3], 7)
+        self._valorar(self.regular, self.usuarios[:1], 7)
+        self.assertEqual(self._ids("/api/peliculas/tendencias/"), [self.buena.pk, self.regular.pk])
+        self.assertEqual(self._ids("/api/peliculas/tendencias/"), self._ids("/api/peliculas/tendencias/?limite=5"))
+
+        # Las reseñas de "buena" salen de la ventana: compactar la quita
+        Resena.objects.filter(pelicula=self.buena).update(fecha_resena=timezone.now() - timedelta(days=10))
+        compactar()
+        datos = self.client.get("/api/peliculas/tendencias/").json()["results"]
+        self.assertEqual([fila["id"] for fila in datos], [self.regular.pk])
+        self.assertAlmostEqual(datos[0]["tendencia"], 1.0, places=3)
+
+
+class AutenticacionTests(TestCase):
+
+    def setUp(self):
+        usuarios_jwt.vaciar()
+        self.usuario = User.objects.create_user(username="jwt", password="secreta")
+        self.clave = str(self.usuario.pk)
+
+    def test_cache_de_usuarios(self):
+        usuarios_jwt.guardar(self.clave, self.usuario, ttl=30, maximo=2)
+        self.assertEqual(usuarios_jwt.obtener(self.clave), self.usuario)
+
+        usuarios_jwt.guardar(self.clave, self.usuario, ttl=-1, maximo=2)
+        self.assertIsNone(usuarios_jwt.obtener(self.clave))  # caducado
+
+        for clave in ("a", "b", "c"):
+            usuarios_jwt.guardar(clave, self.usuario, ttl=30, maximo=2)
+        self.assertIsNone(usuarios_jwt.obtener("a"))  # el menos usado sale
+        self.assertIsNotNone(usuarios_jwt.obtener("c"))
+
+    def test_invalidacion(self):
+        # El login (solo last_login) no invalida ni consulta nada
+        usuarios_jwt.guardar(self.clave, self.usuario, ttl=30, maximo=10)
+        self.usuario.last_login = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as consultas:
+            self.usuario.save(update_fields=["last_login"])
+        self.assertEqual(len(consultas), 1)
+        self.assertIsNotNone(usuarios_jwt.obtener(self.clave))
+
+        for cambio in (lambda u: u.set_password("otra"), lambda u: setattr(u, "is_active", False)):
+            usuarios_jwt.guardar(self.clave, self.usuario, ttl=30, maximo=10)
+            cambio(self.usuario)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.usuario.save()
+            self.assertIsNone(usuarios_jwt.obtener(self.clave))
+
+        # Otros cambios no lo sacan
+        usuarios_jwt.guardar(self.clave, self.usuario, ttl=30, maximo=10)
+        self.usuario.first_name = "Ana"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.save()
+        self.assertIsNotNone(usuarios_jwt.obtener(self.clave))
+
+    # -------- CachedJWTAuthentication en las peticiones --------
+    def _con_token(self, metodo, url, token, **kwargs):
+        with mock.patch.object(APIView, "authentication_classes", [CachedJWTAuthentication]):
+            return getattr(self.client, metodo)(url, HTTP_AUTHORIZATION=f"Bearer {token}", **kwargs)
+
+    def _consultas_de_usuario(self, *args, **kwargs):
+        cache.clear()  # la caché de respuestas, no la de usuarios ni las revocaciones
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self._con_token(*args, **kwargs)
+        return respuesta, sum('"auth_user"' in c["sql"] for c in consultas.captured_queries)
+
+    def _autenticar(self, metodo, token):
+        peticion = Request(getattr(RequestFactory(), metodo)("/api/", HTTP_AUTHORIZATION=f"Bearer {token}"))
+        return CachedJWTAuthentication().authenticate(peticion)[0]
+
+    def test_sin_consulta_de_usuario(self):
+        token = str(AccessToken.for_user(self.usuario))
+        # Caché del proceso: la primera petición carga el User, las demás no
+        for esperadas in (1, 0, 0):
+            respuesta, consultas = self._consultas_de_usuario("get", "/api/categorias/", token)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(consultas, esperadas)
+        # Caché compartida: las lecturas salen de los claims desde la primera
+        usuarios_jwt.vaciar()
+        with override_settings(STREAMING_JWT={"CACHE_COMPARTIDA": True}):
+            respuesta, consultas = self._consultas_de_usuario("get", "/api/categorias/", token)
+            self.assertEqual((respuesta.status_code, consultas), (200, 0))
+            self.assertIsInstance(self._autenticar("get", token), TokenUser)
+
+    def test_escrituras_con_el_user_real(self):
+        token = str(AccessToken.for_user(self.usuario))
+        with override_settings(STREAMING_JWT={"CACHE_COMPARTIDA": True}):
+            usuario = self._autenticar("post", token)
+            self.assertIsInstance(usuario, User)
+            self.assertEqual(usuario.pk, self.usuario.pk)
+
+            pelicula = Pelicula.objects.create(titulo="P", descripcion="d", fecha_estreno=date(2020, 1, 1), duracion=90)
+            usuarios_jwt.vaciar()
+            respuesta, consultas = self._consultas_de_usuario(
+                "post", f"/api/peliculas/{pelicula.pk}/valorar/", token,
+                data={"usuario_id": self.usuario.pk, "puntuacion": 7}, content_type="application/json",
+            )
+            self.assertEqual(respuesta.status_code, 201, respuesta.content)
+            self.assertGreaterEqual(consultas, 1)
+
+    def test_revocado_con_la_cache_caliente(self):
+        cambios = {
+            "contraseña": lambda u: u.set_password("otra"),
+            "desactivado": lambda u: setattr(u, "is_active", False),
+        }
+        for compartida, (nombre, cambio) in itertools.product((False, True), cambios.items()):
+            with self.subTest(compartida=compartida, cambio=nombre), \
+                    override_settings(STREAMING_JWT={"CACHE_COMPARTIDA": compartida}):
+                usuario = User.objects.create_user(username=f"{nombre}-{compartida}")
+                token = str(AccessToken.for_user(usuario))
+                self.assertEqual(self._con_token("get", "/api/categorias/", token).status_code, 200)
+
+                cambio(usuario)
+                with self.captureOnCommitCallbacks(execute=True):
+                    usuario.save()
+                self.assertEqual(self._con_token("get", "/api/categorias/", token).status_code, 401)
+
+    def test_claims_solo_con_cache_compartida(self):
+        # La LocMem de los tests es de cada proceso: revocar no llegaría a los demás
+        self.assertFalse(cache_compartida())
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": carpeta}}
+        ):
+            self.assertTrue(cache_compartida())
+        with override_settings(STREAMING_JWT={"CACHE_COMPARTIDA": True}):
+            self.assertTrue(cache_compartida())
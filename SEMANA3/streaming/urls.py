@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from .metricas import metricas
 from .views import (
     PeliculaViewSet,
     CategoriaViewSet,
@@ -17,6 +18,7 @@ router.register(r'resenas', ResenaViewSet, basename='resena')
 router.register(r'perfiles', PerfilViewSet, basename='perfil')
 
 urlpatterns = [
+    path('metrics', metricas, name='metrics'),
     path('', include(router.urls)),
 ]
 
@@ -0,0 +1,132 @@
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .clasificaciones import en_ventana, peso_tendencia, puntuacion_bayesiana
+from .models import Pelicula, Resena
+
+
+# --------
+# AGREGADOS DE RESEÑAS EN PELÍCULA
+# num_resenas / suma_puntuaciones / puntuacion_media / ultima_resena se
+# actualizan con un único UPDATE con F() (sin leer la fila antes), así
+# dos reseñas simultáneas de la misma película no se pisan. En el mismo
+# UPDATE van puntuacion_bayesiana y tendencia (ver clasificaciones.py).
+# Llamar siempre dentro de la misma transacción que escribe la reseña.
+# --------
+
+
+def _ultima_resena():
+    return Subquery(
+        Resena.objects.filter(pelicula=OuterRef("pk"))
+        .order_by("-fecha_resena")
+        .values("fecha_resena")[:1]
+    )
+
+
+def _ajustar(pelicula_id, delta_num, delta_suma, ultima_resena=None, delta_tendencia=None):
+    _actualizar(Pelicula.objects.filter(pk=pelicula_id), delta_num, delta_suma, ultima_resena, delta_tendencia)
+
+
+def _tendencia(fecha, signo=1):
+    # Las reseñas de fuera de la ventana ya no cuentan tras compactar: ni suman ni restan
+    return signo * peso_tendencia(fecha) if en_ventana(fecha) else None
+
+
+def _actualizar(queryset, delta_num, delta_suma, ultima_resena=None, delta_tendencia=None):
+    nuevo_num = F("num_resenas") + delta_num
+    nueva_suma = F("suma_puntuaciones") + delta_suma
+
+    cambios = {
+        "num_resenas": nuevo_num,
+        "suma_puntuaciones": nueva_suma,
+        # NULLIF evita dividir entre 0 cuando se borra la última reseña
+        "puntuacion_media": Cast(nueva_suma, FloatField()) / NullIf(nuevo_num, Value(0)),
+        "puntuacion_bayesiana": puntuacion_bayesiana(nuevo_num, nueva_suma),
+    }
+    if ultima_resena is not None:
+        cambios["ultima_resena"] = ultima_resena
+    if delta_tendencia is not None:
+        cambios["tendencia"] = F("tendencia") + delta_tendencia
+
+    queryset.update(**cambios)
+
+
+def resena_creada(resena):
+    _ajustar(
+        resena.pelicula_id, 1, resena.puntuacion,
+        ultima_resena=resena.fecha_resena, delta_tendencia=_tendencia(resena.fecha_resena),
+    )
+
+
+def resenas_creadas_en_bloque(por_pelicula, fecha):
+    """
+    Varias reseñas nuevas de golpe: `por_pelicula` es {pelicula_id: (n, suma)}.
+    Un solo UPDATE para todas las películas (CASE por id).
+    """
+    if not por_pelicula:
+        return
+
+    def por_id(valor, tipo=IntegerField):
+        return Case(
+            *[When(pk=pk, then=Value(valor(valores))) for pk, valores in por_pelicula.items()],
+            default=Value(0),
+            output_field=tipo(),
+        )
+
+    peso = peso_tendencia(fecha)
+    _actualizar(
+        Pelicula.objects.filter(pk__in=list(por_pelicula)),
+        por_id(lambda valores: valores[0]),
+        por_id(lambda valores: valores[1]),
+        ultima_resena=fecha,
+        delta_tendencia=por_id(lambda valores: valores[0] * peso, FloatField),
+    )
+
+
+def resena_borrada(resena):
+    # La fila ya no existe: la subconsulta devuelve la anterior (o NULL)
+    _ajustar(
+        resena.pelicula_id, -1, -resena.puntuacion,
+        ultima_resena=_ultima_resena(), delta_tendencia=_tendencia(resena.fecha_resena, -1),
+    )
+
+
+def resena_modificada(anterior_pelicula_id, anterior_puntuacion, resena):
+    if anterior_pelicula_id != resena.pelicula_id:
+        _ajustar(
+            anterior_pelicula_id, -1, -anterior_puntuacion,
+            ultima_resena=_ultima_resena(), delta_tendencia=_tendencia(resena.fecha_resena, -1),
+        )
+        _ajustar(
+            resena.pelicula_id, 1, resena.puntuacion,
+            ultima_resena=_ultima_resena(), delta_tendencia=_tendencia(resena.fecha_resena),
+        )
+    elif anterior_puntuacion != resena.puntuacion:
+        _ajustar(resena.pelicula_id, 0, resena.puntuacion - anterior_puntuacion)
+
+
+def recalcular_agregados(queryset=None):
+    """
+    Reconstruye los agregados desde Resena con un solo UPDATE en bloque.
+    Devuelve el número de películas actualizadas.
+    """
+    if queryset is None:
+        queryset = Pelicula.objects.all()
+
+    resenas = Resena.objects.filter(pelicula=OuterRef("pk")).order_by().values("pelicula")
+    num = Coalesce(
+        Subquery(resenas.annotate(n=Count("pk")).values("n"), output_field=IntegerField()),
+        Value(0),
+    )
+    suma = Coalesce(
+        Subquery(resenas.annotate(s=Sum("puntuacion")).values("s"), output_field=IntegerField()),
+        Value(0),
+    )
+
+    return queryset.order_by().update(
+        num_resenas=num,
+        suma_puntuaciones=suma,
+        puntuacion_media=Cast(suma, FloatField()) / NullIf(num, Value(0)),
+        puntuacion_bayesiana=puntuacion_bayesiana(num, suma),
+        ultima_resena=_ultima_resena(),
+    )
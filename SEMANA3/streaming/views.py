@@ -1,19 +1,33 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from django.db import IntegrityError
-from .filters import PeliculaFilter
-from .models import Pelicula, Categoria, Etiqueta, Resena, Perfil
+from django.contrib.auth.models import User
+from django_filters.rest_framework import DjangoFilterBackend
+from .filters import PeliculaFilter, FTS5SearchFilter, RankedOrderingFilter
+from .pagination import CatalogoPagination, ResenasPeliculaPagination
+from .models import Pelicula, Categoria, Etiqueta, Resena, Perfil, FichaTecnica
+from .planner import EagerLoadingMixin, plan_queryset
+from .cache import CachedResponseMixin
+from .conditional import ConditionalGetMixin
+from .export import ExportMixin
+from .facetas import FacetasMixin
+from .asincrono import AsyncReadMixin
+from .escritor import EscritorSaturado, escritor
+from .similares import similares_de
+from . import clasificaciones, lotes, valoraciones
+from .parsers import FastJSONParser, NDJSONParser
 from .serializers import (
     PeliculaSerializer,
     CategoriaSerializer,
+    ClasificacionSerializer,
     EtiquetaSerializer,
     ResenaSerializer,
     PerfilSerializer,
     ValorarPeliculaSerializer,
 )
 
-class PeliculaViewSet(viewsets.ModelViewSet):
+class PeliculaViewSet(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, ExportMixin, FacetasMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Pelicula.objects.all()
     serializer_class = PeliculaSerializer
     
@@ -25,9 +39,39 @@ class PeliculaViewSet(viewsets.ModelViewSet):
     # Búsqueda textual (elige campos de texto reales):
     search_fields = ["titulo", "descripcion"]  # ejemplo
 
+    # ?search= va contra el índice FTS5 (migración 0004) y ordena por relevancia
+    filter_backends = [DjangoFilterBackend, FTS5SearchFilter, RankedOrderingFilter]
+    fts_relation = "fts"  # PeliculaFTS
+
     # Ordenación (limita campos expuestos):
-    ordering_fields = ["titulo", "fecha_estreno", "duracion"]  # ejemplo
+    ordering_fields = [
+        "titulo", "fecha_estreno", "duracion",
+        "puntuacion_media", "num_resenas",  # agregados guardados (indexados)
+    ]
     ordering = ["titulo"]  # orden por defecto
+
+    # ?paginacion=cursor -> paginación por cursor sobre estos campos (+ id)
+    pagination_class = CatalogoPagination
+    cursor_ordering_fields = ["titulo", "fecha_estreno", "duracion", "rango_busqueda"]
+
+    # /peliculas/exportar/ también planifica los prefetch (por bloques)
+    eager_actions = ("list", "retrieve", "exportar")
+
+    # Caché de list / retrieve: se invalida al escribir en estos modelos
+    # (User / Perfil: usuario_detalle de las reseñas)
+    cache_models = (Pelicula, Resena, Categoria, Etiqueta, User, Perfil)
+
+    # ETag / Last-Modified (304 si el cliente ya tiene la última versión)
+    conditional_fields = ("updated_at", "ultima_resena")
+
+    # /peliculas/facetas/: recuentos por valor con los filtros del listado
+    facet_fields = {
+        "categoria": ("categoria", "categoria__nombre"),
+        "etiqueta": ("etiquetas", "etiquetas__nombre"),
+        "pais": ("ficha_tecnica__pais", None),
+        "idioma": ("ficha_tecnica__idioma_original", None),
+    }
+    facet_models = (Pelicula, Categoria, Etiqueta, FichaTecnica)
     
     @action(detail=True, methods=['post'])
     def valorar(self, request, pk=None):
@@ -40,48 +84,212 @@ class PeliculaViewSet(viewsets.ModelViewSet):
         puntuacion = serializer.validated_data['puntuacion']
         comentario = serializer.validated_data.get('comentario', '')
         
+        # Alta + agregados por el escritor único (escritor.py); si está
+        # saturado, EscritorSaturado ya es un 503 de DRF
         try:
-            resena, creada = Resena.objects.get_or_create(
-                pelicula=pelicula,
-                usuario_id=usuario_id,
-                defaults={'puntuacion': puntuacion, 'comentario': comentario}
-            )
-            
-            if not creada:
-                return Response(
-                    {"error": "Ya has valorado esta película"},
-                    status=status.HTTP_409_CONFLICT
-                )
-            
+            resultado = escritor.valorar(pelicula.pk, usuario_id, puntuacion, comentario)
+        except EscritorSaturado:
+            raise
+        except Exception as e:
             return Response(
-                {"mensaje": "Película valorada correctamente", "resena_id": resena.id},
-                status=status.HTTP_201_CREATED
+                {"error": f"Error al crear reseña: {str(e)}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        except IntegrityError:
+
+        if resultado["estado"] == "conflicto":
             return Response(
                 {"error": "Ya has valorado esta película"},
                 status=status.HTTP_409_CONFLICT
             )
-        except Exception as e:
+        if resultado["estado"] == "error":
+            return Response(resultado["errores"], status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {"mensaje": "Película valorada correctamente", "resena_id": resultado["resena_id"]},
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(
+        detail=True, methods=['get'], url_path='resenas',
+        serializer_class=ResenaSerializer, pagination_class=ResenasPeliculaPagination,
+    )
+    def resenas(self, request, pk=None):
+        """
+        Todas las reseñas de la película, paginadas por cursor (la
+        película solo trae las más recientes). Admite ?fields= / ?expand=.
+        """
+        pelicula = self.get_object()
+        queryset = plan_queryset(Resena.objects.filter(pelicula=pelicula), self.get_serializer())
+        pagina = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(pagina, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similares(self, request, pk=None):
+        """
+        Las películas más parecidas (etiquetas y usuarios en común),
+        precalculadas por el comando calcular_similares.
+        """
+        try:
+            resultados = similares_de(int(pk))
+        except ValueError:
+            resultados = None
+        if resultados is None:
+            raise NotFound()
+        return Response({"results": resultados})
+
+    @action(detail=False, methods=['get'], url_path='mejor-valoradas')
+    def mejor_valoradas(self, request):
+        """Top-N por media bayesiana (?categoria=, ?limite=). Ver clasificaciones.py."""
+        return self._clasificacion(request, clasificaciones.mejor_valoradas)
+
+    @action(detail=False, methods=['get'])
+    def tendencias(self, request):
+        """Top-N por reseñas recientes con decaimiento (?categoria=, ?limite=)."""
+        return self._clasificacion(request, clasificaciones.tendencias)
+
+    @staticmethod
+    def _clasificacion(request, lista):
+        parametros = ClasificacionSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        return Response({"results": lista(**parametros.validated_data)})
+
+    @action(detail=False, methods=['post'], parser_classes=[FastJSONParser, NDJSONParser])
+    def lote(self, request):
+        """
+        Alta / actualización masiva: lista JSON o NDJSON de películas
+        (con "id" se actualiza, sin él se crea). Devuelve el resultado de
+        cada elemento por su índice.
+        """
+        items = request.data
+        if not isinstance(items, list):
             return Response(
-                {"error": f"Error al crear reseña: {str(e)}"},
+                {"error": "Se esperaba una lista de películas"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultados = lotes.guardar_peliculas(items)
+        errores = sum(1 for r in resultados if r["estado"] == "error")
+
+        if not errores:
+            codigo = status.HTTP_201_CREATED
+        elif errores == len(resultados):
+            codigo = status.HTTP_400_BAD_REQUEST
+        else:
+            codigo = status.HTTP_207_MULTI_STATUS
+
+        return Response(
+            {
+                "creadas": sum(1 for r in resultados if r["estado"] == "creada"),
+                "actualizadas": sum(1 for r in resultados if r["estado"] == "actualizada"),
+                "errores": errores,
+                "resultados": resultados,
+            },
+            status=codigo
+        )
+
+    @action(detail=False, methods=['post'], url_path='valorar-lote', parser_classes=[FastJSONParser, NDJSONParser])
+    def valorar_lote(self, request):
+        """
+        Muchas valoraciones de golpe: [{"pelicula", "usuario_id", "puntuacion",
+        "comentario"}, ...]. Cada elemento vuelve como creada / conflicto / error.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"error": "Se esperaba una lista de valoraciones"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        resultados = lotes.guardar_valoraciones(items)
+        creadas = sum(1 for r in resultados if r["estado"] == "creada")
+        conflictos = sum(1 for r in resultados if r["estado"] == "conflicto")
+        errores = len(resultados) - creadas - conflictos
+
+        if creadas == len(resultados):
+            codigo = status.HTTP_201_CREATED
+        elif errores == len(resultados):
+            codigo = status.HTTP_400_BAD_REQUEST
+        else:
+            codigo = status.HTTP_207_MULTI_STATUS
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+        return Response(
+            {
+                "creadas": creadas,
+                "conflictos": conflictos,
+                "errores": errores,
+                "resultados": resultados,
+            },
+            status=codigo
+        )
+
+
+class CategoriaViewSet(ConditionalGetMixin, CachedResponseMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
+    cache_models = (Categoria,)
 
-class EtiquetaViewSet(viewsets.ModelViewSet):
+class EtiquetaViewSet(ConditionalGetMixin, CachedResponseMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Etiqueta.objects.all()
     serializer_class = EtiquetaSerializer
+    cache_models = (Etiqueta,)
 
-class ResenaViewSet(viewsets.ModelViewSet):
+class ResenaViewSet(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, ExportMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Resena.objects.all()
     serializer_class = ResenaSerializer
+    conditional_fields = ("fecha_resena",)
+    cache_models = (Resena, Pelicula, User, Perfil)  # pelicula_titulo, usuario_detalle
+    eager_actions = ("list", "retrieve", "exportar")
+    pagination_class = CatalogoPagination
+    cursor_ordering_fields = ["fecha_resena"]
+
+    # Cada escritura actualiza también los agregados de la película, y
+    # todas pasan por el escritor único de reseñas (escritor.py)
+    def perform_create(self, serializer):
+        datos = serializer.validated_data
+        resultado = escritor.valorar(
+            datos["pelicula"].pk, datos["usuario"].pk, datos["puntuacion"], datos.get("comentario", "")
+        )
+        if resultado["estado"] == "conflicto":
+            # Otra petición la ha creado entre la validación y el INSERT
+            raise ValidationError({"non_field_errors": ["Ya has valorado esta película"]})
+        if resultado["estado"] == "error":
+            raise ValidationError(resultado["errores"])
+        serializer.instance = self.get_queryset().get(pk=resultado["resena_id"])
+
+    def perform_update(self, serializer):
+        escritor.ejecutar(lambda: self._actualizar(serializer))
+
+    def perform_destroy(self, instance):
+        escritor.ejecutar(lambda: self._borrar(instance))
+
+    # La instancia se cargó en la petición, antes de esperar turno en el
+    # escritor: otra escritura de la misma reseña puede haberla cambiado o
+    # borrado entre medias. Lo "de antes" se relee ya en el escritor.
+    @staticmethod
+    def _releer(instance):
+        try:
+            instance.refresh_from_db(fields=["pelicula", "usuario", "puntuacion", "comentario", "fecha_resena"])
+        except Resena.DoesNotExist:
+            raise NotFound()
+
+    @classmethod
+    def _actualizar(cls, serializer):
+        cls._releer(serializer.instance)
+        anterior_pelicula_id = serializer.instance.pelicula_id
+        anterior_puntuacion = serializer.instance.puntuacion
+        resena = serializer.save()
+        valoraciones.resena_modificada(anterior_pelicula_id, anterior_puntuacion, resena)
+
+    @classmethod
+    def _borrar(cls, instance):
+        cls._releer(instance)
+        _, borradas = instance.delete()
+        if borradas.get(Resena._meta.label) != 1:
+            raise NotFound()  # la ha borrado otra petición: no se resta dos veces
+        valoraciones.resena_borrada(instance)
 
-class PerfilViewSet(viewsets.ModelViewSet):
+class PerfilViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Perfil.objects.all()
     serializer_class = PerfilSerializer
 
@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .metricas import metricas
 from .views import (
     PeliculaViewSet,
     CategoriaViewSet,
@@ -15,5 +16,7 @@ router.register(r'etiquetas', EtiquetaViewSet)
 router.register(r'resenas', ResenaViewSet)
 router.register(r'perfiles', PerfilViewSet)
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('metrics', metricas, name='metrics'),
+] + router.urls
 